@@ -1,8 +1,26 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, session
 import os
 import logging
+import threading
+import time
+import mysql.connector
 from dotenv import load_dotenv
-from utils import DatabaseConnector
+from utils import LazyDatabaseConnector, QueryTimeoutError, CircuitOpenError, BREAKER_RESET
+from ratelimit import RateLimiter, LoadShedder, deadline
+from assets import StaticAssets
+from importer import CsvImporter, CsvImportError, multipart_file, IMPORTABLE_TABLES
+from kickstarter import COMPACT_VIEWS_SQL, PARTITIONED_LAYOUT_SQL
+from writes import MatchWriter, WriteValidationError
+from events import EventHub, HubFullError
+from similar import SimilarPlayers, parse_price, INDEX_MAX_AGE
+from percentiles import PlayerPercentiles
+from export import export_response, ExportFormatError
+from profiling import RequestProfiler, PROFILE_ENABLED
+from cube import ShotCube, CubeQueryError, CubeUnavailableError, DIMENSIONS as CUBE_DIMENSIONS, CUBE_MAX_AGE, CUBE_REBUILD_INTERVAL
+from simulate import SeasonSimulator, DEFAULT_SIMULATIONS, MAX_SIMULATIONS
+from timeline import MatchTimelines, TIMELINE_MAX_AGE
+from jobs import JobRunner, JOBS_ENABLED
+import queries
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -14,8 +32,64 @@ app = Flask(__name__, template_folder='main/templates', static_folder='main/stat
 
 app.config["SECRET_KEY"] = SECRET_KEY
 
-# Bridge between Flask and Database
-db = DatabaseConnector()
+# Content-hashed static URLs served immutable, gzip/brotli for larger responses
+assets = StaticAssets(app)
+
+# Bridge between Flask and Database, the pool is only opened on first use in each process
+db = LazyDatabaseConnector()
+
+# Expensive endpoints are rate limited per client and shed load when the pool queue backs up
+limiter = RateLimiter()
+shedder = LoadShedder(db)
+
+# Write paths publish new matches and shots to live-feed subscribers
+hub = EventHub()
+
+# fut23 attribute matrix for similar-player lookups, rebuilt when fut23 changes
+similar_players = SimilarPlayers(db)
+
+# Per-90 percentiles of every player season within its year and position group
+player_percentiles = PlayerPercentiles(db)
+
+# Match writes from concurrent admin clients are group-committed together
+match_writer = MatchWriter(db, hub)
+
+# Pre-aggregated shot counts/goals/xG for slice-and-roll-up analytics
+shot_cube = ShotCube(db)
+
+# Cumulative xG/goals per match for the xG race, merged with imported shots
+match_timelines = MatchTimelines(db)
+
+# Monte Carlo table projections from match forecasts, cached until a result lands
+season_simulator = SeasonSimulator(db)
+
+# Opt-in (PROFILE=1) per-request cProfile/flamegraph dumps, not hooked in at all otherwise
+profiler = RequestProfiler(app) if PROFILE_ENABLED else None
+
+# Derived data is rebuilt by background jobs (on a timer and when its tables change), never inside a request
+jobs = JobRunner(db)
+if JOBS_ENABLED:
+    for name, target, interval, tables in [
+        ("similar_players", similar_players, INDEX_MAX_AGE, ("fut23",)),
+        ("player_percentiles", player_percentiles, None, ("player",)),
+        ("shot_cube", shot_cube, CUBE_MAX_AGE, ("shot_data", "shot_cube")),
+        ("match_timelines", match_timelines, TIMELINE_MAX_AGE, ()),
+    ]:
+        target.background = True
+        jobs.add(name, target.refresh, interval, tables=tables)
+    # writes the shared shot_cube table, so only one worker at a time, and never on the read-only SQLite build
+    if os.getenv('DB_BACKEND', 'mysql').lower() != 'sqlite':
+        jobs.add("shot_cube_rebuild", shot_cube.rebuild, CUBE_REBUILD_INTERVAL, exclusive=True,
+                 delay=CUBE_REBUILD_INTERVAL)
+
+@app.errorhandler(CircuitOpenError)
+def circuit_open(e):
+    """Routes re-raise CircuitOpenError so an open breaker is a 503, not a generic 500."""
+    response = jsonify({"success": False, "error": "Database unavailable, try again shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, round(BREAKER_RESET)))
+    return response
+
 
 @app.route("/")
 def home():
@@ -48,170 +122,114 @@ def talha():
 #--------------TALHA-START-----------------------------
 
 @app.route("/api/players/fut23", methods=['GET'])
+@limiter.limit(rate=2, burst=5)
+@shedder.guard
 def api_fut23_all():
-    """Get all rows from fut23 table"""
+    """FUT23 cards. Optional: fields=Name,Rating  sort=-Rating  page=1&page_size=50 (all rows by default)"""
+    try:
+        query, page, page_size = queries.fut23_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e), "players": []}), 400
+
     try:
-        query = "SELECT * FROM fut23"
-        results = db.execute_query(query)
-        return jsonify({"players": results or [], "count": len(results) if results else 0})
+        results = db.cached_query(query, tables=("fut23",))
+        response = {"players": results or [], "count": len(results) if results else 0}
+        if page is not None:
+            total = db.cached_query(queries.FUT23_COUNT, tables=("fut23",))
+            response.update(page=page, page_size=page_size, total=total[0]["total"] if total else 0)
+        return jsonify(response)
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception("Error fetching fut23 data: %s", e)
         return jsonify({"error": "Database error", "players": []}), 500
 
 @app.route("/api/players/analysis", methods=['GET'])
+@limiter.limit(rate=2, burst=5)
+@shedder.guard
 def api_players_analysis():
     """Get players with most goals but least FIFA ratings (joined player + fut23 tables)"""
     try:
-        query = """
-        SELECT 
-            p.player_id,
-            p.player_name,
-            p.goals,
-            p.assists,
-            p.games,
-            p.xG,
-            p.position,
-            p.team_title,
-            p.year,
-            f.Rating AS fifa_rating,
-            f.Pace,
-            f.Shoot,
-            f.Pass,
-            f.Drible,
-            f.Defense,
-            f.Physical,
-            f.Base_Stats,
-            f.In_Game_Stats,
-            f.Country,
-            f.League
-        FROM player p
-        INNER JOIN fut23 f ON p.player_id = f.player_id
-        WHERE p.goals IS NOT NULL AND f.Rating IS NOT NULL
-        ORDER BY p.goals DESC, f.Rating ASC
-        LIMIT 50
-        """
-        results = db.execute_query(query)
+        results = db.cached_query(queries.PLAYERS_ANALYSIS, tables=("player", "fut23"))
         return jsonify({
             "players": results or [], 
             "count": len(results) if results else 0,
             "description": "Players with most goals and least FIFA ratings"
         })
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception("Error fetching player analysis data: %s", e)
         return jsonify({"error": "Database error", "players": []}), 500
 
 @app.route("/api/players/search", methods=['GET'])
+@limiter.limit(rate=5, burst=10)
+@shedder.guard
+@deadline(2.0)
 def api_players_search():
-    """Search players by name, team, or position"""
+    """Search players by name, team, or position. Optional: fields=, sort=, page=&page_size= (50 per page)"""
     try:
         search_query = request.args.get('q', '').strip()
         if not search_query:
             return jsonify({"players": [], "count": 0})
         
-        # Use LIKE for partial matching
-        search_pattern = f"%{search_query}%"
-        query = """
-        SELECT DISTINCT
-            p.player_id,
-            p.player_name,
-            p.goals,
-            p.assists,
-            p.games,
-            p.xG,
-            p.position,
-            p.team_title,
-            p.year,
-            f.Rating AS fifa_rating,
-            f.Pace,
-            f.Shoot,
-            f.Pass,
-            f.Drible,
-            f.Defense,
-            f.Physical,
-            f.Country,
-            f.League
-        FROM player p
-        LEFT JOIN fut23 f ON p.player_id = f.player_id
-        WHERE p.player_name LIKE %s 
-           OR p.team_title LIKE %s 
-           OR p.position LIKE %s
-        ORDER BY p.player_name
-        LIMIT 50
-        """
-        results = db.execute_query(query, params=[search_pattern, search_pattern, search_pattern])
+        query, params, page, page_size = queries.player_search_query(request.args, search_query)
+        results = db.execute_query(query, params=params)
         return jsonify({
             "players": results or [], 
-            "count": len(results) if results else 0
+            "count": len(results) if results else 0,
+            "page": page,
+            "page_size": page_size
         })
+    except ValueError as e:
+        return jsonify({"error": str(e), "players": []}), 400
+    except (QueryTimeoutError, CircuitOpenError):
+        raise
     except Exception as e:
         logger.exception("Error searching players: %s", e)
         return jsonify({"error": "Database error", "players": []}), 500
 
 @app.route("/api/players/<int:player_id>", methods=['GET'])
 def api_player_detail(player_id):
-    """Get full player details by player_id"""
+    """Get full player details by player_id. Optional: fields=player_name,goals,Rating"""
+    try:
+        query = queries.player_detail_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
-        query = """
-        SELECT 
-            p.season_player_id,
-            p.player_id,
-            p.player_name,
-            p.games,
-            p.time,
-            p.goals,
-            p.xG,
-            p.assists,
-            p.xA,
-            p.shots,
-            p.key_passes,
-            p.yellow_cards,
-            p.red_cards,
-            p.position,
-            p.team_title,
-            p.npg,
-            p.npxG,
-            p.xGChain,
-            p.xGBuildup,
-            p.year,
-            f.Name AS fut23_name,
-            f.Team AS fut23_team,
-            f.team_id,
-            f.Country,
-            f.League,
-            f.Rating,
-            f.Position AS fut23_position,
-            f.Other_Positions,
-            f.Run_type,
-            f.Price,
-            f.Skill,
-            f.Weak_foot,
-            f.Attack_rate,
-            f.Defense_rate,
-            f.Pace,
-            f.Shoot,
-            f.Pass,
-            f.Drible,
-            f.Defense,
-            f.Physical,
-            f.Body_type,
-            f.Height_cm,
-            f.Weight,
-            f.Popularity,
-            f.Base_Stats,
-            f.In_Game_Stats
-        FROM player p
-        LEFT JOIN fut23 f ON p.player_id = f.player_id
-        WHERE p.player_id = %s
-        LIMIT 1
-        """
         results = db.execute_query(query, params=[player_id])
         if not results or len(results) == 0:
             return jsonify({"error": "Player not found"}), 404
-        return jsonify({"player": results[0]})
+        percentiles = player_percentiles.lookup(player_id, results[0].get('year'))
+        return jsonify({"player": results[0], "percentiles": percentiles})
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception("Error fetching player detail: %s", e)
         return jsonify({"error": "Database error"}), 500
 
+@app.route("/api/players/<int:player_id>/similar", methods=['GET'])
+def api_similar_players(player_id):
+    """Closest FUT23 cards by attributes. Optional: k, position, league, max_price (e.g. 500K)"""
+    try:
+        k = max(1, min(int(request.args.get('k', 10)), 100))
+        max_price = request.args.get('max_price')
+        results = similar_players.similar(
+            player_id, k=k,
+            position=request.args.get('position', '').strip() or None,
+            league=request.args.get('league', '').strip() or None,
+            max_price=parse_price(max_price) if max_price else None)
+        if results is None:
+            return jsonify({"error": "Player not found in fut23"}), 404
+        return jsonify({"player_id": player_id, "players": results, "count": len(results)})
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error finding similar players: %s", e)
+        return jsonify({"error": "Database error", "players": []}), 500
+
 @app.route("/talha/<int:player_id>")
 def player_detail(player_id):
     """Individual player detail page"""
@@ -232,190 +250,72 @@ def index():
     """Homepage with search interface"""
     return render_template('shot_search.html')
 
+def _shot_detail(shot_id):
+    """The shot with its match, the player's season row, other shots in the match and season totals"""
+    shot_results = db.execute_query(queries.SHOT_DETAIL, (shot_id,), fetch_all=True)
+    if not shot_results:
+        return None
+    
+    shot = shot_results[0]
+    player_params, other_params, season_params = queries.shot_detail_params(shot)
+    
+    player_results = db.execute_query(queries.SHOT_PLAYER, player_params, fetch_all=True)
+    other_shots = db.execute_query(queries.SHOT_OTHER_SHOTS, other_params, fetch_all=True)
+    season_stats_results = db.execute_query(queries.SHOT_SEASON_STATS, season_params, fetch_all=True)
+    
+    return {"shot": shot,
+            "player": player_results[0] if player_results else None,
+            "other_shots": other_shots,
+            "season_stats": season_stats_results[0] if season_stats_results else None}
+
 @app.route('/shot/<int:shot_id>')
 def shot_detail(shot_id):
     """Display detailed shot information"""
     try:
-        # Get shot details with match information
-        shot_query = """
-            SELECT 
-                s.shot_id,
-                s.minute,
-                s.result,
-                s.X,
-                s.Y,
-                s.xG,
-                s.player,
-                s.h_a,
-                s.player_id,
-                s.situation,
-                s.season,
-                s.shotType,
-                s.match_id,
-                s.h_team,
-                s.a_team,
-                s.h_goals,
-                s.a_goals,
-                s.date,
-                s.player_assisted,
-                s.lastAction,
-                m.league,
-                m.h_xg,
-                m.a_xg
-            FROM shot_data s
-            LEFT JOIN match_info m ON s.match_id = m.match_id
-            WHERE s.shot_id = %s
-        """
-        
-        shot_results = db.execute_query(shot_query, (shot_id,), fetch_all=True)
+        detail = _shot_detail(shot_id)
         
-        if not shot_results:
+        if not detail:
             return render_template('error.html', 
                                  error="Shot not found", 
                                  message=f"No shot found with ID {shot_id}"), 404
         
-        shot = shot_results[0]
-        
-        # Get player information from player table
-        player_query = """
-            SELECT 
-                p.season_player_id,
-                p.player_id,
-                p.player_name,
-                p.games,
-                p.time,
-                p.goals,
-                p.xG,
-                p.assists,
-                p.xA,
-                p.shots,
-                p.key_passes,
-                p.yellow_cards,
-                p.red_cards,
-                p.position,
-                p.team_title,
-                p.npg,
-                p.npxG,
-                p.xGChain,
-                p.xGBuildup,
-                p.year
-            FROM player p
-            WHERE p.player_id = %s AND p.year = %s
-        """
-        
-        player_results = db.execute_query(
-            player_query, 
-            (shot['player_id'], shot['season']), 
-            fetch_all=True
-        )
-        
-        player = player_results[0] if player_results else None
-        
-        # Get other shots by this player in the same match
-        other_shots_query = """
-            SELECT 
-                shot_id,
-                minute,
-                result,
-                xG,
-                situation,
-                shotType
-            FROM shot_data
-            WHERE player_id = %s 
-            AND match_id = %s 
-            AND shot_id != %s
-            ORDER BY minute ASC
-        """
-        
-        other_shots = db.execute_query(
-            other_shots_query,
-            (shot['player_id'], shot['match_id'], shot_id),
-            fetch_all=True
-        )
-        
-        # Get player's season statistics for comparison
-        season_stats_query = """
-            SELECT 
-                COUNT(*) as total_shots,
-                SUM(CASE WHEN result = 'Goal' THEN 1 ELSE 0 END) as goals_scored,
-                AVG(xG) as avg_xg,
-                SUM(xG) as total_xg
-            FROM shot_data
-            WHERE player_id = %s AND season = %s
-        """
-        
-        season_stats_results = db.execute_query(
-            season_stats_query,
-            (shot['player_id'], shot['season']),
-            fetch_all=True
-        )
-        
-        season_stats = season_stats_results[0] if season_stats_results else None
-        
-        return render_template('shot_detail.html',
-                             shot=shot,
-                             player=player,
-                             other_shots=other_shots,
-                             season_stats=season_stats)
+        return render_template('shot_detail.html', **detail)
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception(f"Error fetching shot {shot_id}: {e}")
         return render_template('error.html',
                              error="Database Error",
                              message=str(e)), 500
 
+@app.route('/api/shots/<int:shot_id>')
+@limiter.limit(rate=5, burst=10)
+@shedder.guard
+def api_shot_detail(shot_id):
+    """What the shot detail page shows, as JSON"""
+    try:
+        detail = _shot_detail(shot_id)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error fetching shot %s: %s", shot_id, e)
+        return jsonify({"error": "Database error"}), 500
+    if not detail:
+        return jsonify({"error": f"No shot found with ID {shot_id}"}), 404
+    return jsonify(detail)
+
 
     
 @app.route('/api/search/shots')
+@limiter.limit(rate=5, burst=10)
+@shedder.guard
+@deadline(2.0)
 def search_shots():
     """API endpoint to search for shots"""
     try:
-        player_name = request.args.get('player', '').strip()
-        team = request.args.get('team', '').strip()
-        season = request.args.get('season', '').strip()
-        result = request.args.get('result', '').strip()
-        limit = int(request.args.get('limit', 50))
-        
-        query = """
-            SELECT 
-                s.shot_id,
-                s.player,
-                s.h_team,
-                s.a_team,
-                s.minute,
-                s.result,
-                s.xG,
-                s.situation,
-                s.season,
-                s.date,
-                s.h_a
-            FROM shot_data s
-            WHERE 1=1
-        """
-        
-        params = []
-        
-        if player_name:
-            query += " AND s.player LIKE %s"
-            params.append(f"%{player_name}%")
-        
-        if team:
-            query += " AND (s.h_team LIKE %s OR s.a_team LIKE %s)"
-            params.append(f"%{team}%")
-            params.append(f"%{team}%")
-        
-        if season:
-            query += " AND s.season = %s"
-            params.append(int(season))
-        
-        if result:
-            query += " AND s.result = %s"
-            params.append(result)
-        
-        query += " ORDER BY s.date DESC, s.minute DESC LIMIT %s"
-        params.append(limit)
-        
-        results = db.execute_query(query, tuple(params), fetch_all=True)
+        query, params = queries.shot_search_query(request.args, _team_resolver())
+        results = db.execute_query(query, params, fetch_all=True)
         
         return jsonify({
             'success': True,
@@ -423,6 +323,8 @@ def search_shots():
             'shots': results
         })
         
+    except (QueryTimeoutError, CircuitOpenError):
+        raise
     except Exception as e:
         logger.exception(f"Error searching shots: {e}")
         return jsonify({
@@ -431,7 +333,66 @@ def search_shots():
         }), 500
 
 
+@app.route('/api/export/shots')
+@limiter.limit(rate=0.2, burst=3)
+@shedder.guard
+def export_shots():
+    """Stream every shot matching the search filters as CSV or Parquet (?format=parquet)"""
+    try:
+        where, params = queries.shot_filters(request.args, _team_resolver())
+        query = queries.SHOT_EXPORT + where + " ORDER BY s.date DESC, s.minute DESC"
+        return export_response(db, query, tuple(params), request.args.get('format', 'csv'), "shots")
+    except (ExportFormatError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception(f"Error exporting shots: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/shots/cube')
+@limiter.limit(rate=5, burst=10)
+def api_shot_cube():
+    """Shots, goals and xG rolled up to any subset of team/season/situation/shotType/result.
+
+    ?by=team,season keeps those dimensions, every other dimension given as a
+    parameter slices the cube, e.g. ?by=shotType&team=Barcelona&result=Goal,SavedShot
+    """
+    by = [d for d in request.args.get('by', '').split(',') if d]
+    filters = {dim: request.args.get(dim).split(',') for dim in CUBE_DIMENSIONS if request.args.get(dim)}
+    try:
+        rows = shot_cube.query(by, filters)
+    except CubeQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except CubeUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error querying shot cube: %s", e)
+        return jsonify({"error": "Database error"}), 500
+    return jsonify({"by": by, "filters": filters, "rows": rows})
+
+@app.route('/api/matches/<int:match_id>/timeline')
+@limiter.limit(rate=10, burst=20)
+def api_match_timeline(match_id):
+    """Home/away xG and goals accumulated shot by shot over one match, plus the shots themselves"""
+    try:
+        timeline = match_timelines.get(match_id)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error building timeline of match %s: %s", match_id, e)
+        return jsonify({"error": "Database error"}), 500
+    if timeline is None:
+        return jsonify({"error": f"No shots for match {match_id}"}), 404
+    return jsonify(timeline)
+
 @app.route('/api/players/autocomplete')
+@limiter.limit(rate=10, burst=20)
+@shedder.guard
+@deadline(0.5)
 def players_autocomplete():
     """API endpoint for player name autocomplete"""
     try:
@@ -440,47 +401,32 @@ def players_autocomplete():
         if len(query_str) < 2:
             return jsonify([])
         
-        query = """
-            SELECT DISTINCT player, player_id
-            FROM shot_data
-            WHERE player LIKE %s
-            ORDER BY player
-            LIMIT 20
-        """
-        
-        results = db.execute_query(query, (f"%{query_str}%",), fetch_all=True)
+        results = db.execute_query(queries.PLAYER_AUTOCOMPLETE, (f"%{query_str}%",), fetch_all=True)
         
         return jsonify(results)
         
+    except (QueryTimeoutError, CircuitOpenError):
+        raise
     except Exception as e:
         logger.exception(f"Error in autocomplete: {e}")
         return jsonify([]), 500
 
 
 @app.route('/api/stats/player/<int:player_id>')
+@limiter.limit(rate=5, burst=10)
+@shedder.guard
 def player_stats_api(player_id):
     """API endpoint for player statistics"""
     try:
-        query = """
-            SELECT 
-                p.*,
-                COUNT(DISTINCT s.match_id) as matches_with_shots,
-                COUNT(s.shot_id) as total_shots_taken,
-                SUM(CASE WHEN s.result = 'Goal' THEN 1 ELSE 0 END) as goals_from_shots
-            FROM player p
-            LEFT JOIN shot_data s ON p.player_id = s.player_id AND p.year = s.season
-            WHERE p.player_id = %s
-            GROUP BY p.season_player_id
-            ORDER BY p.year DESC
-        """
-        
-        results = db.execute_query(query, (player_id,), fetch_all=True)
+        results = db.execute_query(queries.PLAYER_STATS, (player_id,), fetch_all=True)
         
         return jsonify({
             'success': True,
             'player_stats': results
         })
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception(f"Error fetching player stats: {e}")
         return jsonify({
@@ -531,6 +477,8 @@ def register():
         try:
             db.execute_query(sql, (username, email, password_hash), fetch_all=False)
             return redirect("/login?registered=true")
+        except CircuitOpenError:
+            raise
         except Exception as e:
             # Check for duplicate username/email
             if "duplicate" in str(e).lower():
@@ -607,6 +555,71 @@ def admin_teams():
 def admin_settings():
     return render_template("admin_settings.html", username=session.get("username"))
 
+@app.route("/admin/metrics")
+@login_required
+def admin_metrics():
+    """Runtime counters of this worker process (pool, query coalescing, writes, live feed)"""
+    metrics = {
+        "pool": db.load(),
+        "load_shed": shedder.shed_count,
+        "group_commit": match_writer.committer.stats,
+        "live_feed": hub.stats,
+    }
+    if db.connected:
+        metrics["single_flight"] = db.flight_stats
+        metrics["circuit_breaker"] = db.breaker.snapshot()
+    if profiler is not None:
+        metrics["profiling"] = profiler.stats
+    return jsonify(metrics)
+
+def _on_import(table, rows):
+    shot_cube.add_rows(table, rows)
+    match_timelines.add_rows(table, rows)
+    hub.publish_rows(table, rows)
+
+@app.route("/admin/jobs")
+@login_required
+def admin_jobs():
+    """Status, durations and last error of every background job in this worker"""
+    return jsonify(jobs.snapshot())
+
+@app.route("/admin/jobs/<name>/run", methods=["POST"])
+@login_required
+def admin_run_job(name):
+    """Run a job now instead of waiting for its interval"""
+    if not jobs.started:
+        return jsonify({"success": False, "error": "Background jobs are disabled (JOBS=0)"}), 409
+    if not jobs.trigger(name):
+        return jsonify({"success": False, "error": f"Unknown job '{name}'"}), 404
+    return jsonify({"success": True, "job": name}), 202
+
+@app.route("/admin/import/<table>", methods=["POST"])
+@login_required
+def admin_import(table):
+    """Stream a CSV (raw text/csv body or multipart 'file' field) into shots, matches or season"""
+    stream = request.stream
+    if request.mimetype == "multipart/form-data":
+        # decoded while importing, request.files would buffer the whole upload first
+        boundary = request.mimetype_params.get("boundary")
+        if not boundary:
+            return jsonify({"success": False, "error": "multipart body without a boundary"}), 400
+        stream = multipart_file(request.stream, boundary.encode("latin-1"))
+
+    try:
+        report = CsvImporter(db, table, on_insert=_on_import, partitioned=_partitioned_layout(),
+                             compact=_compact_layout()).run(stream)
+    except CsvImportError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception(f"Error importing into {table}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    logger.info(f"Imported {report['rows_inserted']} rows into {report['table']} "
+                f"({report['rows_rejected']} rejected, {report['rows_per_sec']} rows/s)")
+    return jsonify({"success": True, **report})
+
 @app.route("/logout")
 def logout():
     session.clear()
@@ -631,83 +644,221 @@ def api_data():
 
 
 @app.route("/api/matches", methods=['POST'])
+@limiter.limit(rate=2, burst=5)
+@shedder.guard
 def api_matches():
     """Return matches filtered by supplied JSON filters."""
     filters = request.get_json(silent=True) or {}
-    limit = min(int(filters.get('limit', 50)), 5000)
-    
-    # Build parameterized query
-    sql = [
-        "SELECT mi.match_id, mi.date, mi.season, mi.league,",
-        "       mi.team_h, mi.team_a, mi.h_goals, mi.a_goals,",
-        "       mi.h_xg, mi.a_xg, mi.h_shot, mi.a_shot,",
-        "       md.isResult, md.xG_h, md.xG_a, md.forecast_w, md.forecast_d, md.forecast_l",
-        "FROM match_info mi",
-        "LEFT JOIN match_data md ON mi.match_id = md.match_id",
-        "WHERE 1=1"
-    ]
-    params = []
-
-    if filters.get('q'):
-        sql.append("AND (LOWER(mi.team_h) LIKE %s OR LOWER(mi.team_a) LIKE %s OR mi.match_id = %s)")
-        q = f"%{filters['q'].lower()}%"
-        params.extend([q, q, filters['q']])
-    
-    if filters.get('season'):
-        sql.append("AND mi.season = %s")
-        params.append(filters['season'])
-    
-    if filters.get('team_home'):
-        sql.append("AND mi.team_h = %s")
-        params.append(filters['team_home'])
-    
-    if filters.get('team_away'):
-        sql.append("AND mi.team_a = %s")
-        params.append(filters['team_away'])
-    
-    if filters.get('date_from'):
-        sql.append("AND mi.date >= %s")
-        params.append(filters['date_from'])
-    
-    if filters.get('date_to'):
-        sql.append("AND mi.date <= %s")
-        params.append(filters['date_to'])
-    
-    if filters.get('min_goals'):
-        sql.append("AND (COALESCE(mi.h_goals,0) + COALESCE(mi.a_goals,0)) >= %s")
-        params.append(int(filters['min_goals']))
-    
-    if filters.get('max_goals'):
-        sql.append("AND (COALESCE(mi.h_goals,0) + COALESCE(mi.a_goals,0)) <= %s")
-        params.append(int(filters['max_goals']))
-    
-    if filters.get('min_xg'):
-        sql.append("AND (COALESCE(mi.h_xg,0) + COALESCE(mi.a_xg,0)) >= %s")
-        params.append(float(filters['min_xg']))
-
-    sql.append(f"ORDER BY mi.date DESC LIMIT {limit}")
-    query = " ".join(sql)
 
     try:
+        query, params, limit = queries.matches_query(filters, _team_resolver())
         matches = db.execute_query(query, params=params)
         return jsonify({"matches": matches or [], "limit": limit})
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception("Error fetching matches: %s", e)
         return jsonify({"error": "Database error", "matches": []}), 500
 
+@app.route("/api/simulate")
+@limiter.limit(rate=0.5, burst=3)
+@shedder.guard
+def api_simulate():
+    """Title/top-4/relegation odds and expected points from simulating the rest of a league-year"""
+    league = request.args.get('league', 'La liga')
+    season = request.args.get('season', type=int)
+    as_of = request.args.get('as_of') # YYYY-MM-DD, replay a finished season from that date
+    simulations = min(request.args.get('sims', DEFAULT_SIMULATIONS, type=int), MAX_SIMULATIONS)
+    if season is None or simulations < 1:
+        return jsonify({"error": "'season' is required and 'sims' must be positive"}), 400
+
+    try:
+        result = season_simulator.project(league, season, as_of, simulations)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error simulating %s %s: %s", league, season, e)
+        return jsonify({"error": "Database error"}), 500
+    if result is None:
+        return jsonify({"error": f"No matches for {league} {season}"}), 404
+    return jsonify(result)
+
+@app.route("/api/export/matches", methods=['GET', 'POST'])
+@limiter.limit(rate=0.2, burst=3)
+@shedder.guard
+def export_matches():
+    """Stream every match matching the /api/matches filters (JSON body or query string) as CSV or Parquet."""
+    filters = request.get_json(silent=True) or request.args.to_dict()
+    try:
+        sql = list(queries.MATCHES_SELECT)
+        params = queries.match_filters(filters, sql, _team_resolver())
+        sql.append("ORDER BY mi.date DESC")
+        return export_response(db, " ".join(sql), params, filters.get('format', 'csv'), "matches")
+    except (ExportFormatError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error exporting matches: %s", e)
+        return jsonify({"error": "Database error"}), 500
+
+def _compact_layout():
+    """True when shot_data/match_info are the read-only views of 'kickstarter.py --compact',
+    writes then go to the compact tables behind them."""
+    if os.getenv('DB_BACKEND', 'mysql').lower() == 'sqlite':
+        return False
+    return bool(db.cached_query(COMPACT_VIEWS_SQL, ttl=60))
+
+def _team_ids(name, exact):
+    """Ids of the team called `name`, or of every team with `name` in its name."""
+    rows = db.cached_query(queries.TEAM_IDS_EXACT if exact else queries.TEAM_IDS_LIKE,
+                           (name if exact else f"%{name}%",), tables=("teams",))
+    return [row["team_id"] for row in rows or []]
+
+def _team_resolver():
+    """The team_ids of queries.shot_filters/match_filters in the compact layout, None otherwise."""
+    return _team_ids if _compact_layout() else None
+
+def _partitioned_layout():
+    """True when shot_data/match_info are partitioned by season ('kickstarter.py --partitioned')
+    and the writers have to check the keys MySQL dropped."""
+    if os.getenv('DB_BACKEND', 'mysql').lower() == 'sqlite':
+        return False
+    return bool(db.cached_query(PARTITIONED_LAYOUT_SQL, ttl=60))
+
+def _write_matches(allowed_ops):
+    try:
+        result = match_writer.write(request.get_json(silent=True), allowed_ops, _partitioned_layout(),
+                                    _compact_layout())
+        return jsonify({"success": True, **result})
+    except WriteValidationError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except mysql.connector.Error as e:
+        # the whole batch was rolled back (duplicate match_id, bad foreign key, ...)
+        return jsonify({"success": False, "error": e.msg}), 409
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.exception("Error writing matches: %s", e)
+        return jsonify({"success": False, "error": "Database error"}), 500
+
+@app.route("/api/stream")
+def api_stream():
+    """Server-sent events for new/changed matches and shots.
+
+    Optional filters: ?team=Sevilla&season=2023&player=<id or name>&types=match,shot
+    Every open stream holds a worker, so each process takes SSE_MAX_SUBSCRIBERS of them
+    (32 on threads, 5000 under gevent: gunicorn -k gevent "app:create_app()") and answers 503 after.
+    """
+    filters = {k: request.args.get(k, '').strip() for k in ("team", "season", "player")}
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    try:
+        sub = hub.subscribe(filters, types, int(last_id) if last_id and last_id.isdigit() else None)
+    except HubFullError as e:
+        return jsonify({"error": str(e)}), 503
+
+    response = Response(hub.stream(sub), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # keep nginx from buffering the stream
+    return response
+
 @app.route("/api/add_match", methods=['POST'])
+@login_required
 def api_add_match():
-    """Create a new match entry in the database.""" # admin user only
-    pass
+    """Create new matches. Body: {"idempotency_key": ..., "operations": [{"match_id", "match_info", "match_data"}]}""" # admin user only
+    return _write_matches(("create",))
 
 @app.route("/api/modify_match", methods=['POST'])
+@login_required
 def api_delete_match():
-    """Modify a match entry from the database. It can be used to delete a match as well.""" # admin user only
-    pass
+    """Modify matches, an operation with "op": "delete" deletes the match instead.""" # admin user only
+    return _write_matches(("modify", "delete"))
+
+
+# -------------------------------------------------
+#  App Factory & Health Checks
+# -------------------------------------------------
+# Pages and cached APIs requested once during warmup so templates are compiled,
+# the pool is open and the query cache is filled before real traffic arrives
+WARMUP_PATHS = ["/", "/shots", "/matches", "/talha", "/api/players/fut23", "/api/players/analysis"]
+
+warmup_state = {"enabled": False, "pid": None, "done": False, "error": None, "seconds": None}
+_warmup_lock = threading.Lock()
+
+
+def _run_warmup():
+    started = time.monotonic()
+    try:
+        db.get()
+        player_percentiles.refresh()
+        client = app.test_client()
+        for path in WARMUP_PATHS:
+            response = client.get(path, environ_base={"REMOTE_ADDR": "warmup"})
+            if response.status_code >= 500:
+                raise RuntimeError(f"warmup request {path} returned {response.status_code}")
+        warmup_state["error"] = None
+    except Exception as e:
+        logger.exception("Warmup failed: %s", e)
+        warmup_state["error"] = str(e)
+    finally:
+        warmup_state["seconds"] = round(time.monotonic() - started, 3)
+        warmup_state["done"] = True
+
+
+@app.before_request
+def _ensure_warmup():
+    """Start warmup once per worker process, it has to run after a prefork server forks."""
+    if not warmup_state["enabled"] or warmup_state["pid"] == os.getpid():
+        return
+    with _warmup_lock:
+        if warmup_state["pid"] != os.getpid():
+            warmup_state.update(pid=os.getpid(), done=False, error=None, seconds=None)
+            threading.Thread(target=_run_warmup, name="warmup", daemon=True).start()
+
+
+@app.before_request
+def _ensure_jobs():
+    """Start the job runner once per worker process, for the same reason as warmup."""
+    if JOBS_ENABLED and not jobs.started:
+        jobs.start()
+
+
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving, does not touch the database."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: warmup has finished and the database answers."""
+    if warmup_state["enabled"] and not warmup_state["done"]:
+        return jsonify({"ready": False, "reason": "warming up"}), 503
+    try:
+        db.execute_query("SELECT 1")
+    except Exception as e:
+        return jsonify({"ready": False, "reason": f"database unavailable: {e}"}), 503
+    return jsonify({"ready": True, "warmup": warmup_state, "pool": db.load()})
+
+
+def create_app(warmup=None):
+    """Return the app for this process without touching MySQL.
+
+    Use it as the server entry point, e.g. gunicorn "app:create_app(warmup=True)".
+    The pool is created lazily in each worker after fork; with warmup enabled
+    (or WARMUP=1) each worker primes itself in the background and /readyz
+    answers 503 until that is done.
+    """
+    if warmup is None:
+        warmup = os.getenv("WARMUP", "0") == "1"
+    warmup_state["enabled"] = bool(warmup)
+    return app
 
 
 # -------------------------------------------------
 #  Main Entry Point
 # -------------------------------------------------
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,130 @@
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from flask import request, send_file
+
+try:
+    import brotli  # optional, gzip is used when it is not installed
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+ASSET_BUILD_DIR = Path(os.getenv('ASSET_BUILD_DIR', './.asset_build'))
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'text/javascript', 'text/css',
+    'text/html', 'text/plain', 'text/csv', 'image/svg+xml',
+}
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+class StaticAssets:
+    """Fingerprinted, precompressed static files plus gzip/brotli for dynamic responses.
+
+    At startup every file under the static folder is hashed; url_for('static', ...)
+    then points at "players.<hash>.js", which is served with an immutable cache
+    header because a content change produces a new URL. Text assets get .gz/.br
+    variants written once into ASSET_BUILD_DIR, keyed by hash so restarts reuse them.
+    """
+
+    def __init__(self, app=None):
+        self.fingerprinted = {}   # "players.js" -> "players.<hash>.js"
+        self.sources = {}         # "players.<hash>.js" -> (original path, {encoding: variant path})
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = Path(app.static_folder)
+        self.build()
+        self._send_unversioned = app.view_functions['static']
+        app.view_functions['static'] = self.send_static
+        app.url_defaults(self._fingerprint_url)
+        app.after_request(self.compress_response)
+
+    def build(self):
+        ASSET_BUILD_DIR.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.static_folder.rglob('*')):
+            if not path.is_file() or path.name.startswith('.'):
+                continue
+
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            rel = path.relative_to(self.static_folder).as_posix()
+            stem, dot, ext = rel.rpartition('.')
+            versioned = f"{stem}.{digest}.{ext}" if dot else f"{rel}.{digest}"
+
+            variants = {}
+            if mimetypes.guess_type(rel)[0] in COMPRESSIBLE_TYPES:
+                for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    target = ASSET_BUILD_DIR / (versioned.replace('/', '__') + suffix)
+                    if not target.exists():
+                        target.write_bytes(_compress(data, encoding))
+                    variants[encoding] = target
+
+            self.fingerprinted[rel] = versioned
+            self.sources[versioned] = (path, variants)
+
+        logger.info("Fingerprinted %d static assets into %s", len(self.sources), ASSET_BUILD_DIR)
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.fingerprinted:
+            values['filename'] = self.fingerprinted[values['filename']]
+
+    def send_static(self, filename):
+        if filename not in self.sources:
+            # old or hand-written unversioned links still work, just without long caching
+            return self._send_unversioned(filename=filename)
+
+        path, variants = self.sources[filename]
+        mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        encoding = next((enc for enc in ('br', 'gzip') if enc in variants and _accepts(enc)), None)
+
+        # each encoding is different bytes, so it needs its own strong validator
+        response = send_file(variants[encoding] if encoding else path, mimetype=mimetype,
+                             conditional=True, etag=f"{filename}-{encoding}" if encoding else filename)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if variants:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE
+        return response
+
+    def compress_response(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+
+        encoding = 'br' if brotli is not None and _accepts('br') else 'gzip' if _accepts('gzip') else None
+        if encoding is None:
+            return response
+
+        response.set_data(_compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        response.vary.add('Accept-Encoding')
+        return response
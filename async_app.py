@@ -0,0 +1,241 @@
+"""Optional asyncio server for the read APIs, on Quart and aiomysql.
+
+A request waiting on MySQL only holds a coroutine here, not a thread, so
+concurrency is bounded by the aiomysql pool rather than threads x pool
+size. Statements come from queries.py, the same ones app.py runs, and the
+independent ones run side by side (the three lookups behind a shot detail).
+
+    pip install quart aiomysql hypercorn
+    hypercorn -w 4 -b 0.0.0.0:8001 async_app:app
+
+Only the read APIs are served; pages, admin, imports, writes and the live
+feed stay on app.py. There is no per-client rate limiting here, keep this
+behind the proxy limits.
+
+Nothing tells this process about writes made through app.py or
+kickstarter.py, so cached reads can be up to CACHE_TTL (60s) stale and the
+similar-player index and percentile table are rebuilt on their max age
+only. Serve from here only what can tolerate that lag.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from dotenv import load_dotenv
+
+try:
+    import aiomysql
+    from quart import Quart, jsonify, request
+except ImportError as e:
+    raise ImportError("async_app needs the optional packages: pip install quart aiomysql hypercorn") from e
+
+import queries
+from utils import QueryCache, QueryTimeoutError, QUERY_TIMEOUT, ER_QUERY_TIMEOUT, _with_max_execution_time
+from similar import PlayerIndex, INDEX_SQL, INDEX_MAX_AGE, parse_price
+from percentiles import PercentileTable, TABLE_SQL
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+ASYNC_POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', '20'))
+CACHE_TTL = 60 # no invalidation signal from the write path here, cached reads only live this long
+PERCENTILES_MAX_AGE = 3600 # for the same reason the percentile table can't wait for a player change
+
+app = Quart(__name__)
+pool = None
+cache = QueryCache(ttl=CACHE_TTL)
+_derived = {} # name -> (built_at, value) for the in-memory indexes
+_derived_locks = defaultdict(asyncio.Lock)
+
+
+@app.before_serving
+async def open_pool():
+    global pool
+    pool = await aiomysql.create_pool(
+        host=os.getenv('MYSQL_HOST'), port=int(os.getenv('MYSQL_PORT') or 3306),
+        user=os.getenv('MYSQL_USER'), password=os.getenv('MYSQL_PASSWORD', ''), db=os.getenv('MYSQL_DB'),
+        minsize=1, maxsize=ASYNC_POOL_SIZE, autocommit=True, cursorclass=aiomysql.DictCursor)
+    # built before the first request instead of by it
+    await derived("percentiles", TABLE_SQL, PercentileTable, PERCENTILES_MAX_AGE)
+
+
+@app.after_serving
+async def close_pool():
+    pool.close()
+    await pool.wait_closed()
+
+
+async def fetch(query, params=None, timeout=QUERY_TIMEOUT):
+    """execute_query for coroutines: every row as a dict, SELECTs capped by MAX_EXECUTION_TIME."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            try:
+                await cur.execute(_with_max_execution_time(query, timeout), params)
+            except aiomysql.OperationalError as err:
+                if err.args and err.args[0] == ER_QUERY_TIMEOUT:
+                    raise QueryTimeoutError(f"Query did not finish within {timeout}s") from err
+                raise
+            return await cur.fetchall()
+
+
+async def cached_fetch(query, params=None):
+    key = (query, tuple(params) if params else None)
+    hit, results = cache.get(key)
+    if not hit:
+        results = await fetch(query, params)
+        cache.put(key, results)
+    return results
+
+
+async def derived(name, sql, build, max_age):
+    """An in-memory index built from one query, rebuilt off the event loop every max_age seconds."""
+    entry = _derived.get(name)
+    if entry is None or time.monotonic() - entry[0] > max_age:
+        async with _derived_locks[name]:
+            entry = _derived.get(name)
+            if entry is None or time.monotonic() - entry[0] > max_age:
+                rows = await fetch(sql)
+                entry = _derived[name] = (time.monotonic(), await asyncio.to_thread(build, list(rows)))
+    return entry[1]
+
+
+@app.errorhandler(QueryTimeoutError)
+async def query_timeout(e):
+    return jsonify({"error": "The database took too long to answer, try narrowing the search"}), 504
+
+
+@app.errorhandler(aiomysql.Error)
+async def database_error(e):
+    logger.exception("Error on %s: %s", request.path, e)
+    return jsonify({"error": "Database error"}), 500
+
+
+@app.route("/healthz")
+async def healthz():
+    return jsonify({"status": "ok", "pool": {"size": pool.size, "free": pool.freesize}})
+
+
+# ---------------- PLAYERS ---------------- #
+
+@app.route("/api/players/fut23")
+async def api_fut23_all():
+    try:
+        query, page, page_size = queries.fut23_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e), "players": []}), 400
+    if page is None:
+        results = await cached_fetch(query)
+        return jsonify({"players": results, "count": len(results)})
+    results, total = await asyncio.gather(cached_fetch(query), cached_fetch(queries.FUT23_COUNT))
+    return jsonify({"players": results, "count": len(results),
+                    "page": page, "page_size": page_size, "total": total[0]["total"] if total else 0})
+
+
+@app.route("/api/players/analysis")
+async def api_players_analysis():
+    results = await cached_fetch(queries.PLAYERS_ANALYSIS)
+    return jsonify({"players": results, "count": len(results),
+                    "description": "Players with most goals and least FIFA ratings"})
+
+
+@app.route("/api/players/search")
+async def api_players_search():
+    search_query = request.args.get('q', '').strip()
+    if not search_query:
+        return jsonify({"players": [], "count": 0})
+    try:
+        query, params, page, page_size = queries.player_search_query(request.args, search_query)
+    except ValueError as e:
+        return jsonify({"error": str(e), "players": []}), 400
+    results = await fetch(query, params, timeout=2.0)
+    return jsonify({"players": results, "count": len(results), "page": page, "page_size": page_size})
+
+
+@app.route("/api/players/autocomplete")
+async def players_autocomplete():
+    query_str = request.args.get('q', '').strip()
+    if len(query_str) < 2:
+        return jsonify([])
+    return jsonify(await fetch(queries.PLAYER_AUTOCOMPLETE, (f"%{query_str}%",), timeout=0.5))
+
+
+@app.route("/api/players/<int:player_id>")
+async def api_player_detail(player_id):
+    try:
+        query = queries.player_detail_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    results, table = await asyncio.gather(
+        fetch(query, (player_id,)), derived("percentiles", TABLE_SQL, PercentileTable, PERCENTILES_MAX_AGE))
+    if not results:
+        return jsonify({"error": "Player not found"}), 404
+    return jsonify({"player": results[0], "percentiles": table.lookup(player_id, results[0].get('year'))})
+
+
+@app.route("/api/players/<int:player_id>/similar")
+async def api_similar_players(player_id):
+    try:
+        k = max(1, min(int(request.args.get('k', 10)), 100))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    index = await derived("similar", INDEX_SQL, PlayerIndex, INDEX_MAX_AGE)
+    max_price = request.args.get('max_price')
+    results = index.nearest(player_id, k=k,
+                            position=request.args.get('position', '').strip() or None,
+                            league=request.args.get('league', '').strip() or None,
+                            max_price=parse_price(max_price) if max_price else None)
+    if results is None:
+        return jsonify({"error": "Player not found in fut23"}), 404
+    return jsonify({"player_id": player_id, "players": results, "count": len(results)})
+
+
+@app.route("/api/stats/player/<int:player_id>")
+async def player_stats_api(player_id):
+    return jsonify({'success': True, 'player_stats': await fetch(queries.PLAYER_STATS, (player_id,))})
+
+
+# ---------------- SHOTS ---------------- #
+
+@app.route("/api/search/shots")
+async def search_shots():
+    try:
+        query, params = queries.shot_search_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    results = await fetch(query, params, timeout=2.0)
+    return jsonify({'success': True, 'count': len(results), 'shots': results})
+
+
+@app.route("/api/shots/<int:shot_id>")
+async def api_shot_detail(shot_id):
+    shot_results = await fetch(queries.SHOT_DETAIL, (shot_id,))
+    if not shot_results:
+        return jsonify({"error": f"No shot found with ID {shot_id}"}), 404
+    shot = shot_results[0]
+    player_params, other_params, season_params = queries.shot_detail_params(shot)
+    # the player row, the other shots and the season totals only need the shot, ask for all three at once
+    player_results, other_shots, season_stats_results = await asyncio.gather(
+        fetch(queries.SHOT_PLAYER, player_params),
+        fetch(queries.SHOT_OTHER_SHOTS, other_params),
+        fetch(queries.SHOT_SEASON_STATS, season_params))
+    return jsonify({"shot": shot,
+                    "player": player_results[0] if player_results else None,
+                    "other_shots": other_shots,
+                    "season_stats": season_stats_results[0] if season_stats_results else None})
+
+
+# ---------------- MATCHES ---------------- #
+
+@app.route("/api/matches", methods=['POST'])
+async def api_matches():
+    filters = await request.get_json(silent=True) or {}
+    try:
+        query, params, limit = queries.matches_query(filters)
+    except ValueError as e:
+        return jsonify({"error": str(e), "matches": []}), 400
+    return jsonify({"matches": await fetch(query, params), "limit": limit})
+
+
+if __name__ == "__main__":
+    app.run(port=int(os.getenv('ASYNC_PORT', '8001')))
@@ -0,0 +1,157 @@
+"""Load test of the read APIs: the Flask app against the asyncio server at high concurrency.
+
+Start both against the same MySQL, then point this at them:
+
+    gunicorn -w 4 --threads 16 -b 127.0.0.1:8000 "bench:sync_app()"
+    hypercorn -w 4 -b 127.0.0.1:8001 async_app:app
+    python bench.py http://127.0.0.1:8000 http://127.0.0.1:8001 -c 512 -d 30
+
+Every target gets the same seeded request mix (shot search, player search,
+autocomplete, player detail and stats, shot detail, matches). Prints
+throughput, error counts and latency percentiles per endpoint.
+
+The async-vs-sync comparison this was written for has not been run yet,
+so that work is still open. async_app imports and registers its routes with
+quart 0.22 and aiomysql 0.3 (tests/test_async_app.py), but it has never
+served a request: no MySQL was available. The only numbers so far are for
+the sync app on the SQLite backend. Don't quote a speedup for async_app
+before running both targets above against the same MySQL.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+
+def sync_app():
+    """The Flask app with rate limits and load shedding lifted, so the benchmark
+    measures serving instead of 429s and 503s (async_app has neither)."""
+    import app as webapp
+    flask_app = webapp.create_app()
+    flask_app.config["RATE_LIMITS"] = {rule.endpoint: (1e9, 1e9) for rule in flask_app.url_map.iter_rules()}
+    webapp.shedder.max_waiting = float("inf")
+    return flask_app
+
+
+def _get_json(base, path):
+    parts = urlsplit(base)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    if response.status != 200:
+        sys.exit(f"{base}{path} answered {response.status}, is the server up and the database loaded?")
+    return json.loads(body)
+
+
+def workload(base, size=500, seed=0):
+    """[(label, method, path, body)] drawn from real shots and players of the target."""
+    shots = _get_json(base, "/api/search/shots?limit=200")["shots"]
+    if not shots:
+        sys.exit("No shots in the database to build a workload from")
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(size):
+        shot = rng.choice(shots)
+        prefix = quote((shot["player"] or "a")[:4])
+        mix.append(rng.choice([
+            ("search shots", "GET", f"/api/search/shots?player={prefix}&season={shot['season']}", None),
+            ("players search", "GET", f"/api/players/search?q={prefix}", None),
+            ("autocomplete", "GET", f"/api/players/autocomplete?q={prefix}", None),
+            ("shot detail", "GET", f"/api/shots/{shot['shot_id']}", None),
+            ("matches", "POST", "/api/matches", json.dumps({"season": shot["season"], "limit": 50})),
+        ]))
+    players = _get_json(base, "/api/players/search?q=a&fields=player_id&page_size=200")["players"]
+    for _ in range(size // 4 if players else 0):
+        player_id = rng.choice(players)["player_id"]
+        mix.append(rng.choice([
+            ("player detail", "GET", f"/api/players/{player_id}", None),
+            ("player stats", "GET", f"/api/stats/player/{player_id}", None),
+        ]))
+    rng.shuffle(mix)
+    return mix
+
+
+def _client(base, mix, offset, stop_at, samples):
+    """One keep-alive connection sending requests back to back until stop_at."""
+    parts = urlsplit(base)
+    conn = None
+    i = offset
+    while time.monotonic() < stop_at:
+        label, method, path, body = mix[i % len(mix)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"} if body else {})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = 0 # connection refused/reset or timed out
+            conn = None
+        samples.append((label, status, time.perf_counter() - started))
+
+
+def _run_process(base, mix, clients, first, duration):
+    samples = []
+    stop_at = time.monotonic() + duration
+    threads = [threading.Thread(target=_client, args=(base, mix, first + i * 7, stop_at, samples))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def run(base, mix, concurrency, duration, processes):
+    """Samples of `concurrency` clients split over `processes` (one Python process can't drive hundreds)."""
+    per_process = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(_run_process, base, mix, n, sum(per_process[:i]), duration)
+                   for i, n in enumerate(per_process) if n]
+        return [sample for future in futures for sample in future.result()]
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)] * 1000 if sorted_values else 0
+
+
+def report(base, samples, duration):
+    by_label = defaultdict(list)
+    for label, status, seconds in samples:
+        by_label[label].append((status, seconds))
+    print(f"\n{base}: {len(samples)} requests, {len(samples) / duration:.0f} req/s")
+    print(f"{'endpoint':<16}{'req/s':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for label, results in sorted(by_label.items()) + [("all", [(s, t) for _, s, t in samples])]:
+        ok = sorted(t for s, t in results if s == 200)
+        statuses = defaultdict(int)
+        for status, _ in results:
+            statuses[status] += 1
+        print(f"{label:<16}{len(results) / duration:>8.0f}{len(results) - len(ok):>8}"
+              f"{_percentile(ok, 0.5):>9.1f}{_percentile(ok, 0.95):>9.1f}{_percentile(ok, 0.99):>9.1f}  "
+              + " ".join(f"{k}:{v}" for k, v in sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("targets", nargs="+", help="base URLs, e.g. http://127.0.0.1:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=256, help="clients in flight per target")
+    parser.add_argument("-d", "--duration", type=float, default=20, help="seconds per target")
+    parser.add_argument("-p", "--processes", type=int, default=4, help="client processes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mix = workload(args.targets[0], seed=args.seed)
+    for target in args.targets:
+        run(target, mix, min(args.concurrency, 8), 2, 1) # warm caches and pools first
+        report(target, run(target, mix, args.concurrency, args.duration, args.processes), args.duration)
@@ -0,0 +1,182 @@
+import time
+import logging
+import threading
+from collections import defaultdict
+import numpy as np
+import mysql.connector
+from utils import on_invalidate
+from kickstarter import SHOT_CUBE, SHOT_CUBE_SELECT, SHOT_CUBE_UPSERT, SHOT_CUBE_DIMENSIONS as DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+CUBE_MAX_AGE = 300 # other workers' imports only show up through the table, reload every few minutes
+CUBE_REBUILD_INTERVAL = 6 * 3600
+
+
+class CubeQueryError(Exception):
+    """Unknown dimension in a cube query."""
+
+
+class CubeUnavailableError(Exception):
+    """shot_cube doesn't exist yet, it is being built in the background."""
+
+
+class ShotCubeIndex:
+    """The cube cells as dictionary-encoded NumPy columns.
+
+    Each dimension is an array of small integer codes into its sorted labels,
+    so a slice is a few boolean masks and a roll-up is one bincount over the
+    combined codes of the kept dimensions.
+    """
+
+    def __init__(self, cells):
+        self.built_at = time.monotonic()
+        self.labels = {}
+        self.codes = {}
+        for dim in DIMENSIONS:
+            values = np.array([cell[dim] for cell in cells], dtype=object)
+            labels, codes = np.unique(values.astype(str), return_inverse=True)
+            self.labels[dim] = labels
+            self.codes[dim] = codes.astype(np.int32)
+        self.shots = np.array([cell["shots"] for cell in cells], dtype=np.int64)
+        self.goals = np.array([cell["goals"] for cell in cells], dtype=np.int64)
+        self.xg = np.array([cell["xg"] for cell in cells], dtype=np.float64)
+        self.cells = len(cells)
+
+    def query(self, by=(), filters=None):
+        """Roll the cube up to the `by` dimensions after slicing on `filters`.
+
+        filters maps a dimension to the list of values to keep, e.g.
+        {"season": ["2020"], "result": ["Goal", "SavedShot"]}.
+        """
+        unknown = [d for d in list(by) + list(filters or {}) if d not in DIMENSIONS]
+        if unknown:
+            raise CubeQueryError(f"Unknown dimension(s) {', '.join(unknown)}, expected {', '.join(DIMENSIONS)}")
+
+        mask = np.ones(self.cells, dtype=bool)
+        for dim, values in (filters or {}).items():
+            wanted = np.flatnonzero(np.isin(self.labels[dim], [str(v) for v in values]))
+            mask &= np.isin(self.codes[dim], wanted)
+
+        sizes = [len(self.labels[dim]) for dim in by]
+        if by:
+            key = np.ravel_multi_index([self.codes[dim][mask] for dim in by], sizes)
+            groups, inverse = np.unique(key, return_inverse=True)
+        else:
+            groups, inverse = np.zeros(1, dtype=np.int64), np.zeros(int(mask.sum()), dtype=np.intp)
+
+        shots = np.bincount(inverse, self.shots[mask], len(groups))
+        goals = np.bincount(inverse, self.goals[mask], len(groups))
+        xg = np.bincount(inverse, self.xg[mask], len(groups))
+        coords = np.unravel_index(groups, sizes) if by else []
+
+        rows = []
+        for g in np.argsort(-shots, kind="stable"):
+            row = {dim: self.labels[dim][coords[d][g]] for d, dim in enumerate(by)}
+            if "season" in row:
+                row["season"] = int(row["season"])
+            row.update(shots=int(shots[g]), goals=int(goals[g]), xg=round(float(xg[g]), 3),
+                       xg_per_shot=round(float(xg[g] / shots[g]), 4) if shots[g] else None)
+            rows.append(row)
+        return rows
+
+
+class ShotCube:
+    """shot_cube served from memory, kept current as shots are imported."""
+
+    def __init__(self, db):
+        self.db = db
+        self._index = None
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._schema_ready = False
+        self.background = False # a JobRunner refreshes it, requests only ever build the first one
+        on_invalidate(self._on_invalidate)
+
+    def _on_invalidate(self, tables):
+        if ("shot_data" in tables or "shot_cube" in tables) and not self.background:
+            self._index = None
+
+    def _build(self):
+        started = time.monotonic()
+        try:
+            cells = self.db.execute_query("SELECT * FROM shot_cube")
+        except mysql.connector.ProgrammingError as e:
+            # database loaded before the cube existed; aggregating every shot per request is
+            # exactly what the cube avoids, so build it once off the request path instead
+            logger.warning("shot_cube is missing, building it in the background")
+            self.rebuild_later()
+            raise CubeUnavailableError("The shot cube is being built, try again shortly") from e
+        index = ShotCubeIndex(cells or [])
+        logger.info("Loaded shot cube of %d cells in %.1f ms", index.cells, (time.monotonic() - started) * 1000)
+        return index
+
+    def refresh(self):
+        with self._lock:
+            self._index = self._build()
+
+    def rebuild(self):
+        """Recompute shot_cube from shot_data in one transaction, then reload it.
+
+        Folding imports in cell by cell drifts if shots are ever edited or
+        deleted; this resets the table to the exact aggregate.
+        """
+        self.db.execute_query(SHOT_CUBE, fetch_all=False)
+        with self.db.transaction() as cur:
+            cur.execute("DELETE FROM shot_cube")
+            cur.execute(f"INSERT INTO shot_cube {SHOT_CUBE_SELECT}")
+        self.refresh()
+
+    def rebuild_later(self):
+        """rebuild() in a background thread, unless one is already running."""
+        if not self._rebuilding.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.exception("Rebuilding shot_cube failed: %s", e)
+            finally:
+                self._rebuilding.release()
+        threading.Thread(target=run, name="shot-cube-rebuild", daemon=True).start()
+
+    def index(self):
+        index = self._index
+        if index is None or not self.background and time.monotonic() - index.built_at > CUBE_MAX_AGE:
+            with self._lock:
+                if self._index is index:
+                    self._index = self._build()
+                index = self._index
+        return index
+
+    def query(self, by=(), filters=None):
+        return self.index().query(by, filters)
+
+    def add_rows(self, table, rows):
+        """importer on_insert hook: fold newly inserted shots into shot_cube.
+
+        The shots are committed by then, so when the upsert fails the cube is
+        rebuilt from shot_data instead of failing the import.
+        """
+        if table != "shot_data" or not rows:
+            return
+        cells = defaultdict(lambda: [0, 0, 0.0])
+        for row in rows:
+            team = row.get("h_team") if row.get("h_a") == "h" else row.get("a_team")
+            key = (team or "", row.get("season") or 0, row.get("situation") or "",
+                   row.get("shotType") or "", row.get("result") or "")
+            cell = cells[key]
+            cell[0] += 1
+            cell[1] += row.get("result") == "Goal"
+            cell[2] += row.get("xG") or 0
+        try:
+            if not self._schema_ready:
+                self.db.execute_query(SHOT_CUBE, fetch_all=False)
+                self._schema_ready = True
+            with self.db.transaction() as cur:
+                cur.executemany(SHOT_CUBE_UPSERT, [(*key, *cell) for key, cell in cells.items()])
+        except Exception as e:
+            logger.exception("Folding %d shots into shot_cube failed, rebuilding it: %s", len(rows), e)
+            self.rebuild_later()
+        # the importer invalidates shot_data once it's done, which reloads the in-memory copy
@@ -0,0 +1,6 @@
+-- Replay protection for the batch write APIs (/api/add_match, /api/modify_match)
+CREATE TABLE IF NOT EXISTS api_idempotency_keys (
+    idempotency_key VARCHAR(128) PRIMARY KEY,
+    response TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
@@ -0,0 +1,154 @@
+import os
+import json
+import queue
+import threading
+import itertools
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_BUFFER = int(os.getenv('SSE_BUFFER', '256'))
+HEARTBEAT_SECONDS = 15
+REPLAY_SIZE = 1024
+
+
+def _default_max_subscribers():
+    """A stream holds its worker for as long as the client stays connected. Under
+    gevent (gunicorn -k gevent) that is a greenlet and thousands are fine, on
+    OS threads it is a whole request thread, so only a few per process."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return 32
+    return 5000 if monkey.is_module_patched("threading") else 32
+
+
+MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS') or _default_max_subscribers())
+# which write-path table feeds which event type
+TABLE_EVENTS = {"shot_data": "shot", "match_info": "match", "match_data": "match"}
+
+
+class HubFullError(Exception):
+    """No room for another subscriber."""
+
+
+class Subscription:
+    """One client's filters plus a bounded buffer of events waiting to be sent."""
+
+    def __init__(self, filters, types, maxsize):
+        self.filters = filters
+        self.types = types
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def wants(self, kind, payload):
+        if self.types and kind not in self.types:
+            return False
+        team = self.filters.get("team")
+        if team:
+            teams = {str(payload.get(k, "")).lower()
+                     for k in ("team_h", "team_a", "h_team", "a_team", "h_title", "a_title")}
+            if team.lower() not in teams:
+                return False
+        season = self.filters.get("season")
+        if season and str(payload.get("season")) != season:
+            return False
+        player = self.filters.get("player")
+        if player:
+            if player.isdigit():
+                if str(payload.get("player_id")) != player:
+                    return False
+            elif player.lower() not in str(payload.get("player", "")).lower():
+                return False
+        return True
+
+
+class EventHub:
+    """In-process publish/subscribe for new matches and shots.
+
+    Write paths publish once and every subscriber whose filters match gets the
+    event in its own bounded queue. Publishing never blocks: a subscriber whose
+    queue is full is a slow consumer and gets disconnected, it can reconnect with
+    Last-Event-ID and catch up from the last REPLAY_SIZE events.
+    """
+
+    def __init__(self, buffer_size=SUBSCRIBER_BUFFER, max_subscribers=MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._recent = deque(maxlen=REPLAY_SIZE)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = {"published": 0, "delivered": 0, "dropped_subscribers": 0}
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, filters=None, types=None, last_event_id=None):
+        sub = Subscription(filters or {}, set(types or ()), self.buffer_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise HubFullError(f"{self.max_subscribers} subscribers already connected")
+            if last_event_id is not None:
+                missed = [e for e in self._recent if e[0] > last_event_id and sub.wants(e[1], e[2])]
+                for event in missed[-self.buffer_size:]:
+                    sub.queue.put_nowait(event)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, kind, payload):
+        with self._lock:
+            event = (next(self._ids), kind, payload)
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+
+        delivered, dropped = 0, []
+        for sub in subscribers:
+            if not sub.wants(kind, payload):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+                delivered += 1
+            except queue.Full:
+                sub.dropped = True
+                dropped.append(sub)
+
+        with self._lock:
+            self._subscribers.difference_update(dropped)
+            self.stats["published"] += 1
+            self.stats["delivered"] += delivered
+            self.stats["dropped_subscribers"] += len(dropped)
+
+    def publish_rows(self, table, rows):
+        """Publish inserted/changed rows of a write-path table as events."""
+        kind = TABLE_EVENTS.get(table)
+        if kind is None or not self._subscribers:
+            return
+        for row in rows:
+            self.publish(kind, row)
+
+    def stream(self, sub):
+        """Yield server-sent-event text for a subscription until it is dropped or closed."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_id, kind, payload = sub.queue.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    if sub.dropped:
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                data = json.dumps(payload, default=str)
+                yield f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+                if sub.dropped and sub.queue.empty():
+                    break
+            yield "event: dropped\ndata: {\"reason\": \"slow consumer\"}\n\n"
+        finally:
+            self.unsubscribe(sub)
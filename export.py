@@ -0,0 +1,117 @@
+import io
+import csv
+import logging
+from datetime import datetime
+from flask import Response
+from kickstarter import TABLES, table_columns
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 2000
+FORMATS = ("csv", "parquet")
+
+
+class ExportFormatError(Exception):
+    """Unknown export format, or parquet asked for without pyarrow installed."""
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that collects what ParquetWriter writes until it is taken."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_schema(pa, columns):
+    # column types come from the kickstarter DDL, anything unknown is exported as text
+    sql_types = {}
+    for table in TABLES:
+        for name, sql_type in table_columns(table):
+            sql_types.setdefault(name, sql_type)
+    arrow_types = {"BIGINT": pa.int64(), "INT": pa.int64(), "DOUBLE": pa.float64(),
+                   "BOOLEAN": pa.bool_(), "DATETIME": pa.timestamp("s")}
+    return pa.schema([(c, arrow_types.get(sql_types.get(c), pa.string())) for c in columns])
+
+
+def _parquet_chunks(pa, pq, columns, batches):
+    schema = _arrow_schema(pa, columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            arrays = []
+            for field, values in zip(schema, zip(*batch)):
+                if pa.types.is_string(field.type):
+                    values = [None if v is None else str(v) for v in values]
+                elif pa.types.is_boolean(field.type):
+                    values = [None if v is None else bool(v) for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            # one row group per batch, written out as soon as it is encoded
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def export_response(db, query, params, fmt, name):
+    """Stream the result of `query` as a CSV or Parquet download.
+
+    The rows come from DatabaseConnector.stream_query, so the worker holds one
+    batch in memory and the pooled connection only while the transfer runs.
+    """
+    if fmt not in FORMATS:
+        raise ExportFormatError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportFormatError("Parquet export needs the pyarrow package, use format=csv")
+
+    rows = db.stream_query(query, params, batch_size=EXPORT_BATCH_SIZE)
+    # run the query now so database errors still become a proper error response
+    columns = next(rows)
+
+    def generate():
+        if fmt == "csv":
+            yield from _csv_chunks([[columns]])
+            yield from _csv_chunks(rows)
+        else:
+            for chunk in _parquet_chunks(pa, pq, columns, rows):
+                if chunk:
+                    yield chunk
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    response = Response(generate(), mimetype="text/csv" if fmt == "csv" else "application/vnd.apache.parquet")
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}-{stamp}.{fmt}"'
+    response.call_on_close(rows.close)
+    return response
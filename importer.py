@@ -0,0 +1,305 @@
+import io
+import csv
+import time
+import logging
+from datetime import datetime
+import mysql.connector
+from werkzeug.sansio.multipart import MultipartDecoder, NEED_DATA, File, Field, Data, Epilogue
+from kickstarter import table_columns, primary_key, unenforced_constraints, compact_row, COMPACT_TABLES
+
+logger = logging.getLogger(__name__)
+
+# URL name -> table, only the tables that grow during a season can be imported
+IMPORTABLE_TABLES = {
+    "shots": "shot_data",
+    "shot_data": "shot_data",
+    "matches": "match_info",
+    "match_info": "match_info",
+    "match_data": "match_data",
+    "season": "season",
+}
+BATCH_SIZE = 1000
+MAX_REPORTED_REJECTS = 100
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class CsvImportError(Exception):
+    """The upload as a whole can't be imported (unknown table, bad header)."""
+
+
+class MultipartFileStream(io.RawIOBase):
+    """Bytes of one file field of a multipart/form-data body, decoded while they are read.
+
+    request.files would spool the whole upload to memory or a temp file first,
+    this feeds the request stream to werkzeug's sans-IO decoder a chunk at a time.
+    """
+
+    def __init__(self, stream, boundary, field="file", chunk_size=UPLOAD_CHUNK_SIZE):
+        self._stream = stream
+        self._decoder = MultipartDecoder(boundary)
+        self._field = field
+        self._chunk_size = chunk_size
+        self._buffer = b""
+        self._in_field = False
+        self._eof = False
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._done:
+            self._next_event()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def _next_event(self):
+        try:
+            event = self._decoder.next_event()
+        except ValueError as e: # the body ended or broke off inside a part
+            raise CsvImportError(f"Malformed multipart upload: {e}") from e
+        if event is NEED_DATA:
+            if self._eof:
+                raise CsvImportError("Upload ended in the middle of the multipart body")
+            chunk = self._stream.read(self._chunk_size)
+            self._eof = not chunk
+            self._decoder.receive_data(chunk or None)
+        elif isinstance(event, (File, Field)):
+            self._done = self._in_field # the file field is over, ignore the parts after it
+            self._in_field = event.name == self._field
+        elif isinstance(event, Data) and self._in_field:
+            self._buffer = event.data
+            self._done = not event.more_data
+        elif isinstance(event, Epilogue):
+            self._done = True
+
+
+def multipart_file(stream, boundary, field="file"):
+    """Buffered binary stream of the `field` file of a multipart body, see MultipartFileStream."""
+    return io.BufferedReader(MultipartFileStream(stream, boundary, field), UPLOAD_CHUNK_SIZE)
+
+
+def coerce_value(value, sql_type):
+    """Turn one CSV cell into the Python value for a column of `sql_type`, or raise ValueError."""
+    if value is None or value.strip() in ("", "nan", "NaN", "NA"):
+        return None
+    value = value.strip()
+
+    if sql_type in ("BIGINT", "INT"):
+        number = float(value) # ids come out of pandas as "2250.0"
+        if not number.is_integer():
+            raise ValueError(f"{value!r} is not an integer")
+        return int(number)
+    if sql_type == "DOUBLE":
+        return float(value)
+    if sql_type == "BOOLEAN":
+        if value.lower() in ("true", "1"):
+            return True
+        if value.lower() in ("false", "0"):
+            return False
+        raise ValueError(f"{value!r} is not a boolean")
+    if sql_type == "DATETIME":
+        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                pass
+        raise ValueError(f"{value!r} is not a datetime")
+    if sql_type.startswith(("VARCHAR", "CHAR")):
+        max_len = int(sql_type[sql_type.index("(") + 1:-1])
+        if len(value) > max_len:
+            raise ValueError(f"longer than {max_len} characters")
+        return value
+    return value
+
+
+class CsvImporter:
+    """Streams a CSV upload into one table in batched transactions.
+
+    Rows are read and validated one at a time against the column types in
+    kickstarter.TABLES, so memory stays at one batch no matter how big the file
+    is. Each batch checks a connection out, commits, and gives it back, so a long
+    upload never pins a pooled connection. If MySQL rejects a batch (duplicate
+    key, missing parent row) the batch is replayed row by row to find the bad rows.
+    With `partitioned` the keys MySQL no longer checks in that layout are looked
+    up before each batch instead. With `compact` shot_data/match_info rows go to
+    their compact table, names turned into ids by kickstarter.compact_row.
+    """
+
+    def __init__(self, db, name, batch_size=BATCH_SIZE, on_insert=None, partitioned=False, compact=False):
+        if name not in IMPORTABLE_TABLES:
+            raise CsvImportError(f"Unknown import table '{name}', expected one of {sorted(IMPORTABLE_TABLES)}")
+        self.db = db
+        self.table = IMPORTABLE_TABLES[name]
+        self.types = dict(table_columns(self.table))
+        self.key = primary_key(self.table)
+        self.batch_size = batch_size
+        self.on_insert = on_insert # called as on_insert(table, rows) after each committed batch
+        self.unique_key, self.references = unenforced_constraints(self.table) if partitioned else (None, [])
+        self.compact = compact and self.table in COMPACT_TABLES
+        self.report = {"table": self.table, "rows_read": 0, "rows_inserted": 0,
+                       "rows_rejected": 0, "batches": 0, "rejected": []}
+
+    def _reject(self, line, reason):
+        self.report["rows_rejected"] += 1
+        if len(self.report["rejected"]) < MAX_REPORTED_REJECTS:
+            self.report["rejected"].append({"line": line, "reason": reason})
+
+    def run(self, stream):
+        """Import a binary stream of CSV text and return the report."""
+        started = time.monotonic()
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+
+        try:
+            header = next(reader)
+        except StopIteration:
+            raise CsvImportError("Empty upload")
+        # same column cleanup as kickstarter.insert_from_csv
+        columns = [c.replace(".", "_").strip() for c in header]
+        keep = [i for i, c in enumerate(columns) if c and not c.lower().startswith("unnamed")]
+        columns = [columns[i] for i in keep]
+
+        unknown = [c for c in columns if c not in self.types]
+        if unknown:
+            raise CsvImportError(f"Columns not in {self.table}: {', '.join(unknown)}")
+        if self.key not in columns:
+            raise CsvImportError(f"Missing primary key column '{self.key}'")
+
+        sql = (f"INSERT INTO {self.table} ({','.join(f'`{c}`' for c in columns)}) "
+               f"VALUES ({','.join(['%s'] * len(columns))})")
+        key_index = columns.index(self.key)
+
+        batch = []
+        for line, raw in enumerate(reader, start=2):
+            if not raw:
+                continue
+            self.report["rows_read"] += 1
+            if len(raw) != len(header):
+                self._reject(line, f"expected {len(header)} fields, got {len(raw)}")
+                continue
+            try:
+                row = tuple(coerce_value(raw[i], self.types[c]) for i, c in zip(keep, columns))
+            except ValueError as e:
+                self._reject(line, str(e))
+                continue
+            if row[key_index] is None:
+                self._reject(line, f"{self.key} is empty")
+                continue
+
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self._flush(sql, batch, columns)
+                batch = []
+        if batch:
+            self._flush(sql, batch, columns)
+
+        self.db.invalidate(self.table, *(("teams",) if self.compact else ()))
+        elapsed = time.monotonic() - started
+        self.report["seconds"] = round(elapsed, 3)
+        self.report["rows_per_sec"] = round(self.report["rows_read"] / elapsed, 1) if elapsed else None
+        return self.report
+
+    def _flush(self, sql, batch, columns):
+        self.report["batches"] += 1
+        try:
+            with self.db.transaction() as cur:
+                batch = self._enforce(cur, batch, columns)
+                batch, statements = self._statements(cur, sql, batch, columns)
+                grouped = {}
+                for statement, params in statements:
+                    grouped.setdefault(statement, []).append(params)
+                for statement, rows in grouped.items():
+                    cur.executemany(statement, rows)
+            inserted = [row for _, row in batch]
+        except mysql.connector.Error as err:
+            logger.info("Batch into %s failed (%s), retrying row by row", self.table, err)
+            inserted = []
+            # a failed INSERT only rolls back that statement in InnoDB, the rest still commit
+            with self.db.transaction() as cur:
+                batch = self._enforce(cur, batch, columns)
+                batch, statements = self._statements(cur, sql, batch, columns)
+                for (line, row), (statement, params) in zip(batch, statements):
+                    try:
+                        cur.execute(statement, params)
+                        inserted.append(row)
+                    except mysql.connector.Error as row_err:
+                        self._reject(line, row_err.msg)
+
+        self.report["rows_inserted"] += len(inserted)
+        if self.on_insert and inserted:
+            self.on_insert(self.table, [dict(zip(columns, row)) for row in inserted])
+
+    def _statements(self, cur, sql, batch, columns):
+        """The batch and the (sql, params) inserting each of its rows.
+
+        In the compact layout the batch's names are added to the lookup tables
+        first, and rows naming a team or shot player that isn't known are rejected.
+        """
+        if not self.compact:
+            return batch, [(sql, row) for _, row in batch]
+
+        converted = [compact_row(self.table, dict(zip(columns, row))) for _, row in batch]
+        lookups, wanted = {}, {}
+        for row_lookups, required, _ in converted:
+            for statement, params in row_lookups:
+                lookups.setdefault(statement, {})[params] = None # once each, in order
+            for lookup, column, name in required:
+                wanted.setdefault((lookup, column), set()).add(name)
+        for statement, params in lookups.items():
+            cur.executemany(statement, list(params))
+        # names compare like the ci collation of the lookup tables does
+        known = {key: {name.casefold() for name in _present(cur, *key, names, "LOCK IN SHARE MODE")}
+                 for key, names in wanted.items()}
+
+        kept, statements = [], []
+        target = COMPACT_TABLES[self.table]
+        for (line, row), (_, required, values) in zip(batch, converted):
+            missing = [f"{column} '{name}' not in {lookup}" for lookup, column, name in required
+                       if name.casefold() not in known[(lookup, column)]]
+            if missing:
+                self._reject(line, "; ".join(missing))
+                continue
+            kept.append((line, row))
+            statements.append((f"INSERT INTO {target} ({','.join(f'`{c}`' for c in values)}) "
+                               f"VALUES ({','.join(expression for expression, _ in values.values())})",
+                               tuple(p for _, params in values.values() for p in params)))
+        return kept, statements
+
+    def _enforce(self, cur, batch, columns):
+        """Reject the rows MySQL would have refused before partitioning: keys that are
+        repeated or already in the table, and references to missing parent rows."""
+        reasons = {}
+        if self.unique_key:
+            i = columns.index(self.unique_key)
+            present = _present(cur, self.table, self.unique_key, {row[i] for _, row in batch}, "FOR UPDATE")
+            seen = set()
+            for line, row in batch:
+                if row[i] in present:
+                    reasons[line] = f"{self.unique_key} already in {self.table}"
+                elif row[i] in seen:
+                    reasons[line] = f"duplicate {self.unique_key}"
+                seen.add(row[i])
+        for column, parent, parent_column in self.references:
+            if column not in columns:
+                continue
+            i = columns.index(column)
+            # a shared lock, like the one the foreign key took, keeps the parents until the commit
+            present = _present(cur, parent, parent_column, {row[i] for _, row in batch if row[i] is not None},
+                               "LOCK IN SHARE MODE")
+            for line, row in batch:
+                if row[i] is not None and row[i] not in present:
+                    reasons.setdefault(line, f"{column} not in {parent}.{parent_column}")
+        for line, reason in reasons.items():
+            self._reject(line, reason)
+        return [(line, row) for line, row in batch if line not in reasons]
+
+
+def _present(cur, table, column, values, lock):
+    """The ones of `values` that are in table.column, locked until the transaction ends."""
+    if not values:
+        return set()
+    cur.execute(f"SELECT `{column}` FROM {table} WHERE `{column}` IN ({','.join(['%s'] * len(values))}) {lock}",
+                tuple(values))
+    return {row[column] for row in cur.fetchall()}
@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from utils import on_invalidate
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv('JOBS', '1') == '1'
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+LOCK_PREFIX = "betrivals:job:" # MySQL lock names are server-wide, keep ours apart
+
+
+class Job:
+    """One named refresh: when it runs next and how its past runs went."""
+
+    def __init__(self, name, func, interval=None, exclusive=False, tables=(), delay=0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.exclusive = exclusive
+        self.tables = set(tables)
+        self.next_run = time.monotonic() + delay if interval else None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0 # exclusive runs another worker was already doing
+        self.last_started = None
+        self.last_seconds = None
+        self.last_error = None
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {
+            "name": self.name, "interval": self.interval, "exclusive": self.exclusive,
+            "tables": sorted(self.tables), "running": self.running,
+            "runs": self.runs, "failures": self.failures, "skipped": self.skipped,
+            "last_started": self.last_started, "last_seconds": self.last_seconds, "last_error": self.last_error,
+            "next_run_in": None if self.next_run is None else round(max(self.next_run - now, 0), 1),
+        }
+
+
+class JobRunner:
+    """In-process scheduler that keeps derived data fresh off the request path.
+
+    A scheduler thread hands due jobs to a small thread pool: interval jobs
+    come due every `interval` seconds, any job comes due at once when one of
+    its `tables` is invalidated or when it is triggered by hand. A job never
+    runs twice at the same time in a process. Exclusive jobs (the ones that
+    write shared tables) also take a MySQL advisory lock, so only one worker
+    does them and the others count the run as skipped.
+
+    Threads don't survive a fork, so start() is called once per worker process.
+    """
+
+    def __init__(self, db, workers=JOB_WORKERS):
+        self.db = db
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = None
+        self._pid = None
+        on_invalidate(self._on_invalidate)
+
+    @property
+    def started(self):
+        return self._pid == os.getpid()
+
+    def add(self, name, func, interval=None, exclusive=False, tables=(), delay=0):
+        """Register a job. Interval jobs first run `delay` seconds after start(), without
+        an interval a job only runs when triggered or when one of `tables` changes."""
+        self._jobs[name] = Job(name, func, interval, exclusive, tables, delay)
+
+    def start(self):
+        with self._lock:
+            if self.started:
+                return
+            self._pid = os.getpid()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            threading.Thread(target=self._loop, name="job-scheduler", daemon=True).start()
+
+    def trigger(self, name):
+        """Run a job as soon as a worker is free. False if there is no such job."""
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        job.next_run = time.monotonic()
+        self._wake.set()
+        return True
+
+    def _on_invalidate(self, tables):
+        for job in self._jobs.values():
+            if job.tables & set(tables):
+                self.trigger(job.name)
+
+    def snapshot(self):
+        return {"started": self.started, "workers": self.workers,
+                "jobs": [job.snapshot() for job in self._jobs.values()]}
+
+    def _loop(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                due = [job for job in self._jobs.values()
+                       if not job.running and job.next_run is not None and job.next_run <= now]
+                for job in due:
+                    job.running = True
+                    job.next_run = None
+            for job in due:
+                self._pool.submit(self._run, job)
+            pending = [job.next_run for job in self._jobs.values() if job.next_run is not None and not job.running]
+            self._wake.wait(max(min(pending) - now, 0.05) if pending else None)
+            self._wake.clear()
+
+    def _run(self, job):
+        started = time.monotonic()
+        job.last_started = time.time()
+        try:
+            if job.exclusive:
+                with self._advisory_lock(job.name) as acquired:
+                    if not acquired:
+                        job.skipped += 1
+                        return
+                    job.func()
+            else:
+                job.func()
+            job.runs += 1
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.exception("Job %s failed: %s", job.name, e)
+        finally:
+            job.last_seconds = round(time.monotonic() - started, 3)
+            with self._lock:
+                job.running = False
+                if job.interval and job.next_run is None:
+                    job.next_run = started + job.interval
+            self._wake.set()
+
+    @contextmanager
+    def _advisory_lock(self, name):
+        """GET_LOCK on a connection held for the whole job, released with it."""
+        with self.db.transaction() as cur:
+            cur.execute("SELECT GET_LOCK(%s, 0) AS acquired", (LOCK_PREFIX + name,))
+            acquired = cur.fetchone()["acquired"] == 1
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    cur.execute("SELECT RELEASE_LOCK(%s) AS released", (LOCK_PREFIX + name,))
+                    cur.fetchall()
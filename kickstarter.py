@@ -1,6 +1,8 @@
 import mysql.connector
 import pandas as pd
 import os
+import re
+import argparse
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,6 +15,9 @@ MYSQL_CONFIG = {
     "port": int(os.getenv("MYSQL_PORT", "3306")),
 }
 CSV_DIR = Path("./csv_files")
+QUARANTINE_DIR = CSV_DIR / "quarantine"
+LOAD_CHUNK_ROWS = int(os.getenv("LOAD_CHUNK_ROWS", "50000"))
+LOAD_RSS_BUDGET_MB = int(os.getenv("LOAD_RSS_BUDGET_MB", "1024"))
 # ---------------------------------------- #
 
 TABLES = {
@@ -166,6 +171,175 @@ CSV_MAP_ORDERED = [
 ]
 
 
+def table_columns(table):
+    """Column names and SQL types of a table, read from its DDL in TABLES.
+
+    Returns a list of (name, type) in declaration order, e.g. ("minute", "INT")
+    or ("team_name", "VARCHAR(255)"). Key and constraint clauses are skipped.
+    """
+    ddl = TABLES[table]
+    body = ddl[ddl.index("(") + 1:ddl.rindex(")")]
+
+    # split on commas that are not inside parentheses, e.g. keep VARCHAR(255) whole
+    items, depth, current = [], 0, ""
+    for ch in body:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            items.append(current)
+            current = ""
+        else:
+            current += ch
+    items.append(current)
+
+    columns = []
+    for item in items:
+        parts = item.split()
+        if not parts or parts[0].upper() in ("FOREIGN", "PRIMARY", "KEY", "INDEX", "UNIQUE", "CONSTRAINT", "ON"):
+            continue
+        columns.append((parts[0], parts[1].upper()))
+    return columns
+
+
+def primary_key(table):
+    """Name of the PRIMARY KEY column declared inline in the table's DDL."""
+    for line in TABLES[table].splitlines():
+        if "PRIMARY KEY" in line:
+            return line.split()[0]
+    return None
+
+
+def foreign_keys(table):
+    """(column, parent table, parent column) for every FOREIGN KEY in the table's DDL."""
+    return re.findall(r"FOREIGN KEY \((\w+)\) REFERENCES (\w+)\((\w+)\)", TABLES[table])
+
+
+# read_csv dtype of each SQL type; nullable, so a missing id stays an integer instead of making the column float64
+SQL_DTYPES = {"BIGINT": "Int64", "INT": "Int32", "DOUBLE": "float64", "BOOLEAN": "boolean"}
+CATEGORY_MAX_LENGTH = 128 # VARCHAR/CHAR up to this long hold codes and labels, a few dozen distinct values
+# wider columns that still only hold one of a few hundred team names
+CATEGORY_COLUMNS = {"team_h", "team_a", "h_team", "a_team", "team_title", "title", "h_title", "a_title", "Team"}
+
+
+def dtype_plan(table):
+    """(dtypes, datetime columns) to read a table's CSV with, derived from its DDL in TABLES.
+
+    Integer columns become nullable Int64/Int32, short strings and team names
+    categories, DATETIME columns are parsed and other strings stay str.
+    """
+    dtypes, dates = {}, []
+    for name, sql_type in table_columns(table):
+        if sql_type == "DATETIME":
+            dates.append(name)
+        elif sql_type in SQL_DTYPES:
+            dtypes[name] = SQL_DTYPES[sql_type]
+        elif sql_type.startswith(("VARCHAR", "CHAR")):
+            length = int(sql_type[sql_type.index("(") + 1:-1])
+            dtypes[name] = "category" if length <= CATEGORY_MAX_LENGTH or name in CATEGORY_COLUMNS else "str"
+    return dtypes, dates
+
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+INT_LIMITS = {"Int64": (-2**63, 2**63 - 1), "Int32": (-2**31, 2**31 - 1)}
+
+
+def coerce_types(df, dtypes, dates):
+    """Convert the columns read as text to their dtype_plan types, one column at a time.
+
+    A value that doesn't fit (text in an INT column, a fraction in a BIGINT,
+    an unparseable date) makes only its row invalid instead of failing the
+    chunk as it would inside read_csv. Returns (good, bad) like
+    check_references, bad keeps the original text of the row.
+    """
+    reasons = pd.Series("", index=df.index)
+    converted = {}
+    for name in df.columns:
+        dtype = dtypes.get(name)
+        column = df[name]
+        if name in dates:
+            value = pd.to_datetime(column, errors="coerce", format="ISO8601")
+        elif dtype in ("Int64", "Int32"):
+            value = pd.to_numeric(column, errors="coerce", dtype_backend="numpy_nullable")
+            low, high = INT_LIMITS[dtype]
+            fits = (value % 1 == 0) & (value >= low) & (value <= high)
+            value = value.where(fits.fillna(False), pd.NA)
+        elif dtype == "float64":
+            value = pd.to_numeric(column, errors="coerce")
+        elif dtype == "boolean":
+            value = column.str.lower().map(BOOLEAN_VALUES).astype("boolean")
+        else:
+            continue
+        invalid = column.notna() & value.isna()
+        reasons[invalid] += f"{name} is not a valid {dtype if name not in dates else 'datetime'}; "
+        converted[name] = value.astype(dtype) if dtype else value
+
+    bad = reasons != ""
+    good = df[~bad].assign(**{name: value[~bad] for name, value in converted.items()})
+    if not bad.any():
+        return good, df.iloc[0:0]
+    return good, df[bad].assign(_reason=reasons[bad].str.rstrip("; "))
+
+
+# (table, column) -> keys inserted by this run, filled in by insert_from_csv for every
+# column some FOREIGN KEY points at, so children are checked without reading parents back
+_loaded_keys = {}
+
+
+def _parent_keys(cur, table, column):
+    keys = _loaded_keys.get((table, column))
+    if keys is None:
+        # parent wasn't loaded in this run, take what is already in the database
+        cur.execute(f"SELECT `{column}` FROM {table}")
+        keys = pd.Index([row[0] for row in cur.fetchall()])
+        _loaded_keys[(table, column)] = keys
+    return keys
+
+
+def check_references(cur, table, df, loaded=None):
+    """Split df into rows that can be inserted and rows that can't, with the reason.
+
+    Every FOREIGN KEY of the table is checked with one vectorized isin against
+    the parent's keys, plus empty primary keys and ones that are repeated or
+    already in the table (a re-run of the same load), so a single bad row no
+    longer makes MySQL reject the whole table. `loaded` holds the primary keys
+    of earlier chunks of the same file. Returns (good, bad) where bad has an
+    extra `_reason` column.
+    """
+    reasons = pd.Series("", index=df.index)
+
+    key = primary_key(table)
+    if key in df.columns:
+        repeated = df[key].duplicated(keep="first")
+        if loaded is not None:
+            repeated |= df[key].isin(loaded)
+        present = df[key].isin(_parent_keys(cur, table, key))
+        reasons[df[key].isna()] += f"{key} is empty; "
+        reasons[repeated & df[key].notna()] += f"duplicate {key}; "
+        reasons[present] += f"{key} already in {table}; "
+
+    for column, parent, parent_column in foreign_keys(table):
+        if column not in df.columns:
+            continue
+        orphans = df[column].notna() & ~df[column].isin(_parent_keys(cur, parent, parent_column))
+        reasons[orphans] += f"{column} not in {parent}.{parent_column}; "
+
+    bad = reasons != ""
+    if not bad.any():
+        return df, df.iloc[0:0]
+    return df[~bad], df[bad].assign(_reason=reasons[bad].str.rstrip("; "))
+
+
+def quarantine(table, bad, append=False):
+    """Write rejected rows and their reasons next to the CSVs, replacing the last run's file
+    unless `append` (the later chunks of the same load)."""
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    path = QUARANTINE_DIR / f"{table}_quarantine.csv"
+    bad.to_csv(path, index=False, mode="a" if append else "w", header=not append)
+    return path
+
+
 def connect_db(include_db=False):
     cfg = MYSQL_CONFIG.copy()
     if include_db:
@@ -182,16 +356,17 @@ def create_database():
     print(f"✅ Database '{DB_NAME}' ensured.")
 
 
-def create_tables():
+def create_tables(partitioned=False):
     conn = connect_db(True)
     cur = conn.cursor()
     
     # Disable foreign key checks during table creation
     cur.execute("SET FOREIGN_KEY_CHECKS = 0;")
     
+    seasons = csv_seasons() if partitioned else None
     for name, ddl in TABLES.items():
         print(f"🧱 Creating table: {name}")
-        cur.execute(ddl)
+        cur.execute(partitioned_ddl(name, seasons) if partitioned else ddl)
     
     # Re-enable foreign key checks
     cur.execute("SET FOREIGN_KEY_CHECKS = 1;")
@@ -202,49 +377,177 @@ def create_tables():
     print("✅ Tables created successfully.")
 
 
-def insert_from_csv(table, filename):
+MIN_CHUNK_ROWS = 1000
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryBudgetExceeded(Exception):
+    """A table can't be loaded within the RSS budget, not even MIN_CHUNK_ROWS rows at a time."""
+
+
+def rss_bytes():
+    """Resident set size of this process from /proc/self/statm, None where there is no /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+def _to_rows(df):
+    """Row tuples for executemany with None for every missing value.
+
+    Each column is turned into one object array on its own, so there is never
+    an object copy of the whole frame next to the typed one as df.where() made.
+    """
+    columns = []
+    for name in df.columns:
+        column = df[name]
+        if column.dtype.kind == "M":
+            column = column.dt.to_pydatetime()
+        columns.append(column.to_numpy(dtype=object, na_value=None))
+    return list(zip(*columns))
+
+
+def insert_from_csv(table, filename, chunk_rows=LOAD_CHUNK_ROWS, rss_budget_mb=LOAD_RSS_BUDGET_MB):
+    """Load one CSV into its table in a single transaction, chunk_rows rows at a time.
+
+    Columns get the types of dtype_plan(table); numbers, booleans and dates
+    are read as text and converted by coerce_types, so a bad value only
+    quarantines its row. rss_budget_mb bounds what the load adds to the RSS
+    the process had before it started: the first chunk is MIN_CHUNK_ROWS
+    rows, what each chunk added per row is measured while it's held, and
+    before the next read the chunk size is halved until that many rows fit.
+    A chunk that grows the RSS past the budget anyway, or a table that
+    doesn't fit at MIN_CHUNK_ROWS, is rolled back. Returns the load report,
+    None if the file is missing.
+    """
     path = CSV_DIR / filename
     if not path.exists():
         print(f"⚠️ Missing file: {path}")
-        return
-    
-    df = pd.read_csv(path, keep_default_na=True, na_values=['', 'nan', 'NaN', 'NA'])
-    
-    # Clean column names - replace dots with underscores and strip whitespace
-    df.columns = [str(c).replace(".", "_").strip() for c in df.columns]
-    
-    # Remove columns with 'Unnamed' or that are literally 'nan' string
-    cols_to_keep = []
-    for col in df.columns:
-        col_lower = str(col).lower()
-        if not col_lower.startswith('unnamed') and col_lower != 'nan':
-            cols_to_keep.append(col)
-    
-    df = df[cols_to_keep]
-    
-    # Replace NaN with None for MySQL NULL
-    df = df.where(pd.notnull(df), None)
+        return None
+
+    # Clean column names - replace dots with underscores and strip whitespace,
+    # and skip columns with 'Unnamed' or that are literally 'nan' string
+    names = {raw: str(raw).replace(".", "_").strip() for raw in pd.read_csv(path, nrows=0).columns}
+    keep = [raw for raw, name in names.items()
+            if not name.lower().startswith('unnamed') and name.lower() != 'nan']
+    dtypes, dates = dtype_plan(table)
+    text = {raw: dtypes.get(names[raw], "str") if dtypes.get(names[raw]) in ("category", "str") else "str"
+            for raw in keep if names[raw] in dtypes or names[raw] in dates}
+    reader = pd.read_csv(path, keep_default_na=True, na_values=['', 'nan', 'NaN', 'NA'], usecols=keep,
+                         dtype=text, iterator=True)
+
+    key = primary_key(table)
+    referenced = {pc for child in TABLES for _, parent, pc in foreign_keys(child) if parent == table}
+    loaded = {column: None for column in referenced | {key} if column in names.values()}
+    reasons = {}
+    budget = rss_budget_mb * 1024 * 1024
+    baseline = rss_bytes()
+    report = {"table": table, "rows": 0, "quarantined": 0, "chunks": 0, "status": "ok",
+              "peak_rss": baseline, "growth": 0 if baseline is not None else None}
+
+    def measure():
+        rss = rss_bytes()
+        if rss is not None and baseline is not None:
+            report["peak_rss"] = max(report["peak_rss"], rss)
+            report["growth"] = max(report["growth"], rss - baseline)
+        return rss
+
+    def reject(bad):
+        # Bad values, orphans and duplicate keys go to a quarantine file instead of failing the whole insert
+        if len(bad):
+            quarantine(table, bad, append=report["quarantined"] > 0)
+            report["quarantined"] += len(bad)
+            for reason, count in bad["_reason"].value_counts().items():
+                reasons[reason] = reasons.get(reason, 0) + count
 
     conn = connect_db(True)
     cur = conn.cursor()
+    row_cost = None # bytes a row of the last chunk added while it was held, unknown before the first one
+    largest = 0
+    try:
+        while True:
+            rss = measure()
+            # the first chunk is read at MIN_CHUNK_ROWS to learn what a row costs
+            size = chunk_rows if row_cost is not None else min(chunk_rows, MIN_CHUNK_ROWS)
+            if rss is not None and baseline is not None and row_cost is not None:
+                # would one more chunk of this size still fit on top of what the load holds now?
+                while rss - baseline + row_cost * size > budget and size > MIN_CHUNK_ROWS:
+                    size = max(size // 2, MIN_CHUNK_ROWS)
+                if rss - baseline + row_cost * size > budget:
+                    raise MemoryBudgetExceeded(f"{(rss - baseline + row_cost * size) / 2**20:.0f} MiB over the "
+                                               f"starting RSS with {size}-row chunks, budget is "
+                                               f"{rss_budget_mb} MiB")
+            try:
+                df = reader.get_chunk(size)
+            except StopIteration:
+                break
+            df.columns = [names[c] for c in df.columns]
+            report["chunks"] += 1
+            largest = max(largest, size)
+            read = len(df)
 
-    cols = ",".join(f"`{c}`" for c in df.columns)
-    placeholders = ",".join(["%s"] * len(df.columns))
-    sql = f"INSERT INTO {table} ({cols}) VALUES ({placeholders})"
+            df, bad = coerce_types(df, dtypes, dates)
+            reject(bad)
+            df, bad = check_references(cur, table, df, loaded.get(key))
+            reject(bad)
 
-    data = [tuple(row) for row in df.itertuples(index=False, name=None)]
-    
-    try:
-        cur.executemany(sql, data)
+            cols = ",".join(f"`{c}`" for c in df.columns)
+            placeholders = ",".join(["%s"] * len(df.columns))
+            sql = f"INSERT INTO {table} ({cols}) VALUES ({placeholders})"
+            data = _to_rows(df)
+            held = measure() # the typed chunk and its row tuples are both alive here
+            if held is not None and baseline is not None and held - baseline > budget:
+                # the prediction was off, a chunk that doesn't fit is not inserted
+                raise MemoryBudgetExceeded(f"{(held - baseline) / 2**20:.0f} MiB over the starting RSS "
+                                           f"holding a {read}-row chunk, budget is {rss_budget_mb} MiB")
+            cur.executemany(sql, data)
+            report["rows"] += len(data)
+            for column, keys in loaded.items():
+                chunk_keys = pd.Index(df[column].dropna())
+                loaded[column] = chunk_keys if keys is None else keys.append(chunk_keys)
+            if held is not None and rss is not None:
+                row_cost = max(max(held, measure()) - rss, 0) / max(read, 1)
+            del df, bad, data
         conn.commit()
-        print(f"✅ Inserted {len(df)} rows into {table}")
-    except mysql.connector.Error as err:
+        print(f"✅ Inserted {report['rows']} rows into {table}")
+        for column in referenced & set(loaded):
+            if loaded[column] is None:
+                continue
+            # check_references cached the keys that were there before, children may use both
+            before = _loaded_keys.get((table, column))
+            _loaded_keys[(table, column)] = loaded[column] if before is None else before.append(loaded[column])
+    except (mysql.connector.Error, MemoryBudgetExceeded) as err:
         print(f"❌ Error inserting into {table}: {err}")
         conn.rollback()
+        report["status"] = "rolled back"
+    except ValueError as err:
+        # a file pandas can't tokenize, e.g. a row with more fields than the header; bad values are quarantined
+        print(f"❌ Error reading {path}: {err}")
+        conn.rollback()
+        report["status"] = "rolled back"
     finally:
+        reader.close()
         cur.close()
         conn.close()
 
+    if report["quarantined"]:
+        print(f"⚠️ {report['quarantined']} rows of {table} quarantined in {QUARANTINE_DIR / f'{table}_quarantine.csv'}")
+        for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+            print(f"   {count:>7}  {reason}")
+    report["chunk_rows"] = largest
+    return report
+
+
+def print_load_report(reports, rss_budget_mb=LOAD_RSS_BUDGET_MB):
+    """Rows, quarantined rows and peak RSS growth of every table loaded by insert_from_csv."""
+    print(f"\n📈 Load memory (budget {rss_budget_mb} MiB over the RSS before each table):")
+    for report in reports:
+        peak = "n/a" if report["growth"] is None else f"+{report['growth'] / 2**20:.0f} MiB"
+        print(f"   {report['table']:<12} {report['rows']:>9} rows  {report['quarantined']:>7} quarantined  "
+              f"{report['chunks']:>4} chunks of <= {report['chunk_rows']:<6} peak {peak:>9}  {report['status']}")
+
 
 def verify_foreign_keys():
     """Verify that foreign key constraints are properly set up"""
@@ -278,7 +581,613 @@ def verify_foreign_keys():
     conn.close()
 
 
+# ---------------- COMPACT SCHEMA MIGRATION ---------------- #
+# shot_data/match_info keep team and player names per row and free-text categories.
+# The compact layout stores integer ids and ENUMs instead and puts views with the old
+# names and columns on top, so the app's SELECTs keep working unchanged.
+
+COMPACT_LOOKUPS = {
+    "shot_players": """
+        CREATE TABLE IF NOT EXISTS shot_players (
+            player_id INT UNSIGNED PRIMARY KEY,
+            player_name VARCHAR(255)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    "player_names": """
+        CREATE TABLE IF NOT EXISTS player_names (
+            name_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL UNIQUE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    "shot_last_actions": """
+        CREATE TABLE IF NOT EXISTS shot_last_actions (
+            action_id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            action VARCHAR(64) NOT NULL UNIQUE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+}
+
+# team ids stay BIGINT: teams.team_id is BIGINT and season/fut23 reference it
+MATCH_INFO_COMPACT = """
+    CREATE TABLE match_info_compact (
+        match_id INT UNSIGNED PRIMARY KEY,
+        fid INT UNSIGNED, h BIGINT, a BIGINT,
+        date DATETIME,
+        league_id TINYINT UNSIGNED, season SMALLINT UNSIGNED,
+        h_goals TINYINT UNSIGNED, a_goals TINYINT UNSIGNED,
+        h_xg DOUBLE, a_xg DOUBLE,
+        h_w DOUBLE, h_d DOUBLE, h_l DOUBLE,
+        league {league},
+        h_shot TINYINT UNSIGNED, a_shot TINYINT UNSIGNED,
+        h_shotOnTarget TINYINT UNSIGNED, a_shotOnTarget TINYINT UNSIGNED,
+        h_deep TINYINT UNSIGNED, a_deep TINYINT UNSIGNED,
+        a_ppda DOUBLE, h_ppda DOUBLE,
+        INDEX idx_mic_season_date (season, date),
+        INDEX idx_mic_h (h), INDEX idx_mic_a (a),
+        FOREIGN KEY (h) REFERENCES teams(team_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        FOREIGN KEY (a) REFERENCES teams(team_id) ON UPDATE CASCADE ON DELETE SET NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+SHOT_DATA_COMPACT = """
+    CREATE TABLE shot_data_compact (
+        shot_id INT UNSIGNED PRIMARY KEY,
+        minute TINYINT UNSIGNED,
+        result {result},
+        X DOUBLE, Y DOUBLE, xG DOUBLE,
+        h_a ENUM('h','a'),
+        player_id INT UNSIGNED,
+        situation {situation},
+        season SMALLINT UNSIGNED,
+        shotType {shotType},
+        match_id INT UNSIGNED,
+        h_team_id BIGINT, a_team_id BIGINT,
+        h_goals TINYINT UNSIGNED, a_goals TINYINT UNSIGNED,
+        date DATETIME,
+        assist_name_id INT UNSIGNED,
+        last_action_id SMALLINT UNSIGNED,
+        INDEX idx_sdc_match (match_id),
+        INDEX idx_sdc_player_season (player_id, season),
+        INDEX idx_sdc_season (season),
+        INDEX idx_sdc_h_team (h_team_id), INDEX idx_sdc_a_team (a_team_id),
+        FOREIGN KEY (match_id) REFERENCES match_info_compact(match_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        FOREIGN KEY (player_id) REFERENCES shot_players(player_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        FOREIGN KEY (h_team_id) REFERENCES teams(team_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        FOREIGN KEY (a_team_id) REFERENCES teams(team_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        FOREIGN KEY (assist_name_id) REFERENCES player_names(name_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        FOREIGN KEY (last_action_id) REFERENCES shot_last_actions(action_id) ON UPDATE CASCADE ON DELETE SET NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# non-empty once the compatibility views are in place; the app then writes to the compact tables
+COMPACT_VIEWS_SQL = """
+    SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('shot_data', 'match_info') AND TABLE_TYPE = 'VIEW'
+"""
+
+MATCH_INFO_VIEW = """
+    CREATE OR REPLACE VIEW match_info AS
+    SELECT mi.match_id, mi.fid, mi.h, mi.a, mi.date, mi.league_id, mi.season,
+           mi.h_goals, mi.a_goals, th.team_name AS team_h, ta.team_name AS team_a,
+           mi.h_xg, mi.a_xg, mi.h_w, mi.h_d, mi.h_l, mi.league,
+           mi.h_shot, mi.a_shot, mi.h_shotOnTarget, mi.a_shotOnTarget,
+           mi.h_deep, mi.a_deep, mi.a_ppda, mi.h_ppda
+    FROM match_info_compact mi
+    LEFT JOIN teams th ON th.team_id = mi.h
+    LEFT JOIN teams ta ON ta.team_id = mi.a
+"""
+
+SHOT_DATA_VIEW = """
+    CREATE OR REPLACE VIEW shot_data AS
+    SELECT s.shot_id, s.minute, s.result, s.X, s.Y, s.xG, sp.player_name AS player,
+           s.h_a, s.player_id, s.situation, s.season, s.shotType, s.match_id,
+           th.team_name AS h_team, ta.team_name AS a_team, s.h_goals, s.a_goals, s.date,
+           pn.name AS player_assisted, la.action AS lastAction,
+           s.h_team_id, s.a_team_id
+    FROM shot_data_compact s
+    LEFT JOIN shot_players sp ON sp.player_id = s.player_id
+    LEFT JOIN teams th ON th.team_id = s.h_team_id
+    LEFT JOIN teams ta ON ta.team_id = s.a_team_id
+    LEFT JOIN player_names pn ON pn.name_id = s.assist_name_id
+    LEFT JOIN shot_last_actions la ON la.action_id = s.last_action_id
+"""
+
+
+COMPACT_TABLES = {"shot_data": "shot_data_compact", "match_info": "match_info_compact"}
+
+# name columns of the legacy tables -> (id column, lookup table, its id, its name). Teams and
+# shot players come with their ids, assist names and last actions are numbered by MySQL
+COMPACT_NAMES = {
+    "match_info": {
+        "team_h": ("h", "teams", "team_id", "team_name"),
+        "team_a": ("a", "teams", "team_id", "team_name"),
+    },
+    "shot_data": {
+        "player": ("player_id", "shot_players", "player_id", "player_name"),
+        "h_team": ("h_team_id", "teams", "team_id", "team_name"),
+        "a_team": ("a_team_id", "teams", "team_id", "team_name"),
+        "player_assisted": ("assist_name_id", "player_names", "name_id", "name"),
+        "lastAction": ("last_action_id", "shot_last_actions", "action_id", "action"),
+    },
+}
+NUMBERED_LOOKUPS = ("player_names", "shot_last_actions")
+
+
+def compact_row(table, row):
+    """A shot_data/match_info row ({column: value}) as a row of its compact table.
+
+    Returns (lookups, required, values). lookups are (sql, params) to run first,
+    they add the row's names to their lookup tables. values maps every compact
+    column to (sql, params), where a name becomes a subquery for its id. required
+    holds the (lookup table, name column, name) the subqueries must find: a team
+    or shot player named without its id can't be added, only looked up.
+    """
+    names = COMPACT_NAMES[table]
+    values = {column: ("%s", (value,)) for column, value in row.items() if column not in names}
+    lookups, required = [], []
+    for column, (id_column, lookup, lookup_id, lookup_name) in names.items():
+        if column not in row:
+            continue
+        name = row[column]
+        by_name = (f"(SELECT MIN({lookup_id}) FROM {lookup} WHERE {lookup_name} = %s)", (name,))
+        if lookup in NUMBERED_LOOKUPS:
+            if name is not None:
+                lookups.append((f"INSERT IGNORE INTO {lookup} ({lookup_name}) VALUES (%s)", (name,)))
+            values[id_column] = by_name
+        elif row.get(id_column) is not None:
+            if name is not None:
+                lookups.append((f"INSERT IGNORE INTO {lookup} ({lookup_id}, {lookup_name}) VALUES (%s, %s)",
+                                (row[id_column], name)))
+        elif name is not None:
+            values[id_column] = by_name
+            required.append((lookup, lookup_name, name))
+        else:
+            values.setdefault(id_column, ("%s", (None,)))
+    return lookups, required, values
+
+
+def table_sizes(cur, tables):
+    """{table: (rows, data_bytes, index_bytes)} from information_schema, after ANALYZE."""
+    placeholders = ",".join(["%s"] * len(tables))
+    for table in tables:
+        cur.execute(f"ANALYZE TABLE {table}")
+        cur.fetchall()
+    cur.execute(f"""
+        SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})
+    """, (DB_NAME, *tables))
+    return {row[0]: (row[1], row[2], row[3]) for row in cur.fetchall()}
+
+
+def _enum_of(cur, table, column):
+    """ENUM type built from the values actually present, so no row can fail to convert."""
+    cur.execute(f"SELECT DISTINCT `{column}` FROM {table} WHERE `{column}` IS NOT NULL ORDER BY 1")
+    values = [row[0] for row in cur.fetchall()]
+    if not values:
+        return "VARCHAR(64)"
+    return "ENUM(" + ",".join("'" + v.replace("'", "''") + "'" for v in values) + ")"
+
+
+def _drop_best_shot_fk(cur):
+    cur.execute("""
+        SELECT CONSTRAINT_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'player' AND COLUMN_NAME = 'best_shot_id'
+        AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (DB_NAME,))
+    for (constraint,) in cur.fetchall():
+        cur.execute(f"ALTER TABLE player DROP FOREIGN KEY `{constraint}`")
+
+
+def _compact_swap_problem(cur):
+    """Why the views and the player foreign key couldn't replace the legacy tables, None if they can.
+
+    The views are created once under scratch names and the foreign key is
+    checked row by row, so the statements after the RENAME can't fail on data.
+    """
+    cur.execute("""
+        SELECT COUNT(*) FROM player p
+        LEFT JOIN shot_data_compact c ON c.shot_id = p.best_shot_id
+        WHERE p.best_shot_id IS NOT NULL AND c.shot_id IS NULL
+    """)
+    missing = cur.fetchone()[0]
+    if missing:
+        return f"{missing} player.best_shot_id values are not in shot_data_compact"
+    try:
+        for name, ddl in (("match_info", MATCH_INFO_VIEW), ("shot_data", SHOT_DATA_VIEW)):
+            cur.execute(ddl.replace(f"VIEW {name} AS", f"VIEW {name}_swap_check AS"))
+            cur.execute(f"SELECT * FROM {name}_swap_check LIMIT 1")
+            cur.fetchall()
+    except mysql.connector.Error as err:
+        return f"Compatibility views don't work: {err}"
+    finally:
+        cur.execute("DROP VIEW IF EXISTS match_info_swap_check, shot_data_swap_check")
+    return None
+
+
+def _undo_compact_swap(cur):
+    """Back to the layout before the swap: legacy tables under their names, best_shot_id on shot_data."""
+    cur.execute("DROP VIEW IF EXISTS shot_data, match_info")
+    _drop_best_shot_fk(cur)
+    cur.execute("ALTER TABLE player MODIFY best_shot_id BIGINT")
+    cur.execute("RENAME TABLE shot_data_legacy TO shot_data, match_info_legacy TO match_info")
+    cur.execute("""
+        ALTER TABLE player ADD FOREIGN KEY (best_shot_id) REFERENCES shot_data(shot_id)
+            ON UPDATE CASCADE ON DELETE SET NULL
+    """)
+
+
+def migrate_compact_schema(drop_legacy=False):
+    """Move shot_data/match_info to integer-keyed compact tables behind compatibility views.
+
+    Nothing is renamed until the copies are verified to be lossless. The old tables
+    are kept as *_legacy (pass drop_legacy=True to drop them). The views are
+    read-only, so once they are in place (see COMPACT_VIEWS_SQL) the app's CSV
+    imports and match writes go to the compact tables through compact_row.
+    """
+    conn = connect_db(True)
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ('shot_data', 'match_info') AND TABLE_TYPE = 'VIEW'
+    """, (DB_NAME,))
+    if cur.fetchall():
+        # views of an earlier run may lack columns added since, e.g. the team ids
+        cur.execute(MATCH_INFO_VIEW)
+        cur.execute(SHOT_DATA_VIEW)
+        print("ℹ️ shot_data/match_info are already compatibility views, refreshed them.")
+        cur.close()
+        conn.close()
+        return
+
+    if season_partitions(cur, "shot_data") or season_partitions(cur, "match_info"):
+        print("❌ shot_data/match_info are partitioned by season, the compact layout needs foreign keys.")
+        cur.close()
+        conn.close()
+        return
+
+    before = table_sizes(cur, ["shot_data", "match_info"])
+
+    print("🧱 Creating lookup tables ...")
+    for name, ddl in COMPACT_LOOKUPS.items():
+        cur.execute(ddl)
+    cur.execute("""
+        INSERT IGNORE INTO teams (team_id, team_name)
+        SELECT h, MAX(team_h) FROM match_info WHERE h IS NOT NULL GROUP BY h
+        UNION
+        SELECT a, MAX(team_a) FROM match_info WHERE a IS NOT NULL GROUP BY a
+    """)
+    cur.execute("""
+        INSERT IGNORE INTO shot_players (player_id, player_name)
+        SELECT player_id, MAX(player) FROM shot_data WHERE player_id IS NOT NULL GROUP BY player_id
+    """)
+    cur.execute("""
+        INSERT IGNORE INTO player_names (name)
+        SELECT DISTINCT player_assisted FROM shot_data WHERE player_assisted IS NOT NULL
+    """)
+    cur.execute("""
+        INSERT IGNORE INTO shot_last_actions (action)
+        SELECT DISTINCT lastAction FROM shot_data WHERE lastAction IS NOT NULL
+    """)
+    conn.commit()
+
+    print("🧱 Creating compact tables ...")
+    cur.execute("DROP TABLE IF EXISTS shot_data_compact")
+    cur.execute("DROP TABLE IF EXISTS match_info_compact")
+    cur.execute(MATCH_INFO_COMPACT.format(league=_enum_of(cur, "match_info", "league")))
+    cur.execute(SHOT_DATA_COMPACT.format(result=_enum_of(cur, "shot_data", "result"),
+                                         situation=_enum_of(cur, "shot_data", "situation"),
+                                         shotType=_enum_of(cur, "shot_data", "shotType")))
+
+    cur.execute("""
+        INSERT INTO match_info_compact
+        SELECT match_id, fid, h, a, date, league_id, season, h_goals, a_goals,
+               h_xg, a_xg, h_w, h_d, h_l, league, h_shot, a_shot,
+               h_shotOnTarget, a_shotOnTarget, h_deep, a_deep, a_ppda, h_ppda
+        FROM match_info
+    """)
+    # team ids come from the match when it is known, otherwise from the team name
+    cur.execute("""
+        INSERT INTO shot_data_compact
+        SELECT s.shot_id, s.minute, s.result, s.X, s.Y, s.xG, s.h_a, s.player_id,
+               s.situation, s.season, s.shotType, m.match_id,
+               COALESCE(m.h, th.team_id), COALESCE(m.a, ta.team_id),
+               s.h_goals, s.a_goals, s.date, pn.name_id, la.action_id
+        FROM shot_data s
+        LEFT JOIN match_info m ON m.match_id = s.match_id
+        LEFT JOIN teams th ON th.team_name = s.h_team
+        LEFT JOIN teams ta ON ta.team_name = s.a_team
+        LEFT JOIN player_names pn ON pn.name = s.player_assisted
+        LEFT JOIN shot_last_actions la ON la.action = s.lastAction
+    """)
+    conn.commit()
+
+    # lossless check: every team name that existed must still resolve to the same name
+    cur.execute("""
+        SELECT COUNT(*) FROM shot_data s
+        JOIN shot_data_compact c ON c.shot_id = s.shot_id
+        LEFT JOIN teams th ON th.team_id = c.h_team_id
+        LEFT JOIN teams ta ON ta.team_id = c.a_team_id
+        WHERE (s.h_team IS NOT NULL AND NOT (th.team_name <=> s.h_team))
+           OR (s.a_team IS NOT NULL AND NOT (ta.team_name <=> s.a_team))
+    """)
+    mismatched = cur.fetchone()[0]
+    cur.execute("SELECT (SELECT COUNT(*) FROM shot_data), (SELECT COUNT(*) FROM shot_data_compact)")
+    shots_old, shots_new = cur.fetchone()
+    if mismatched or shots_old != shots_new:
+        print(f"❌ Compact copy is not lossless ({mismatched} team mismatches, "
+              f"{shots_old} vs {shots_new} shots). Legacy tables left in place.")
+        cur.close()
+        conn.close()
+        return
+
+    # the swap is DDL, which MySQL can't roll back, so everything it needs is checked first
+    problem = _compact_swap_problem(cur)
+    if problem:
+        print(f"❌ {problem}. Legacy tables left in place.")
+        cur.close()
+        conn.close()
+        return
+
+    print("🔁 Swapping in compatibility views ...")
+    cur.execute("RENAME TABLE shot_data TO shot_data_legacy, match_info TO match_info_legacy")
+    try:
+        # player.best_shot_id followed the rename, point it at the compact table instead
+        _drop_best_shot_fk(cur)
+        cur.execute("""
+            ALTER TABLE player MODIFY best_shot_id INT UNSIGNED,
+            ADD FOREIGN KEY (best_shot_id) REFERENCES shot_data_compact(shot_id)
+                ON UPDATE CASCADE ON DELETE SET NULL
+        """)
+        cur.execute(MATCH_INFO_VIEW)
+        cur.execute(SHOT_DATA_VIEW)
+        conn.commit()
+    except mysql.connector.Error as err:
+        print(f"❌ Swap failed ({err}), putting the legacy tables back ...")
+        _undo_compact_swap(cur)
+        cur.close()
+        conn.close()
+        return
+    if drop_legacy:
+        cur.execute("DROP TABLE shot_data_legacy, match_info_legacy")
+        conn.commit()
+
+    after = table_sizes(cur, ["shot_data_compact", "match_info_compact", *COMPACT_LOOKUPS])
+    print("\n📏 Table sizes (rows / data / index):")
+    for name, (rows, data, index) in list(before.items()) + list(after.items()):
+        print(f"   {name:<20} {rows:>10} rows  {data / 1024:>10.0f} KiB data  {index / 1024:>10.0f} KiB index")
+    total_before = sum(d + i for _, d, i in before.values())
+    total_after = sum(d + i for _, d, i in after.values())
+    if total_before:
+        print(f"   total: {total_before / 1024:.0f} KiB -> {total_after / 1024:.0f} KiB "
+              f"({100 * (1 - total_after / total_before):.0f}% smaller)")
+
+    cur.close()
+    conn.close()
+    print("✅ Compact schema in place, shot_data and match_info are now views.")
+
+
+# ---------------- SHOT CUBE ---------------- #
+# Shot counts, goals and xG pre-aggregated over team x season x situation x shotType x result.
+# A few thousand cells instead of every shot; cube.py loads it and answers any roll-up from memory.
+
+SHOT_CUBE_DIMENSIONS = ("team", "season", "situation", "shotType", "result")
+
+SHOT_CUBE = """
+    CREATE TABLE IF NOT EXISTS shot_cube (
+        team VARCHAR(255) NOT NULL,
+        season SMALLINT NOT NULL,
+        situation VARCHAR(64) NOT NULL,
+        shotType VARCHAR(64) NOT NULL,
+        result VARCHAR(64) NOT NULL,
+        shots INT UNSIGNED NOT NULL,
+        goals INT UNSIGNED NOT NULL,
+        xg DOUBLE NOT NULL,
+        PRIMARY KEY (team, season, situation, shotType, result)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# the shooting team is the home side for h_a = 'h'; NULLs become '' so they can be part of the key
+SHOT_CUBE_SELECT = """
+    SELECT COALESCE(CASE WHEN h_a = 'h' THEN h_team ELSE a_team END, '') AS team,
+           COALESCE(season, 0) AS season,
+           COALESCE(situation, '') AS situation,
+           COALESCE(shotType, '') AS shotType,
+           COALESCE(result, '') AS result,
+           COUNT(*) AS shots,
+           SUM(result = 'Goal') AS goals,
+           COALESCE(SUM(xG), 0) AS xg
+    FROM shot_data
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+SHOT_CUBE_UPSERT = """
+    INSERT INTO shot_cube (team, season, situation, shotType, result, shots, goals, xg)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE shots = shots + VALUES(shots), goals = goals + VALUES(goals),
+                            xg = xg + VALUES(xg)
+"""
+
+
+def build_shot_cube():
+    """(Re)build shot_cube from shot_data in one GROUP BY."""
+    conn = connect_db(True)
+    cur = conn.cursor()
+    cur.execute(SHOT_CUBE)
+    cur.execute("DELETE FROM shot_cube")
+    cur.execute(f"INSERT INTO shot_cube {SHOT_CUBE_SELECT}")
+    conn.commit()
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(shots), 0) FROM shot_cube")
+    cells, shots = cur.fetchone()
+    print(f"🧊 Shot cube: {cells} cells over {shots} shots")
+    cur.close()
+    conn.close()
+
+
+# ---------------- SEASON PARTITIONING ---------------- #
+# Optional layout for a fresh load (--partitioned): shot_data and match_info are RANGE
+# partitioned by season, so season-filtered queries only open that season's partition.
+# MySQL requires the partitioning column in every unique key and doesn't support foreign
+# keys on partitioned tables, so the keys become (id, season) and referential integrity
+# is left to the pre-load check (check_references) and to the app's writers (see
+# unenforced_constraints). Not combinable with --compact.
+
+PARTITIONED_TABLES = ("shot_data", "match_info")
+FUTURE_PARTITION = "pfuture"
+
+# non-empty when shot_data/match_info are partitioned; the app checks it before writing
+PARTITIONED_LAYOUT_SQL = """
+    SELECT DISTINCT TABLE_NAME FROM INFORMATION_SCHEMA.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('shot_data', 'match_info') AND PARTITION_NAME IS NOT NULL
+"""
+
+
+def unenforced_constraints(table):
+    """What MySQL no longer checks for `table` in the partitioned layout: its primary key
+    when the table is partitioned (None otherwise), and the foreign keys it lost as
+    (column, parent table, parent column). The writers check these themselves."""
+    key = primary_key(table) if table in PARTITIONED_TABLES else None
+    lost = [fk for fk in foreign_keys(table) if table in PARTITIONED_TABLES or fk[1] in PARTITIONED_TABLES]
+    return key, lost
+
+
+def pruning_queries(season):
+    """(name, sql, params) of the season-filtered statements the app runs most, with a
+    sample player. player_stats_api joins on p.year = s.season over every year of a
+    player, so it reads one partition per year by design and isn't checked."""
+    import queries # queries imports kickstarter, so not at the top
+    search, search_params = queries.shot_search_query({"season": str(season)})
+    matches, matches_params, _ = queries.matches_query({"season": season})
+    return [
+        ("shot_detail season stats", queries.SHOT_SEASON_STATS, (6531, season)),
+        ("shot_detail other shots", queries.SHOT_OTHER_SHOTS, (6531, 1, season, 0)),
+        ("search_shots season filter", search, search_params),
+        ("api_matches season filter", matches, tuple(matches_params)),
+    ]
+
+
+def csv_seasons():
+    """Every season in the match_info/shot_data CSVs, for the initial partitions."""
+    seasons = set()
+    for table, filename in CSV_MAP_ORDERED:
+        if table in PARTITIONED_TABLES and (CSV_DIR / filename).exists():
+            seasons.update(pd.read_csv(CSV_DIR / filename, usecols=["season"])["season"].dropna().astype(int))
+    return sorted(seasons)
+
+
+def _partition(season):
+    return f"PARTITION p{season} VALUES LESS THAN ({season + 1})"
+
+
+def partitioned_ddl(table, seasons):
+    """DDL for `table` in the partitioned layout; other tables only lose their
+    foreign keys that point at a partitioned table."""
+    ddl = TABLES[table]
+    fk = r",\s*FOREIGN KEY \(\w+\) REFERENCES ({})\(\w+\)(\s+ON (UPDATE|DELETE) (CASCADE|SET NULL|RESTRICT))*"
+    if table not in PARTITIONED_TABLES:
+        return re.sub(fk.format("|".join(PARTITIONED_TABLES)), "", ddl)
+
+    key = primary_key(table)
+    ddl = re.sub(fk.format(r"\w+"), "", ddl)
+    ddl = ddl.replace(f"{key} BIGINT PRIMARY KEY", f"{key} BIGINT NOT NULL")
+    ddl = ddl.replace("season INT", "season INT NOT NULL", 1)
+    end = ddl.rindex(")")
+    partitions = ",\n        ".join([_partition(season) for season in seasons]
+                                     + [f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE"])
+    return (ddl[:end].rstrip() + f",\n            PRIMARY KEY ({key}, season),\n"
+            f"            INDEX idx_{table}_{key} ({key})\n        "
+            + ddl[end:].rstrip().rstrip(";")
+            + f"\n    PARTITION BY RANGE (season) (\n        {partitions}\n    );\n")
+
+
+def season_partitions(cur, table):
+    """Partition names of a table in order, empty if it isn't partitioned."""
+    cur.execute("""
+        SELECT PARTITION_NAME FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (DB_NAME, table))
+    return [row[0] for row in cur.fetchall()]
+
+
+def add_season_partition(season):
+    """Split the catch-all partition so `season` gets its own; cheap while pfuture is empty."""
+    conn = connect_db(True)
+    cur = conn.cursor()
+    for table in PARTITIONED_TABLES:
+        partitions = season_partitions(cur, table)
+        if not partitions:
+            print(f"⚠️ {table} is not partitioned, nothing to do.")
+        elif f"p{season}" in partitions:
+            print(f"ℹ️ {table} already has partition p{season}.")
+        else:
+            cur.execute(f"""
+                ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO (
+                    {_partition(season)},
+                    PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE)
+            """)
+            print(f"✅ Added partition p{season} to {table}")
+    cur.close()
+    conn.close()
+
+
+def check_partition_pruning(season):
+    """EXPLAIN the hot season-filtered queries and report which partitions they touch.
+
+    Returns False if one of them reads more than one partition of a partitioned table.
+    """
+    conn = connect_db(True)
+    cur = conn.cursor(dictionary=True)
+    pruned = True
+    print(f"\n🔎 Partition pruning for season {season}:")
+    for name, sql, params in pruning_queries(season):
+        cur.execute("EXPLAIN " + sql, params)
+        for row in cur.fetchall():
+            if row["table"] not in ("s", "mi", *PARTITIONED_TABLES):
+                continue
+            partitions = (row.get("partitions") or "").split(",")
+            ok = len(partitions) == 1 and partitions[0] == f"p{season}"
+            pruned &= ok
+            print(f"   {'✅' if ok else '❌'} {name:<28} {row['table']:<10} partitions={','.join(partitions)}")
+    cur.close()
+    conn.close()
+    return pruned
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and load the betrivals database from csv_files/")
+    layout = parser.add_mutually_exclusive_group()
+    layout.add_argument("--compact", action="store_true",
+                        help="migrate shot_data/match_info of the loaded database to the compact schema and exit")
+    layout.add_argument("--partitioned", action="store_true",
+                        help="create shot_data/match_info partitioned by season when loading")
+    parser.add_argument("--drop-legacy", action="store_true",
+                        help="with --compact, drop the old tables instead of keeping them as *_legacy")
+    parser.add_argument("--cube", action="store_true",
+                        help="rebuild the shot_cube aggregate table from shot_data and exit")
+    parser.add_argument("--add-season-partition", type=int, metavar="SEASON",
+                        help="give SEASON its own partition in the partitioned tables and exit")
+    parser.add_argument("--check-pruning", type=int, metavar="SEASON",
+                        help="EXPLAIN the hot queries for SEASON and exit nonzero unless they hit one partition")
+    parser.add_argument("--chunk-rows", type=int, default=LOAD_CHUNK_ROWS,
+                        help=f"CSV rows read and inserted at a time (default {LOAD_CHUNK_ROWS})")
+    parser.add_argument("--rss-budget", type=int, default=LOAD_RSS_BUDGET_MB, metavar="MB",
+                        help=f"resident memory a table load may add to the process (default {LOAD_RSS_BUDGET_MB})")
+    args = parser.parse_args()
+
+    if args.compact:
+        migrate_compact_schema(drop_legacy=args.drop_legacy)
+        raise SystemExit(0)
+    if args.cube:
+        build_shot_cube()
+        raise SystemExit(0)
+    if args.add_season_partition:
+        add_season_partition(args.add_season_partition)
+        raise SystemExit(0)
+    if args.check_pruning:
+        raise SystemExit(0 if check_partition_pruning(args.check_pruning) else 1)
+
     print("""
 ! - - - - - - - - - !
           
@@ -303,12 +1212,18 @@ If you want to continue, press ENTER or stop via CTRL^C
     input("->")
     print("🚀 Initializing database from CSVs ...")
     create_database()
-    create_tables()
+    create_tables(partitioned=args.partitioned)
     
     # Insert data in correct order (parent tables before child tables)
+    reports = []
     for table, file in CSV_MAP_ORDERED:
-        insert_from_csv(table, file)
+        report = insert_from_csv(table, file, chunk_rows=args.chunk_rows, rss_budget_mb=args.rss_budget)
+        if report:
+            reports.append(report)
+    print_load_report(reports, args.rss_budget)
     
+    build_shot_cube()
+
     # Verify foreign keys were created
     verify_foreign_keys()
     
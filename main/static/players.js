@@ -1,5 +1,22 @@
 // Players Page JavaScript
 
+// Columns shown in the FUT23 table, only these are requested from the API
+const FUT23_COLUMNS = ['Name', 'Team', 'League', 'Position', 'Rating', 'Pace', 'Shoot',
+                       'Pass', 'Drible', 'Defense', 'Physical', 'Price'];
+const FUT23_PAGE_SIZE = 50;
+const fut23State = { page: 1, sort: '-Rating' };
+
+// Fields the search cards and the detail view render, nothing else is fetched
+const SEARCH_FIELDS = ['player_id', 'player_name', 'position', 'team_title', 'goals',
+                       'assists', 'fifa_rating'];
+const DETAIL_FIELDS = ['player_name', 'position', 'team_title', 'year', 'games', 'time',
+                       'goals', 'assists', 'shots', 'key_passes', 'xG', 'xA', 'npg', 'npxG',
+                       'xGChain', 'xGBuildup', 'yellow_cards', 'red_cards', 'fut23_team',
+                       'fut23_position', 'Country', 'League', 'Rating', 'Other_Positions',
+                       'Run_type', 'Price', 'Skill', 'Weak_foot', 'Attack_rate', 'Defense_rate',
+                       'Pace', 'Shoot', 'Pass', 'Drible', 'Defense', 'Physical', 'Body_type',
+                       'Height_cm', 'Weight', 'Popularity', 'Base_Stats', 'In_Game_Stats'];
+
 document.addEventListener('DOMContentLoaded', function () {
     const btnAnalysis = document.getElementById('btn-analysis');
     const btnTest = document.getElementById('btn-test-fut23');
@@ -47,15 +64,8 @@ document.addEventListener('DOMContentLoaded', function () {
             resultsDiv.innerHTML = '<div class="loading">Loading players data</div>';
 
             try {
-                const response = await fetch('/api/players/fut23');
-                const data = await response.json();
-
-                if (!response.ok) {
-                    throw new Error(data.error || 'Failed to fetch data');
-                }
-
-                displayResults(data);
-
+                fut23State.page = 1;
+                await loadFut23Page();
             } catch (error) {
                 console.error('Error:', error);
                 resultsDiv.innerHTML = `
@@ -83,7 +93,8 @@ document.addEventListener('DOMContentLoaded', function () {
             searchResultsDiv.innerHTML = '<div class="loading">Searching players...</div>';
 
             try {
-                const response = await fetch(`/api/players/search?q=${encodeURIComponent(query)}`);
+                const params = new URLSearchParams({ q: query, fields: SEARCH_FIELDS.join(',') });
+                const response = await fetch(`/api/players/search?${params}`);
                 const data = await response.json();
 
                 if (!response.ok) {
@@ -179,6 +190,36 @@ function displayAnalysisResults(data) {
     resultsDiv.innerHTML = tableHTML;
 }
 
+// Fetch one page of FUT23 cards, sorted and projected by the server
+async function loadFut23Page() {
+    const params = new URLSearchParams({
+        fields: FUT23_COLUMNS.join(','),
+        sort: fut23State.sort,
+        page: fut23State.page,
+        page_size: FUT23_PAGE_SIZE
+    });
+    const response = await fetch(`/api/players/fut23?${params}`);
+    const data = await response.json();
+
+    if (!response.ok) {
+        throw new Error(data.error || 'Failed to fetch data');
+    }
+
+    displayResults(data);
+}
+
+// Clicking a header sorts by it, clicking it again flips the direction
+function sortFut23(column) {
+    fut23State.sort = fut23State.sort === `-${column}` ? column : `-${column}`;
+    fut23State.page = 1;
+    loadFut23Page().catch(error => console.error('Error:', error));
+}
+
+function goToFut23Page(page) {
+    fut23State.page = page;
+    loadFut23Page().catch(error => console.error('Error:', error));
+}
+
 function displayResults(data) {
     const resultsDiv = document.getElementById('results');
 
@@ -187,8 +228,9 @@ function displayResults(data) {
         return;
     }
 
-    // Get all column names from the first player object
-    const columns = Object.keys(data.players[0]);
+    const columns = FUT23_COLUMNS;
+    const lastPage = Math.max(1, Math.ceil(data.total / data.page_size));
+    const sortMark = col => fut23State.sort === col ? ' ▲' : fut23State.sort === `-${col}` ? ' ▼' : '';
 
     // Create table HTML
     let tableHTML = `
@@ -197,12 +239,16 @@ function displayResults(data) {
                 <span>🏆</span>
                 <span>FUT23 Players Data</span>
             </div>
-            <div class="results-count">Total players: ${data.count}</div>
+            <div class="results-count">
+                Total players: ${data.total} (page ${data.page} of ${lastPage})
+                <button ${data.page <= 1 ? 'disabled' : ''} onclick="goToFut23Page(${data.page - 1})">‹ Prev</button>
+                <button ${data.page >= lastPage ? 'disabled' : ''} onclick="goToFut23Page(${data.page + 1})">Next ›</button>
+            </div>
             <div class="players-table">
                 <table>
                     <thead>
                         <tr>
-                            ${columns.map(col => `<th>${col}</th>`).join('')}
+                            ${columns.map(col => `<th style="cursor: pointer;" onclick="sortFut23('${col}')">${col}${sortMark(col)}</th>`).join('')}
                         </tr>
                     </thead>
                     <tbody>
@@ -279,14 +325,15 @@ async function loadPlayerDetail(playerId) {
     const container = document.getElementById('player-detail-container');
     
     try {
-        const response = await fetch(`/api/players/${playerId}`);
+        const params = new URLSearchParams({ fields: DETAIL_FIELDS.join(',') });
+        const response = await fetch(`/api/players/${playerId}?${params}`);
         const data = await response.json();
 
         if (!response.ok) {
             throw new Error(data.error || 'Failed to load player details');
         }
 
-        displayPlayerDetail(data.player);
+        displayPlayerDetail(data.player, data.percentiles);
 
     } catch (error) {
         console.error('Error:', error);
@@ -298,7 +345,7 @@ async function loadPlayerDetail(playerId) {
     }
 }
 
-function displayPlayerDetail(player) {
+function displayPlayerDetail(player, percentiles) {
     const container = document.getElementById('player-detail-container');
 
     if (!player) {
@@ -461,6 +508,23 @@ function displayPlayerDetail(player) {
                 </div>
             </div>
 
+            ${percentiles ? `
+            <div class="detail-box percentile-box">
+                <h3 class="box-title">📈 Per 90 vs ${percentiles.position_group}s (${percentiles.year}, ${percentiles.peers} peers)</h3>
+                <div class="box-content">
+                    ${Object.entries(percentiles.stats).map(([stat, value]) => `
+                    <div class="stat-row">
+                        <span class="stat-name">${stat}:</span>
+                        <span class="stat-number">${value.per90.toFixed(2)} · ${value.percentile === null ? '-' : Math.round(value.percentile) + 'th pct'}</span>
+                    </div>`).join('')}
+                    ${percentiles.qualified ? '' : `
+                    <div class="stat-row">
+                        <span class="stat-name">Only ${percentiles.minutes} minutes played, not part of the peer pool</span>
+                    </div>`}
+                </div>
+            </div>
+            ` : ''}
+
             <div class="detail-box additional-box">
                 <h3 class="box-title">ℹ️ Additional Information</h3>
                 <div class="box-content">
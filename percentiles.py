@@ -0,0 +1,120 @@
+import time
+import logging
+import threading
+import numpy as np
+from utils import on_invalidate
+
+logger = logging.getLogger(__name__)
+
+# player season totals ranked per 90 minutes against the same year and position group
+PERCENTILE_STATS = ["goals", "xG", "xA", "key_passes", "xGChain", "xGBuildup"]
+MIN_MINUTES = 450 # fewer minutes than five full games don't make a meaningful per-90 peer
+TABLE_SQL = "SELECT player_id, year, position, time, " + ", ".join(PERCENTILE_STATS) + " FROM player"
+
+# understat lists every role a player had (e.g. "D F M S"), the most attacking one decides the group
+POSITION_GROUPS = [("GK", "Goalkeeper"), ("F", "Forward"), ("M", "Midfielder"), ("D", "Defender")]
+
+
+def position_group(position):
+    roles = (position or "").split()
+    return next((group for role, group in POSITION_GROUPS if role in roles), "Substitute")
+
+
+class PercentileTable:
+    """Per-90 stats and their percentile within (year, position group) for every player season.
+
+    Each peer group is one (players x stats) matrix: sorting it column-wise
+    once and binary-searching every player's values into it gives all
+    percentiles of the group in a single vectorized step. Only players with
+    MIN_MINUTES form the peer pool, everyone is ranked against it.
+    """
+
+    def __init__(self, rows):
+        self.built_at = time.monotonic()
+        self.seasons = {} # (player_id, year) -> entry
+        self.latest = {}  # player_id -> most recent year
+
+        minutes = np.array([row["time"] or 0 for row in rows], dtype=np.float64)
+        totals = np.array([[row[stat] or 0 for stat in PERCENTILE_STATS] for row in rows],
+                          dtype=np.float64).reshape(len(rows), len(PERCENTILE_STATS))
+        per90 = np.divide(totals * 90, minutes[:, None], out=np.zeros_like(totals), where=minutes[:, None] > 0)
+        qualified = minutes >= MIN_MINUTES
+        keys = np.array([f"{row['year']}|{position_group(row['position'])}" for row in rows], dtype=object)
+
+        percentiles = np.full_like(per90, np.nan)
+        # one stable sort puts every peer group in a contiguous run instead of a keys == key scan per group
+        groups, group_of, sizes = np.unique(keys, return_inverse=True, return_counts=True) \
+            if len(rows) else (np.zeros(0, dtype=object), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        order = np.argsort(group_of, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        peers = np.zeros(len(groups), dtype=np.int64)
+        for g in range(len(groups)):
+            members = order[offsets[g]:offsets[g + 1]]
+            pool = np.sort(per90[members][qualified[members]], axis=0)
+            peers[g] = len(pool)
+            if not len(pool):
+                continue
+            for s in range(len(PERCENTILE_STATS)):
+                values = per90[members, s]
+                below = np.searchsorted(pool[:, s], values, side="left")
+                equal = np.searchsorted(pool[:, s], values, side="right") - below
+                percentiles[members, s] = (below + equal / 2) / len(pool) * 100
+
+        for i, row in enumerate(rows):
+            group = keys[i].split("|", 1)[1]
+            self.seasons[(row["player_id"], row["year"])] = {
+                "year": row["year"], "position_group": group, "minutes": int(minutes[i]),
+                "qualified": bool(qualified[i]), "peers": int(peers[group_of[i]]),
+                "stats": {stat: {"per90": round(float(per90[i, s]), 3),
+                                 "percentile": None if np.isnan(percentiles[i, s]) else round(float(percentiles[i, s]), 1)}
+                          for s, stat in enumerate(PERCENTILE_STATS)},
+            }
+            if row["year"] is not None and row["year"] > self.latest.get(row["player_id"], -1):
+                self.latest[row["player_id"]] = row["year"]
+
+    def lookup(self, player_id, year=None):
+        return self.seasons.get((player_id, self.latest.get(player_id) if year is None else year))
+
+
+class PlayerPercentiles:
+    """PercentileTable built at warmup (or on first use) and rebuilt only when player changes.
+
+    A player table reloaded by kickstarter in another process isn't seen
+    until the next /admin/jobs/player_percentiles/run or worker restart.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._table = None
+        self._lock = threading.Lock()
+        self.background = False # a JobRunner refreshes it, requests only ever build the first one
+        on_invalidate(self._on_invalidate)
+
+    def _on_invalidate(self, tables):
+        if "player" in tables and not self.background:
+            self._table = None
+
+    def _build(self):
+        started = time.monotonic()
+        rows = self.db.execute_query(TABLE_SQL)
+        table = PercentileTable(rows or [])
+        logger.info("Built percentile table of %d player seasons in %.1f ms",
+                    len(table.seasons), (time.monotonic() - started) * 1000)
+        return table
+
+    def refresh(self):
+        with self._lock:
+            self._table = self._build()
+
+    def table(self):
+        table = self._table
+        if table is None:
+            with self._lock:
+                if self._table is table:
+                    self._table = self._build()
+                table = self._table
+        return table
+
+    def lookup(self, player_id, year=None):
+        """Percentiles of one player season, the latest season when year is None."""
+        return self.table().lookup(player_id, year)
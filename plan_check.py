@@ -0,0 +1,214 @@
+"""EXPLAIN plan regression check for the SQL the app's routes run.
+
+Drives every read route through the Flask test client against the MySQL in
+.env, records each statement it issues (utils.on_query), runs
+EXPLAIN FORMAT=JSON on it with the same parameters and compares access type,
+key and estimated rows per table with plan_baseline.json.
+
+    python plan_check.py            # exit 1 and print a plan diff on regression
+    python plan_check.py --update   # accept the current plans as the baseline
+
+tests/test_plans.py runs the same check, plus full-scan assertions that need
+no baseline, under pytest when PLAN_CHECK_DSN points at a MySQL.
+"""
+import sys
+import json
+import difflib
+import os
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ["JOBS"] = "0" # background refreshes would mix their statements into the captured ones
+
+import app as webapp
+from utils import on_query
+
+BASELINE = "plan_baseline.json"
+ROWS_FACTOR = 2.0 # estimated rows may grow this much before it counts as a regression
+ROWS_SLACK = 100 # ...and small tables may wobble by this many rows
+
+# best to worst, per the MySQL EXPLAIN documentation
+ACCESS_TYPES = ["system", "const", "eq_ref", "ref", "fulltext", "ref_or_null", "index_merge",
+                "unique_subquery", "index_subquery", "range", "index", "ALL"]
+
+# aliases the app's SQL and the compact views give the two big tables
+BIG_TABLES = ("shot_data", "s", "match_info", "mi", "shot_data_compact", "match_info_compact")
+# routes that read a whole big table by design, so a full scan there is no regression
+WHOLE_TABLE_READS = {
+    "match timeline": "the timeline store loads every shot of every match once",
+}
+
+# (label, method, url, json body); {player_id}, {shot_id}, {match_id}, {season}, {team} come from the database
+ROUTES = [
+    ("fut23 page", "GET", "/api/players/fut23?fields=Name,Rating&sort=-Rating&page=2&page_size=50", None),
+    ("players analysis", "GET", "/api/players/analysis", None),
+    ("players search", "GET", "/api/players/search?q={player_prefix}", None),
+    ("player detail", "GET", "/api/players/{player_id}", None),
+    ("similar players", "GET", "/api/players/{fut23_id}/similar", None),
+    ("shot detail", "GET", "/shot/{shot_id}", None),
+    ("shot detail api", "GET", "/api/shots/{shot_id}", None),
+    ("match timeline", "GET", "/api/matches/{match_id}/timeline", None),
+    ("player page", "GET", "/talha/{player_id}", None),
+    ("search shots", "GET", "/api/search/shots?player={player_prefix}&season={season}", None),
+    ("search shots by team", "GET", "/api/search/shots?team={team}&result=Goal", None),
+    ("autocomplete", "GET", "/api/players/autocomplete?q={player_prefix}", None),
+    ("player stats", "GET", "/api/stats/player/{player_id}", None),
+    ("shot cube", "GET", "/api/shots/cube?by=team,season", None),
+    ("matches", "POST", "/api/matches", {"season": "{season}", "team_home": "{team}", "limit": 50}),
+    ("simulate", "GET", "/api/simulate?season={season}&sims=100", None),
+    ("export shots", "GET", "/api/export/shots?season={season}", None),
+    ("export matches", "GET", "/api/export/matches?season={season}", None),
+]
+
+
+def sample_values(db):
+    """Representative ids for the route URLs: a real shot, its player and season."""
+    shot = db.execute_query(
+        "SELECT s.shot_id, s.player_id, s.player, s.season, s.h_team, s.match_id FROM shot_data s "
+        "JOIN player p ON p.player_id = s.player_id WHERE s.match_id IS NOT NULL ORDER BY s.shot_id LIMIT 1")[0]
+    fut23 = db.execute_query("SELECT player_id FROM fut23 ORDER BY player_id LIMIT 1")[0]
+    return {"shot_id": shot["shot_id"], "player_id": shot["player_id"], "season": shot["season"],
+            "match_id": shot["match_id"],
+            "player_prefix": (shot["player"] or "a")[:4], "team": shot["h_team"],
+            "fut23_id": fut23["player_id"]}
+
+
+def capture(values):
+    """{label: [(query, params)]} for every statement the routes issue, in order."""
+    captured = []
+    recording = {"on": True}
+
+    @on_query
+    def record(query, params, seconds):
+        if recording["on"]:
+            captured.append((query, params))
+
+    flask_app = webapp.create_app(warmup=False)
+    # no rate limits while we walk the routes
+    flask_app.config["RATE_LIMITS"] = {rule.endpoint: (1e9, 1e9) for rule in flask_app.url_map.iter_rules()}
+    client = flask_app.test_client()
+
+    statements = {}
+    for label, method, url, body in ROUTES:
+        captured.clear()
+        url = url.format(**values)
+        if body is not None:
+            body = {k: v.format(**values) if isinstance(v, str) else v for k, v in body.items()}
+        response = client.open(url, method=method, json=body)
+        response.get_data() # drain streamed exports so their query runs
+        if response.status_code >= 400:
+            print(f"⚠️ {label}: {method} {url} answered {response.status_code}")
+        seen = set()
+        statements[label] = [(q, p) for q, p in captured
+                             if q.lstrip().upper().startswith("SELECT") and not (q in seen or seen.add(q))]
+    recording["on"] = False
+    return statements
+
+
+def _tables(node):
+    """Every table access in an EXPLAIN FORMAT=JSON tree, in plan order."""
+    if isinstance(node, dict):
+        table = node.get("table")
+        if isinstance(table, dict) and "access_type" in table:
+            yield table
+        for value in node.values():
+            yield from _tables(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _tables(item)
+
+
+def explain(db, query, params):
+    rows = db.execute_query("EXPLAIN FORMAT=JSON " + query, params)
+    plan = json.loads(list(rows[0].values())[0])
+    return [{"table": t.get("table_name"), "access_type": t.get("access_type"), "key": t.get("key"),
+             "possible_keys": t.get("possible_keys"), "rows": t.get("rows_examined_per_scan")}
+            for t in _tables(plan)]
+
+
+def current_plans():
+    """{"<route label> #<n>": {"sql", "plan"}} of every SELECT the routes issue."""
+    db = webapp.db.get()
+    statements = capture(sample_values(db))
+    return {f"{label} #{i + 1}": {"sql": " ".join(q.split()), "plan": explain(db, q, p)}
+            for label, queries in statements.items() for i, (q, p) in enumerate(queries)}
+
+
+def full_scans(name, plan):
+    """(step, unavoidable) for each full scan of shot_data/match_info in the plan of statement
+    `name`. Unavoidable means MySQL had no index for it, or the route reads the whole table anyway."""
+    by_design = name.rsplit(" #", 1)[0] in WHOLE_TABLE_READS
+    return [(step, by_design or not step.get("possible_keys")) for step in plan
+            if step["table"] in BIG_TABLES and step["access_type"] == "ALL"]
+
+
+def regressions(old, new):
+    """Reasons the new plan of one statement is worse than the old one."""
+    problems = []
+    before = {step["table"]: step for step in old}
+    for step in new:
+        prev = before.get(step["table"])
+        if prev is None:
+            continue
+        if ACCESS_TYPES.index(step["access_type"]) > ACCESS_TYPES.index(prev["access_type"]):
+            problems.append(f"{step['table']}: access {prev['access_type']} -> {step['access_type']}")
+        if prev["key"] and step["key"] != prev["key"]:
+            problems.append(f"{step['table']}: key {prev['key']} -> {step['key']}")
+        if (step["rows"] or 0) > (prev["rows"] or 0) * ROWS_FACTOR + ROWS_SLACK:
+            problems.append(f"{step['table']}: rows {prev['rows']} -> {step['rows']}")
+    return problems
+
+
+def _describe(steps):
+    return [f"{s['table']:<14} {s['access_type']:<8} key={s['key']} rows={s['rows']}" for s in steps]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="write the current plans as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    plans = current_plans()
+
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(plans, f, indent=2, sort_keys=True)
+        print(f"Wrote {len(plans)} plans to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No {args.baseline} yet, run with --update first")
+        return 2
+
+    failed = 0
+    for name, current in sorted(plans.items()):
+        old = baseline.get(name)
+        if old is None:
+            print(f"➕ {name}: new statement, not in the baseline")
+            continue
+        problems = regressions(old["plan"], current["plan"])
+        if old["sql"] != current["sql"]:
+            print(f"✏️ {name}: SQL changed since the baseline")
+        if not problems:
+            continue
+        failed += 1
+        print(f"\n❌ {name}\n   {current['sql'][:300]}")
+        for problem in problems:
+            print(f"   - {problem}")
+        for line in difflib.unified_diff(_describe(old["plan"]), _describe(current["plan"]),
+                                         "baseline", "current", lineterm=""):
+            print(f"   {line}")
+    for name in sorted(set(baseline) - set(plans)):
+        print(f"➖ {name}: no longer issued")
+
+    print(f"\n{len(plans)} statements checked, {failed} regressed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
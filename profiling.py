@@ -0,0 +1,199 @@
+import os
+import sys
+import hmac
+import json
+import time
+import random
+import hashlib
+import cProfile
+import logging
+import threading
+from collections import Counter
+from flask import request, g
+from utils import on_query
+
+logger = logging.getLogger(__name__)
+
+# Nothing is hooked into the app unless PROFILE is set, so the default cost is zero
+PROFILE_ENABLED = os.getenv('PROFILE', '').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', './profiles')
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '1')) / 1000
+SIGNATURE_MAX_AGE = 300
+HEADER = "X-Profile"
+
+
+def sign(secret, path, timestamp=None):
+    """Header value that asks for one request to `path` to be profiled: '<unix time>:<hmac>'."""
+    timestamp = str(int(time.time() if timestamp is None else timestamp))
+    digest = hmac.new(secret.encode(), f"{timestamp}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{digest}"
+
+
+def verify(secret, path, value, now=None):
+    timestamp, _, digest = (value or "").partition(":")
+    if not timestamp.isdigit() or not digest:
+        return False
+    if abs((time.time() if now is None else now) - int(timestamp)) > SIGNATURE_MAX_AGE:
+        return False
+    return hmac.compare_digest(sign(secret, path, timestamp).partition(":")[2], digest)
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack every `interval` seconds into collapsed-stack counts.
+
+    The output is the 'frame;frame;frame count' format that flamegraph.pl and
+    speedscope read directly.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class _RequestProfile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident())
+        self.queries = []
+        self.started = time.perf_counter()
+
+
+class RequestProfiler:
+    """Opt-in cProfile + stack sampling of whole requests.
+
+    With PROFILE=1 a request is profiled when it carries a valid signed
+    X-Profile header (see sign(), keyed on the app's SECRET_KEY) or when it
+    falls in PROFILE_SAMPLE_RATE. Each profiled request leaves three files in
+    PROFILE_DIR/<endpoint>/: a .pstats for snakeviz/pstats, a .collapsed for
+    flamegraphs, and a .json summary with SQL time split out per query. The
+    response gets a Server-Timing header with the same split.
+
+    Only one cProfile profiler can be active at a time (Python 3.12+ raises
+    otherwise), so a request that wants profiling while another one is being
+    profiled in the same process runs unprofiled and counts as busy.
+    """
+
+    def __init__(self, app=None, sample_rate=PROFILE_SAMPLE_RATE, output_dir=PROFILE_DIR):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._local = threading.local()
+        self._active = threading.Lock()
+        self.stats = {"profiled": 0, "busy": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.secret = app.config["SECRET_KEY"]
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        on_query(self._record_query)
+        logger.info("Request profiling enabled, sample rate %s, writing to %s",
+                    self.sample_rate, self.output_dir)
+
+    def _wanted(self):
+        if HEADER in request.headers:
+            return verify(self.secret, request.path, request.headers[HEADER])
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._wanted():
+            return
+        if not self._active.acquire(blocking=False):
+            self.stats["busy"] += 1
+            return
+        profile = _RequestProfile()
+        try:
+            profile.profiler.enable()
+        except ValueError: # a profiler we don't own is running, e.g. the server under cProfile
+            self._active.release()
+            self.stats["busy"] += 1
+            return
+        g.request_profile = profile
+        self._local.profile = profile
+        profile.sampler.start()
+
+    def _stop(self, profile):
+        profile.profiler.disable()
+        profile.sampler.stop()
+        self._local.profile = None
+        self._active.release()
+
+    def _record_query(self, query, params, seconds):
+        profile = getattr(self._local, "profile", None)
+        if profile is not None:
+            profile.queries.append((" ".join(query.split())[:200], seconds))
+
+    def _finish(self, response):
+        profile = g.pop("request_profile", None)
+        if profile is None:
+            return response
+        self._stop(profile)
+
+        total = time.perf_counter() - profile.started
+        sql = sum(seconds for _, seconds in profile.queries)
+        response.headers.add("Server-Timing", f"sql;dur={sql * 1000:.1f}, "
+                                              f"app;dur={(total - sql) * 1000:.1f}, total;dur={total * 1000:.1f}")
+        try:
+            self._dump(profile, total, sql, response.status_code)
+        except OSError as e:
+            logger.error("Could not write request profile: %s", e)
+        return response
+
+    def _teardown(self, exc):
+        # after_request is skipped when the view raised, don't keep the profiler running
+        profile = g.pop("request_profile", None)
+        if profile is not None:
+            self._stop(profile)
+
+    def _dump(self, profile, total, sql, status):
+        endpoint = request.endpoint or "unmatched"
+        directory = os.path.join(self.output_dir, endpoint)
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}")
+
+        profile.profiler.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(profile.sampler.collapsed())
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({"method": request.method, "path": request.full_path.rstrip("?"),
+                       "endpoint": endpoint, "status": status,
+                       "total_ms": round(total * 1000, 2), "sql_ms": round(sql * 1000, 2),
+                       "python_ms": round((total - sql) * 1000, 2),
+                       "samples": sum(profile.sampler.stacks.values()),
+                       "queries": [{"sql": q, "ms": round(s * 1000, 2)} for q, s in profile.queries]},
+                      f, indent=2)
+        self.stats["profiled"] += 1
+        logger.info("Profiled %s %s in %.1f ms (%.1f ms SQL) -> %s", request.method, request.path,
+                    total * 1000, sql * 1000, base)
+
+
+if __name__ == "__main__":
+    # python profiling.py /shot/123  ->  curl -H "X-Profile: <output>" ...
+    from dotenv import load_dotenv
+    load_dotenv()
+    if len(sys.argv) != 2:
+        sys.exit("usage: python profiling.py <path>")
+    print(sign(os.getenv("secret_key", "bet-rivals-bostanXXX"), sys.argv[1]))
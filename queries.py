@@ -0,0 +1,420 @@
+"""SQL of the read APIs, shared by the Flask app (app.py) and the asyncio server (async_app.py).
+
+Builders take the request's query-string/JSON mapping and return the
+statement with its parameters, so both servers send MySQL exactly the same
+queries. Invalid fields, sorts or numbers raise ValueError.
+"""
+from kickstarter import table_columns
+
+MAX_PAGE_SIZE = 500
+
+# output name -> SQL expression that clients may ask for with ?fields= and ?sort=
+FUT23_FIELDS = {name: f"`{name}`" for name, _ in table_columns("fut23")}
+
+PLAYER_SEARCH_FIELDS = {
+    "player_id": "p.player_id", "player_name": "p.player_name", "goals": "p.goals",
+    "assists": "p.assists", "games": "p.games", "xG": "p.xG", "position": "p.position",
+    "team_title": "p.team_title", "year": "p.year", "fifa_rating": "f.Rating",
+    "Pace": "f.Pace", "Shoot": "f.Shoot", "Pass": "f.Pass", "Drible": "f.Drible",
+    "Defense": "f.Defense", "Physical": "f.Physical", "Country": "f.Country", "League": "f.League",
+}
+
+# every player column plus the fut23 card, fut23 names that clash with player get a prefix
+PLAYER_DETAIL_FIELDS = {
+    **{name: f"p.{name}" for name, _ in table_columns("player") if name != "best_shot_id"},
+    **{name: f"f.{name}" for name, _ in table_columns("fut23")
+       if name not in ("Name", "Team", "Position", "player_id")},
+    "fut23_name": "f.Name", "fut23_team": "f.Team", "fut23_position": "f.Position",
+}
+
+
+def select_list(args, allowed, default=None):
+    """SQL select list for ?fields=a,b,c, restricted to the `allowed` whitelist"""
+    requested = [f.strip() for f in args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    fields = requested or default or list(allowed)
+    return ", ".join(allowed[f] if allowed[f] == f"`{f}`" else f"{allowed[f]} AS `{f}`" for f in fields)
+
+
+def order_by(args, allowed, default, unique=()):
+    """ORDER BY for ?sort=-Rating,Name (leading '-' sorts descending)
+
+    The `unique` columns go last so rows that tie on the requested sort keep
+    one order, otherwise LIMIT/OFFSET pages can repeat or skip them.
+    """
+    terms = []
+    for term in [t.strip() for t in args.get('sort', '').split(',') if t.strip()]:
+        field = term.lstrip('-')
+        if field not in allowed:
+            raise ValueError(f"Cannot sort by '{field}'")
+        terms.append(f"{allowed[field]} {'DESC' if term.startswith('-') else 'ASC'}")
+    terms = terms or [default]
+    sorted_by = {t.split()[0] for t in terms}
+    terms += [f"{column} ASC" for column in unique if column not in sorted_by]
+    return " ORDER BY " + ", ".join(terms)
+
+
+def page(args, default_size=None):
+    """(page, page_size, LIMIT clause) from ?page=&page_size=, no limit when neither is given"""
+    if 'page' not in args and 'page_size' not in args and default_size is None:
+        return None, None, ""
+    number = max(1, int(args.get('page', 1)))
+    size = max(1, min(int(args.get('page_size', default_size or 50)), MAX_PAGE_SIZE))
+    return number, size, f" LIMIT {size} OFFSET {(number - 1) * size}"
+
+
+# ---------------- PLAYERS ---------------- #
+
+FUT23_COUNT = "SELECT COUNT(*) AS total FROM fut23"
+
+
+def fut23_query(args):
+    """(query, page, page_size) of /api/players/fut23"""
+    number, size, limit = page(args)
+    query = ("SELECT " + select_list(args, FUT23_FIELDS) + " FROM fut23"
+             + order_by(args, FUT23_FIELDS, "`player_id` ASC", unique=("`player_id`",)) + limit)
+    return query, number, size
+
+
+PLAYERS_ANALYSIS = """
+        SELECT
+            p.player_id,
+            p.player_name,
+            p.goals,
+            p.assists,
+            p.games,
+            p.xG,
+            p.position,
+            p.team_title,
+            p.year,
+            f.Rating AS fifa_rating,
+            f.Pace,
+            f.Shoot,
+            f.Pass,
+            f.Drible,
+            f.Defense,
+            f.Physical,
+            f.Base_Stats,
+            f.In_Game_Stats,
+            f.Country,
+            f.League
+        FROM player p
+        INNER JOIN fut23 f ON p.player_id = f.player_id
+        WHERE p.goals IS NOT NULL AND f.Rating IS NOT NULL
+        ORDER BY p.goals DESC, f.Rating ASC
+        LIMIT 50
+        """
+
+
+def player_search_query(args, search_query):
+    """(query, params, page, page_size) of /api/players/search, 50 players per page
+
+    No DISTINCT: player rows are one per season and fut23 is keyed by
+    player_id, so the join can't repeat a row, and MySQL rejects DISTINCT
+    with ORDER BY on a column outside the select list (error 3065).
+    """
+    number, size, limit = page(args, default_size=50)
+    # Use LIKE for partial matching
+    search_pattern = f"%{search_query}%"
+    query = f"""
+        SELECT
+            {select_list(args, PLAYER_SEARCH_FIELDS)}
+        FROM player p
+        LEFT JOIN fut23 f ON p.player_id = f.player_id
+        WHERE p.player_name LIKE %s
+           OR p.team_title LIKE %s
+           OR p.position LIKE %s
+        {order_by(args, PLAYER_SEARCH_FIELDS, "p.player_name", unique=("p.player_id", "p.season_player_id"))}
+        {limit}
+        """
+    return query, [search_pattern, search_pattern, search_pattern], number, size
+
+
+def player_detail_query(args):
+    """Query of /api/players/<player_id>, takes the player_id as its one parameter"""
+    return f"""
+        SELECT {select_list(args, PLAYER_DETAIL_FIELDS)}
+        FROM player p
+        LEFT JOIN fut23 f ON p.player_id = f.player_id
+        WHERE p.player_id = %s
+        LIMIT 1
+        """
+
+
+PLAYER_AUTOCOMPLETE = """
+            SELECT DISTINCT player, player_id
+            FROM shot_data
+            WHERE player LIKE %s
+            ORDER BY player
+            LIMIT 20
+        """
+
+PLAYER_STATS = """
+            SELECT
+                p.*,
+                COUNT(DISTINCT s.match_id) as matches_with_shots,
+                COUNT(s.shot_id) as total_shots_taken,
+                SUM(CASE WHEN s.result = 'Goal' THEN 1 ELSE 0 END) as goals_from_shots
+            FROM player p
+            LEFT JOIN shot_data s ON p.player_id = s.player_id AND p.year = s.season
+            WHERE p.player_id = %s
+            GROUP BY p.season_player_id
+            ORDER BY p.year DESC
+        """
+
+
+# ---------------- SHOTS ---------------- #
+
+# Get shot details with match information
+SHOT_DETAIL = """
+            SELECT
+                s.shot_id,
+                s.minute,
+                s.result,
+                s.X,
+                s.Y,
+                s.xG,
+                s.player,
+                s.h_a,
+                s.player_id,
+                s.situation,
+                s.season,
+                s.shotType,
+                s.match_id,
+                s.h_team,
+                s.a_team,
+                s.h_goals,
+                s.a_goals,
+                s.date,
+                s.player_assisted,
+                s.lastAction,
+                m.league,
+                m.h_xg,
+                m.a_xg
+            FROM shot_data s
+            LEFT JOIN match_info m ON s.match_id = m.match_id
+            WHERE s.shot_id = %s
+        """
+
+# The three below only depend on the shot, so they can run side by side.
+# Get player information from player table: (player_id, season)
+SHOT_PLAYER = """
+            SELECT
+                p.season_player_id,
+                p.player_id,
+                p.player_name,
+                p.games,
+                p.time,
+                p.goals,
+                p.xG,
+                p.assists,
+                p.xA,
+                p.shots,
+                p.key_passes,
+                p.yellow_cards,
+                p.red_cards,
+                p.position,
+                p.team_title,
+                p.npg,
+                p.npxG,
+                p.xGChain,
+                p.xGBuildup,
+                p.year
+            FROM player p
+            WHERE p.player_id = %s AND p.year = %s
+        """
+
+# Get other shots by this player in the same match: (player_id, match_id, season, shot_id)
+SHOT_OTHER_SHOTS = """
+            SELECT
+                shot_id,
+                minute,
+                result,
+                xG,
+                situation,
+                shotType
+            FROM shot_data
+            WHERE player_id = %s
+            AND match_id = %s
+            AND season = %s
+            AND shot_id != %s
+            ORDER BY minute ASC
+        """
+
+# Get player's season statistics for comparison: (player_id, season)
+SHOT_SEASON_STATS = """
+            SELECT
+                COUNT(*) as total_shots,
+                SUM(CASE WHEN result = 'Goal' THEN 1 ELSE 0 END) as goals_scored,
+                AVG(xG) as avg_xg,
+                SUM(xG) as total_xg
+            FROM shot_data
+            WHERE player_id = %s AND season = %s
+        """
+
+
+def shot_detail_params(shot):
+    """Parameters of SHOT_PLAYER, SHOT_OTHER_SHOTS and SHOT_SEASON_STATS for a SHOT_DETAIL row"""
+    return ((shot['player_id'], shot['season']),
+            (shot['player_id'], shot['match_id'], shot['season'], shot['shot_id']),
+            (shot['player_id'], shot['season']))
+
+
+# ids of the teams a team filter means, in the compact layout: exact name or LIKE pattern
+TEAM_IDS_EXACT = "SELECT team_id FROM teams WHERE team_name = %s"
+TEAM_IDS_LIKE = "SELECT team_id FROM teams WHERE team_name LIKE %s"
+
+
+def _team_in(columns, ids):
+    """'(c1 IN (...) OR c2 IN (...))' for the resolved team ids, FALSE when no team matched"""
+    if not ids:
+        return "FALSE", []
+    placeholders = ",".join(["%s"] * len(ids))
+    return "(" + " OR ".join(f"{column} IN ({placeholders})" for column in columns) + ")", list(ids) * len(columns)
+
+
+def shot_filters(args, team_ids=None):
+    """WHERE conditions shared by shot search and shot export (player, team, season, result).
+
+    team_ids(name, exact) gives the ids of the teams a name means; pass it in the
+    compact layout so the team filter uses the indexed h_team_id/a_team_id
+    instead of matching the names the view joins in.
+    """
+    player_name = args.get('player', '').strip()
+    team = args.get('team', '').strip()
+    season = args.get('season', '').strip()
+    result = args.get('result', '').strip()
+
+    query = ""
+    params = []
+
+    if player_name:
+        query += " AND s.player LIKE %s"
+        params.append(f"%{player_name}%")
+
+    if team and team_ids:
+        condition, ids = _team_in(("s.h_team_id", "s.a_team_id"), team_ids(team, False))
+        query += " AND " + condition
+        params.extend(ids)
+    elif team:
+        query += " AND (s.h_team LIKE %s OR s.a_team LIKE %s)"
+        params.append(f"%{team}%")
+        params.append(f"%{team}%")
+
+    if season:
+        query += " AND s.season = %s"
+        params.append(int(season))
+
+    if result:
+        query += " AND s.result = %s"
+        params.append(result)
+
+    return query, params
+
+
+# the shot_data columns, not s.*: the compact layout's view also has the team ids
+SHOT_EXPORT = ("SELECT " + ", ".join(f"s.`{name}`" for name, _ in table_columns("shot_data"))
+               + " FROM shot_data s WHERE 1=1")
+
+SHOT_SEARCH = """
+            SELECT
+                s.shot_id,
+                s.player,
+                s.h_team,
+                s.a_team,
+                s.minute,
+                s.result,
+                s.xG,
+                s.situation,
+                s.season,
+                s.date,
+                s.h_a
+            FROM shot_data s
+            WHERE 1=1
+        """
+
+
+def shot_search_query(args, team_ids=None):
+    """(query, params) of /api/search/shots, at most MAX_PAGE_SIZE shots"""
+    limit = max(1, min(int(args.get('limit', 50)), MAX_PAGE_SIZE))
+    where, params = shot_filters(args, team_ids)
+    query = SHOT_SEARCH + where + " ORDER BY s.date DESC, s.minute DESC LIMIT %s"
+    params.append(limit)
+    return query, tuple(params)
+
+
+# ---------------- MATCHES ---------------- #
+
+MATCHES_SELECT = [
+    "SELECT mi.match_id, mi.date, mi.season, mi.league,",
+    "       mi.team_h, mi.team_a, mi.h_goals, mi.a_goals,",
+    "       mi.h_xg, mi.a_xg, mi.h_shot, mi.a_shot,",
+    "       md.isResult, md.xG_h, md.xG_a, md.forecast_w, md.forecast_d, md.forecast_l",
+    "FROM match_info mi",
+    "LEFT JOIN match_data md ON mi.match_id = md.match_id",
+    "WHERE 1=1"
+]
+
+
+def match_filters(filters, sql, team_ids=None):
+    """Append the match filter conditions to `sql` and return their parameters.
+
+    team_ids is the resolver of shot_filters, in the compact layout team names
+    become conditions on mi.h/mi.a.
+    """
+    params = []
+
+    if filters.get('q') and team_ids:
+        condition, ids = _team_in(("mi.h", "mi.a"), team_ids(filters['q'], False))
+        sql.append(f"AND ({condition} OR mi.match_id = %s)")
+        params.extend([*ids, filters['q']])
+    elif filters.get('q'):
+        sql.append("AND (LOWER(mi.team_h) LIKE %s OR LOWER(mi.team_a) LIKE %s OR mi.match_id = %s)")
+        q = f"%{filters['q'].lower()}%"
+        params.extend([q, q, filters['q']])
+
+    if filters.get('season'):
+        sql.append("AND mi.season = %s")
+        params.append(filters['season'])
+
+    for key, name_column, id_column in (('team_home', 'mi.team_h', 'mi.h'), ('team_away', 'mi.team_a', 'mi.a')):
+        if filters.get(key) and team_ids:
+            condition, ids = _team_in((id_column,), team_ids(filters[key], True))
+            sql.append("AND " + condition)
+            params.extend(ids)
+        elif filters.get(key):
+            sql.append(f"AND {name_column} = %s")
+            params.append(filters[key])
+
+    if filters.get('date_from'):
+        sql.append("AND mi.date >= %s")
+        params.append(filters['date_from'])
+
+    if filters.get('date_to'):
+        sql.append("AND mi.date <= %s")
+        params.append(filters['date_to'])
+
+    if filters.get('min_goals'):
+        sql.append("AND (COALESCE(mi.h_goals,0) + COALESCE(mi.a_goals,0)) >= %s")
+        params.append(int(filters['min_goals']))
+
+    if filters.get('max_goals'):
+        sql.append("AND (COALESCE(mi.h_goals,0) + COALESCE(mi.a_goals,0)) <= %s")
+        params.append(int(filters['max_goals']))
+
+    if filters.get('min_xg'):
+        sql.append("AND (COALESCE(mi.h_xg,0) + COALESCE(mi.a_xg,0)) >= %s")
+        params.append(float(filters['min_xg']))
+
+    return params
+
+
+def matches_query(filters, team_ids=None):
+    """(query, params, limit) of /api/matches, newest first, at most 5000 rows"""
+    limit = min(int(filters.get('limit', 50)), 5000)
+    sql = list(MATCHES_SELECT)
+    params = match_filters(filters, sql, team_ids)
+    sql.append(f"ORDER BY mi.date DESC LIMIT {limit}")
+    return " ".join(sql), params, limit
@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+import logging
+from functools import wraps
+from flask import request, jsonify, current_app
+from utils import query_deadline, QueryTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Above this many callers queued for a pooled connection, guarded routes answer 503 right away
+MAX_DB_WAITING = int(os.getenv('MAX_DB_WAITING', '10'))
+
+
+class TokenBucket:
+    """Classic token bucket: refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take one token. Returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0
+        return False, (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per (client IP, endpoint) token buckets kept in process memory.
+
+    Limits are set on the decorator and can be overridden per endpoint with
+    app.config["RATE_LIMITS"] = {"search_shots": (rate_per_sec, burst), ...}.
+    """
+
+    def __init__(self, max_buckets=10000):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def limit(self, rate, burst=None):
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                endpoint_rate, endpoint_burst = current_app.config.get('RATE_LIMITS', {}).get(
+                    request.endpoint, (rate, burst or rate))
+
+                allowed, retry_after = self._take((request.remote_addr, request.endpoint),
+                                                  endpoint_rate, endpoint_burst)
+                if not allowed:
+                    response = jsonify({"success": False, "error": "Too many requests"})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(max(1, round(retry_after)))
+                    return response
+                return f(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _take(self, key, rate, burst):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._prune()
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+            return bucket.take()
+
+    def _prune(self):
+        # drop buckets that have been idle long enough to be full again, they carry no state
+        now = time.monotonic()
+        idle = [key for key, b in self._buckets.items()
+                if b.tokens + (now - b.updated) * b.rate >= b.capacity]
+        for key in idle:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_buckets:
+            logger.warning("Rate limiter is tracking %d active clients, resetting buckets", len(self._buckets))
+            self._buckets.clear()
+
+
+class LoadShedder:
+    """Rejects requests with 503 once too many callers are queued for a DB connection.
+
+    Answering fast keeps the pool free for the requests already being served
+    instead of letting every client wait for a checkout timeout.
+    """
+
+    def __init__(self, db, max_waiting=MAX_DB_WAITING):
+        self.db = db
+        self.max_waiting = max_waiting
+        self.shed_count = 0
+
+    def guard(self, f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if self.db.load()['waiting'] >= self.max_waiting:
+                self.shed_count += 1
+                response = jsonify({"success": False, "error": "Server busy, try again shortly"})
+                response.status_code = 503
+                response.headers['Retry-After'] = '1'
+                return response
+            return f(*args, **kwargs)
+        return wrapper
+
+
+def deadline(seconds):
+    """Give all queries of a route one shared time budget.
+
+    Queries still running when it's spent are cut off by MySQL and the client
+    gets a 504. Override per endpoint with
+    app.config["ROUTE_DEADLINES"] = {"search_shots": 2.0}. Routes that catch
+    Exception themselves should let QueryTimeoutError through, and
+    CircuitOpenError for the app's 503 handler.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            budget = current_app.config.get('ROUTE_DEADLINES', {}).get(request.endpoint, seconds)
+            try:
+                with query_deadline(budget):
+                    return f(*args, **kwargs)
+            except QueryTimeoutError:
+                response = jsonify({"success": False, "error": "Query took too long, narrow the search"})
+                response.status_code = 504
+                return response
+        return wrapper
+    return decorator
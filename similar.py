@@ -0,0 +1,132 @@
+import time
+import logging
+import threading
+import numpy as np
+from utils import on_invalidate
+
+logger = logging.getLogger(__name__)
+
+# fut23 columns that make up a player's attribute vector
+ATTRIBUTES = ["Pace", "Shoot", "Pass", "Drible", "Defense", "Physical",
+              "Rating", "Skill", "Weak_foot", "Height_cm", "Weight"]
+INDEX_MAX_AGE = 3600 # kickstarter reloads run in another process, so rebuild at least hourly
+INDEX_SQL = ("SELECT player_id, Name, Team, League, Position, Other_Positions, Price, "
+             + ", ".join(ATTRIBUTES) + " FROM fut23")
+
+
+def parse_price(value):
+    """FUT prices come as '1.4M', '74.5K' or '700'. Returns a float or None."""
+    if value is None:
+        return None
+    text = str(value).strip().upper()
+    if not text:
+        return None
+    scale = {"K": 1e3, "M": 1e6}.get(text[-1], 1)
+    try:
+        return float(text.rstrip("KM")) * scale
+    except ValueError:
+        return None
+
+
+class PlayerIndex:
+    """Normalized attribute matrix of every fut23 card, built in one pass."""
+
+    def __init__(self, rows):
+        self.built_at = time.monotonic()
+        self.rows = rows
+        self.row_of = {row["player_id"]: i for i, row in enumerate(rows)}
+
+        raw = np.array([[np.nan if row[a] is None else row[a] for a in ATTRIBUTES] for row in rows],
+                       dtype=np.float64).reshape(len(rows), len(ATTRIBUTES))
+        # missing attributes count as average, then z-score so height in cm doesn't dominate
+        means = np.nanmean(raw, axis=0) if len(rows) else np.zeros(len(ATTRIBUTES))
+        raw = np.where(np.isnan(raw), means, raw)
+        stds = raw.std(axis=0)
+        stds[stds == 0] = 1
+        self.matrix = ((raw - means) / stds).astype(np.float32)
+        self.sq_norms = (self.matrix ** 2).sum(axis=1)
+
+        self.positions = np.array([row["Position"] or "" for row in rows], dtype=object)
+        self.other_positions = np.array([row["Other_Positions"] or "" for row in rows], dtype=object)
+        self.leagues = np.array([(row["League"] or "").lower() for row in rows], dtype=object)
+        prices = [parse_price(row["Price"]) for row in rows]
+        self.prices = np.array([np.nan if p is None else p for p in prices], dtype=np.float64)
+        self._position_masks = {}
+
+    def _position_mask(self, position):
+        # cached per position, the string scan over Other_Positions is the slow part
+        mask = self._position_masks.get(position)
+        if mask is None:
+            mask = (self.positions == position) | np.array(
+                [position in other.split(",") for other in self.other_positions], dtype=bool)
+            self._position_masks[position] = mask
+        return mask
+
+    def nearest(self, player_id, k=10, position=None, league=None, max_price=None):
+        """Top-k closest cards by euclidean distance on the normalized attributes."""
+        i = self.row_of.get(player_id)
+        if i is None:
+            return None
+
+        # |a-b|^2 = |a|^2 + |b|^2 - 2ab, one matrix-vector product for the whole catalogue
+        distances = self.sq_norms + self.sq_norms[i] - 2 * (self.matrix @ self.matrix[i])
+        mask = np.ones(len(self.rows), dtype=bool)
+        mask[i] = False
+        if position:
+            mask &= self._position_mask(position.upper())
+        if league:
+            mask &= self.leagues == league.lower()
+        if max_price is not None:
+            mask &= self.prices <= max_price # unknown prices compare False and drop out
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(distances[candidates], k)[:k]]
+        candidates = candidates[np.argsort(distances[candidates])]
+
+        return [{"player_id": self.rows[j]["player_id"], "Name": self.rows[j]["Name"],
+                 "Team": self.rows[j]["Team"], "League": self.rows[j]["League"],
+                 "Position": self.rows[j]["Position"], "Rating": self.rows[j]["Rating"],
+                 "Price": self.rows[j]["Price"],
+                 "distance": round(float(np.sqrt(max(distances[j], 0))), 4)}
+                for j in candidates]
+
+
+class SimilarPlayers:
+    """Lazily built PlayerIndex that is dropped whenever fut23 changes."""
+
+    def __init__(self, db):
+        self.db = db
+        self._index = None
+        self._lock = threading.Lock()
+        self.background = False # a JobRunner refreshes it, requests only ever build the first one
+        on_invalidate(self._on_invalidate)
+
+    def _on_invalidate(self, tables):
+        if "fut23" in tables and not self.background:
+            self._index = None
+
+    def _build(self):
+        started = time.monotonic()
+        rows = self.db.execute_query(INDEX_SQL)
+        index = PlayerIndex(rows or [])
+        logger.info("Built similar-player index of %d cards in %.1f ms",
+                    len(index.rows), (time.monotonic() - started) * 1000)
+        return index
+
+    def refresh(self):
+        """Build a new index and swap it in, lookups keep using the old one meanwhile."""
+        with self._lock:
+            self._index = self._build()
+
+    def index(self):
+        index = self._index
+        if index is None or not self.background and time.monotonic() - index.built_at > INDEX_MAX_AGE:
+            with self._lock:
+                if self._index is index:
+                    self._index = self._build()
+                index = self._index
+        return index
+
+    def similar(self, player_id, **filters):
+        return self.index().nearest(player_id, **filters)
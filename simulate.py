@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMULATIONS = 20000
+MAX_SIMULATIONS = 200000
+CHUNK = 10000 # simulations per vectorized step, bounds memory at CHUNK x fixtures
+TOP = 4
+RELEGATED = 3
+SIMULATION_TABLES = ("match_info", "match_data")
+# match_info only holds the matches between the tracked teams, not every fixture of their leagues
+COVERAGE_NOTE = ("Points and remaining fixtures both come from match_info, which only holds matches "
+                 "between the tracked teams; fixtures against other opponents are neither counted nor simulated.")
+
+# every match of the league-year, `played` when its result is in and it was before as_of
+MATCHES_SQL = """
+    SELECT mi.match_id, mi.h, mi.a, mi.team_h, mi.team_a, mi.h_goals, mi.a_goals,
+           md.forecast_w, md.forecast_d, md.forecast_l,
+           (mi.date <= %s AND md.isResult = 1
+            AND mi.h_goals IS NOT NULL AND mi.a_goals IS NOT NULL) AS played
+    FROM match_info mi
+    LEFT JOIN match_data md ON mi.match_id = md.match_id
+    WHERE mi.league = %s AND mi.season = %s
+    ORDER BY mi.date, mi.match_id
+"""
+
+
+def load_league(db, league, season, as_of=None):
+    """Teams, points so far and remaining fixtures of one league-year as plain arrays.
+
+    Matches after `as_of` (or without a result yet) are the ones simulated, so
+    passing a past date replays a finished season from that point. The points
+    so far are summed from the results of the same matches, see COVERAGE_NOTE.
+    """
+    as_of = as_of or "9999-12-31"
+    matches = db.execute_query(MATCHES_SQL, (as_of, league, season)) or []
+    if not matches:
+        return None
+    titles = {}
+    for m in matches:
+        titles.setdefault(m["h"], m["team_h"])
+        titles.setdefault(m["a"], m["team_a"])
+    team_ids = list(titles)
+    position = {team_id: i for i, team_id in enumerate(team_ids)}
+
+    results = [m for m in matches if m["played"]]
+    fixtures = [m for m in matches if not m["played"]]
+    home_goals = np.array([m["h_goals"] for m in results], dtype=np.int32)
+    away_goals = np.array([m["a_goals"] for m in results], dtype=np.int32)
+    played_home = np.array([position[m["h"]] for m in results], dtype=np.intp)
+    played_away = np.array([position[m["a"]] for m in results], dtype=np.intp)
+    points = np.zeros(len(team_ids), dtype=np.int32)
+    np.add.at(points, played_home, np.where(home_goals > away_goals, 3, home_goals == away_goals))
+    np.add.at(points, played_away, np.where(away_goals > home_goals, 3, home_goals == away_goals))
+    played = (np.bincount(played_home, minlength=len(team_ids))
+              + np.bincount(played_away, minlength=len(team_ids))).astype(np.int32)
+
+    forecasts = np.array([[f["forecast_w"], f["forecast_d"], f["forecast_l"]] for f in fixtures],
+                         dtype=np.float64).reshape(len(fixtures), 3)
+    return {
+        "league": league, "season": season, "as_of": None if as_of == "9999-12-31" else as_of,
+        "team_ids": team_ids, "titles": [titles[t] for t in team_ids],
+        "points": points, "played": played, "played_fixtures": len(results),
+        "home": np.array([position[f["h"]] for f in fixtures], dtype=np.intp),
+        "away": np.array([position[f["a"]] for f in fixtures], dtype=np.intp),
+        "forecasts": forecasts,
+    }
+
+
+def _normalize(forecasts):
+    """Fill fixtures without a forecast with the league average and make rows sum to 1."""
+    if not len(forecasts):
+        return forecasts
+    missing = np.isnan(forecasts).any(axis=1)
+    if missing.all():
+        forecasts = np.full_like(forecasts, 1 / 3)
+    elif missing.any():
+        forecasts = forecasts.copy()
+        forecasts[missing] = forecasts[~missing].mean(axis=0)
+    return forecasts / forecasts.sum(axis=1, keepdims=True)
+
+
+def simulate(league, simulations=DEFAULT_SIMULATIONS, seed=None):
+    """Play the remaining fixtures `simulations` times and summarize the final tables.
+
+    Every chunk draws one uniform per (simulation, fixture), turns it into
+    3/1/0 home points with the forecast thresholds, and adds the points to the
+    teams through a (fixtures x teams) incidence matrix, so a whole chunk of
+    seasons is one matrix product. Ties on points are broken at random since
+    goal difference isn't simulated.
+    """
+    rng = np.random.default_rng(seed)
+    n_teams = len(league["team_ids"])
+    home, away = league["home"], league["away"]
+    forecasts = _normalize(league["forecasts"])
+    win_below = forecasts[:, 0]
+    draw_below = forecasts[:, 0] + forecasts[:, 1]
+
+    home_of = np.zeros((len(home), n_teams), dtype=np.float32)
+    home_of[np.arange(len(home)), home] = 1
+    away_of = np.zeros((len(away), n_teams), dtype=np.float32)
+    away_of[np.arange(len(away)), away] = 1
+
+    total_points = np.zeros(n_teams, dtype=np.float64)
+    rank_counts = np.zeros((n_teams, n_teams), dtype=np.int64)
+    done = 0
+    while done < simulations:
+        n = min(CHUNK, simulations - done)
+        draws = rng.random((n, len(home)), dtype=np.float32)
+        home_win = draws < win_below
+        draw = ~home_win & (draws < draw_below)
+        home_points = 3 * home_win + draw
+        away_points = 3 * (~home_win & ~draw) + draw
+        points = (league["points"] + home_points.astype(np.float32) @ home_of
+                  + away_points.astype(np.float32) @ away_of)
+
+        order = np.argsort(-(points + rng.random(points.shape, dtype=np.float32) * 0.5), axis=1)
+        ranks = np.empty_like(order)
+        ranks[np.arange(n)[:, None], order] = np.arange(n_teams)
+        rank_counts += np.bincount((np.arange(n_teams) * n_teams + ranks).ravel(),
+                                   minlength=n_teams * n_teams).reshape(n_teams, n_teams)
+        total_points += points.sum(axis=0)
+        done += n
+
+    probabilities = rank_counts / simulations
+    relegated = max(n_teams - RELEGATED, 0)
+    table = [{
+        "team_id": league["team_ids"][i], "team": league["titles"][i],
+        "points": int(league["points"][i]), "played": int(league["played"][i]),
+        "expected_points": round(total_points[i] / simulations, 2),
+        "title": round(float(probabilities[i, 0]), 4),
+        "top4": round(float(probabilities[i, :TOP].sum()), 4),
+        "relegation": round(float(probabilities[i, relegated:].sum()), 4),
+        "positions": [round(float(p), 4) for p in probabilities[i]],
+    } for i in range(n_teams)]
+    table.sort(key=lambda row: -row["expected_points"])
+    return {"league": league["league"], "season": league["season"], "as_of": league["as_of"],
+            "simulations": simulations, "played_fixtures": league["played_fixtures"],
+            "remaining_fixtures": int(len(home)), "coverage": COVERAGE_NOTE, "table": table}
+
+
+def simulate_leagues(leagues, simulations=DEFAULT_SIMULATIONS, workers=None, seed=None):
+    """Simulate several league-years, one process per league (they don't share anything)."""
+    if len(leagues) == 1:
+        return [simulate(leagues[0], simulations, seed)]
+    with ProcessPoolExecutor(max_workers=workers or min(len(leagues), os.cpu_count() or 1)) as pool:
+        return list(pool.map(simulate, leagues, [simulations] * len(leagues),
+                             [None if seed is None else seed + i for i in range(len(leagues))]))
+
+
+class SeasonSimulator:
+    """Cached projections for /api/simulate, dropped when a match or its result changes."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def project(self, league, season, as_of=None, simulations=DEFAULT_SIMULATIONS):
+        key = ("simulate", league.lower(), season, as_of, simulations)
+        hit, result = self.db.cache.get(key)
+        if hit:
+            return result
+        data = load_league(self.db, league, season, as_of)
+        result = simulate(data, simulations) if data else None
+        self.db.cache.put(key, result, SIMULATION_TABLES)
+        return result
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from utils import DatabaseConnector
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Monte Carlo projection of final league tables")
+    parser.add_argument("--season", type=int, required=True)
+    parser.add_argument("--league", action="append",
+                        help="league name as in match_info.league, repeatable (default: every league of the season)")
+    parser.add_argument("--as-of", help="simulate every match after this date (YYYY-MM-DD)")
+    parser.add_argument("--sims", type=int, default=DEFAULT_SIMULATIONS)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    db = DatabaseConnector()
+    names = args.league or [row["league"] for row in db.execute_query(
+        "SELECT DISTINCT league FROM match_info WHERE season = %s", (args.season,)) or []]
+    leagues = [data for data in (load_league(db, name, args.season, args.as_of) for name in names) if data]
+    if not leagues:
+        sys.exit(f"No matches for season {args.season}")
+
+    started = time.monotonic()
+    for result in simulate_leagues(leagues, args.sims, args.workers, args.seed):
+        print(f"\n{result['league']} {result['season']}  ({result['remaining_fixtures']} fixtures left, "
+              f"{result['simulations']} simulations)")
+        print(f"{'Team':<28}{'Pts':>5}{'xPts':>8}{'Title':>8}{'Top4':>8}{'Releg':>8}")
+        for row in result["table"]:
+            print(f"{row['team']:<28}{row['points']:>5}{row['expected_points']:>8.1f}"
+                  f"{row['title']:>8.1%}{row['top4']:>8.1%}{row['relegation']:>8.1%}")
+    print(f"\nSimulated in {time.monotonic() - started:.2f}s")
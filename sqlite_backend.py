@@ -0,0 +1,256 @@
+import os
+import re
+import csv
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: # Windows, where prefork servers don't run anyway
+    fcntl = None
+from kickstarter import TABLES, CSV_DIR, CSV_MAP_ORDERED, SHOT_CUBE, SHOT_CUBE_SELECT, table_columns, foreign_keys
+from importer import coerce_value
+from utils import QueryCache, CircuitBreaker, QueryTimeoutError, _query_observers, _time_left
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', './betrivals.sqlite3')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(512 * 1024 * 1024)))
+
+# the filters the read routes use, on top of an index per foreign key column
+SQLITE_INDEXES = {
+    "shot_data": [("player_id", "season"), ("season", "date"), ("player",)],
+    "match_info": [("season", "date"), ("league", "season")],
+    "player": [("player_id", "year"), ("player_name",)],
+    "season": [("year", "team_id")],
+}
+
+# DATETIME/BOOLEAN columns come back as the same Python types mysql.connector returns
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("BOOLEAN", lambda value: bool(int(value)))
+
+
+class ReadOnlyBackendError(Exception):
+    """Writes aren't possible on the embedded SQLite backend."""
+
+
+def sqlite_ddl(ddl):
+    """kickstarter DDL as SQLite accepts it: same columns and keys, no MySQL table options."""
+    return re.sub(r"\)\s*ENGINE=[^;]*;", ");", ddl)
+
+
+def _rows(path, types):
+    """CSV rows coerced to the column types, with the header cleanup insert_from_csv does."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = [c.replace(".", "_").strip() for c in next(reader)]
+        keep = [i for i, c in enumerate(header)
+                if c in types and not c.lower().startswith("unnamed")]
+        columns = [header[i] for i in keep]
+        yield columns
+        for raw in reader:
+            if not raw:
+                continue
+            row = []
+            for i, column in zip(keep, columns):
+                try:
+                    value = coerce_value(raw[i] if i < len(raw) else None, types[column])
+                except ValueError:
+                    value = None # same row MySQL would reject, keep the rest of it
+                if isinstance(value, datetime):
+                    value = value.isoformat(sep=" ")
+                row.append(value)
+            yield row
+
+
+def _fresh(path, sources):
+    return os.path.exists(path) and all(os.path.getmtime(path) > os.path.getmtime(s) for s in sources)
+
+
+@contextmanager
+def _build_lock(path):
+    """Exclusive lock on path.lock, so workers starting together build the file once."""
+    with open(f"{path}.lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def build_sqlite(path=SQLITE_PATH, csv_dir=CSV_DIR, force=False):
+    """Build the SQLite file from the CSVs unless it is newer than all of them.
+
+    Written to a temporary file of this process and renamed into place, so
+    readers never see a half-built database. Builds are serialized with a
+    lock file: a worker that waited for another one's build finds the file
+    fresh and only opens it. Run `python sqlite_backend.py` before starting
+    the server to keep the build out of worker startup altogether.
+    """
+    sources = [csv_dir / filename for _, filename in CSV_MAP_ORDERED if (csv_dir / filename).exists()]
+    if not force and _fresh(path, sources):
+        return False
+
+    with _build_lock(path):
+        if not force and _fresh(path, sources):
+            return False # built by another process while this one waited for the lock
+        started = time.monotonic()
+        fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".building",
+                                   dir=os.path.dirname(os.path.abspath(path)))
+        os.close(fd)
+        try:
+            _build_into(tmp, csv_dir)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    logger.info("Built %s in %.1fs", path, time.monotonic() - started)
+    return True
+
+
+def _build_into(tmp, csv_dir):
+    conn = sqlite3.connect(tmp)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for ddl in TABLES.values():
+        conn.execute(sqlite_ddl(ddl))
+
+    for table, filename in CSV_MAP_ORDERED:
+        source = csv_dir / filename
+        if not source.exists():
+            logger.warning("Missing file %s, %s stays empty", source, table)
+            continue
+        rows = _rows(source, dict(table_columns(table)))
+        columns = next(rows)
+        sql = (f"INSERT OR IGNORE INTO {table} ({','.join(f'`{c}`' for c in columns)}) "
+               f"VALUES ({','.join(['?'] * len(columns))})")
+        with conn:
+            conn.executemany(sql, rows)
+        logger.info("Loaded %s from %s", table, filename)
+
+    for table in TABLES:
+        indexes = [(column,) for column, _, _ in foreign_keys(table)] + SQLITE_INDEXES.get(table, [])
+        for columns in indexes:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(columns)} "
+                         f"ON {table} ({', '.join(columns)})")
+    conn.execute(sqlite_ddl(SHOT_CUBE))
+    conn.execute(f"INSERT INTO shot_cube {SHOT_CUBE_SELECT}")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _translate(query):
+    # mysql.connector placeholders and escaped percent signs
+    return query.replace("%s", "?").replace("%%", "%")
+
+
+class SQLiteConnector:
+    """Read-only stand-in for DatabaseConnector on top of the SQLite build.
+
+    Each thread gets its own connection, opened read-only with memory-mapped
+    I/O, so the read routes run in process with no server to talk to. Query
+    deadlines are enforced with a progress handler instead of MAX_EXECUTION_TIME.
+    Select it with DB_BACKEND=sqlite.
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        build_sqlite(path)
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self.cache = QueryCache()
+        self.breaker = CircuitBreaker() # never trips, kept so metrics look the same
+        self.flight_stats = {'executed': 0, 'coalesced': 0}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            conn.execute("PRAGMA query_only = ON")
+            conn.row_factory = lambda cursor, row: {d[0]: v for d, v in zip(cursor.description, row)}
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _deadline(self, conn, timeout):
+        left = _time_left(timeout)
+        if left <= 0:
+            raise QueryTimeoutError("Deadline already passed before the query started")
+        stop_at = time.monotonic() + left
+        conn.set_progress_handler(lambda: time.monotonic() > stop_at, 10000)
+        try:
+            yield
+        except sqlite3.OperationalError as err:
+            if "interrupted" in str(err):
+                raise QueryTimeoutError(f"Query did not finish within {left:.3f}s") from err
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def load(self):
+        return {'pool_size': 0, 'in_use': 0, 'waiting': 0}
+
+    def execute_query(self, query, params=None, fetch_all=True, timeout=None):
+        if not fetch_all or not query.lstrip().upper().startswith(("SELECT", "EXPLAIN", "WITH")):
+            raise ReadOnlyBackendError("The SQLite backend is read-only")
+        started = time.perf_counter()
+        conn = self._connection()
+        try:
+            with self._deadline(conn, timeout):
+                return conn.execute(_translate(query), params or ()).fetchall()
+        finally:
+            for callback in _query_observers:
+                callback(query, params, time.perf_counter() - started)
+
+    def stream_query(self, query, params=None, batch_size=1000):
+        """Same contract as DatabaseConnector.stream_query: column names, then lists of tuples."""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, detect_types=sqlite3.PARSE_DECLTYPES)
+        try:
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            started = time.perf_counter()
+            cursor = conn.execute(_translate(query), params or ())
+            for callback in _query_observers:
+                callback(query, params, time.perf_counter() - started)
+            yield [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        raise ReadOnlyBackendError("The SQLite backend is read-only")
+        yield
+
+    def cached_query(self, query, params=None, tables=(), ttl=None):
+        key = (query, tuple(params) if params else None)
+        hit, results = self.cache.get(key)
+        if not hit:
+            results = self.execute_query(query, params)
+            self.cache.put(key, results, tables, ttl)
+        return results
+
+    def invalidate(self, *tables):
+        return self.cache.invalidate(*tables)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the read-only SQLite database from csv_files/")
+    parser.add_argument("--path", default=SQLITE_PATH)
+    parser.add_argument("--force", action="store_true", help="rebuild even if the file is up to date")
+    args = parser.parse_args()
+    if not build_sqlite(args.path, force=args.force):
+        print(f"{args.path} is newer than every CSV, use --force to rebuild")
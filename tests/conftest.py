@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# no background job runner or profiler while importing the app under test
+os.environ.setdefault("JOBS", "0")
+os.environ.setdefault("PROFILE", "0")
@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("aiomysql")
+
+
+def test_async_app_serves_a_subset_of_the_flask_read_routes():
+    import app as webapp
+    import async_app
+
+    flask_routes = {(rule.rule, method) for rule in webapp.app.url_map.iter_rules() for method in rule.methods}
+    async_routes = {(rule.rule, method) for rule in async_app.app.url_map.iter_rules() for method in rule.methods
+                    if rule.endpoint != "static" and method not in ("HEAD", "OPTIONS")}
+    assert async_routes - flask_routes == set()
@@ -0,0 +1,111 @@
+import time
+import threading
+from contextlib import contextmanager
+
+import mysql.connector
+import pytest
+
+from cube import ShotCube, ShotCubeIndex, CubeQueryError, CubeUnavailableError, DIMENSIONS
+
+
+def cell(team, season, result, shots, goals, xg, situation="OpenPlay", shot_type="RightFoot"):
+    return {"team": team, "season": season, "situation": situation, "shotType": shot_type,
+            "result": result, "shots": shots, "goals": goals, "xg": xg}
+
+
+CELLS = [
+    cell("Sevilla", 2020, "Goal", 3, 3, 1.5),
+    cell("Sevilla", 2020, "SavedShot", 5, 0, 0.5),
+    cell("Sevilla", 2021, "Goal", 1, 1, 0.25, shot_type="Head"),
+    cell("Valencia", 2020, "MissedShots", 4, 0, 0.2),
+    cell("Valencia", 2021, "Goal", 2, 2, 0.8),
+]
+
+
+def test_dimensions_match_the_cells():
+    assert set(DIMENSIONS) == {"team", "season", "situation", "shotType", "result"}
+
+
+def test_grand_total():
+    assert ShotCubeIndex(CELLS).query() == [{"shots": 15, "goals": 6, "xg": 3.25, "xg_per_shot": 0.2167}]
+
+
+def test_roll_up_by_one_dimension_sorted_by_shots():
+    rows = ShotCubeIndex(CELLS).query(by=["team"])
+    assert rows == [
+        {"team": "Sevilla", "shots": 9, "goals": 4, "xg": 2.25, "xg_per_shot": 0.25},
+        {"team": "Valencia", "shots": 6, "goals": 2, "xg": 1.0, "xg_per_shot": 0.1667},
+    ]
+
+
+def test_roll_up_by_two_dimensions_with_filters():
+    rows = ShotCubeIndex(CELLS).query(by=["team", "season"], filters={"result": ["Goal"]})
+    assert {(r["team"], r["season"]): (r["shots"], r["goals"]) for r in rows} == {
+        ("Sevilla", 2020): (3, 3), ("Sevilla", 2021): (1, 1), ("Valencia", 2021): (2, 2),
+    }
+    assert all(isinstance(r["season"], int) for r in rows)
+
+
+def test_filter_values_are_compared_as_text_and_may_match_nothing():
+    index = ShotCubeIndex(CELLS)
+    assert index.query(filters={"season": ["2021"], "shotType": ["Head"]})[0]["shots"] == 1
+    assert index.query(filters={"team": ["Betis"]}) == [{"shots": 0, "goals": 0, "xg": 0.0, "xg_per_shot": None}]
+
+
+def test_unknown_dimension_is_rejected():
+    with pytest.raises(CubeQueryError, match="player"):
+        ShotCubeIndex(CELLS).query(by=["player"])
+
+
+class CubeDB:
+    """Just enough of the connector for ShotCube: shot_cube may be missing, upserts may fail."""
+
+    def __init__(self, cells=None, upsert_error=None):
+        self.cells = cells
+        self.upsert_error = upsert_error
+        self.rebuilt = threading.Event()
+
+    def execute_query(self, sql, params=None, fetch_all=True):
+        if sql == "SELECT * FROM shot_cube":
+            if self.cells is None:
+                raise mysql.connector.ProgrammingError(msg="Table 'shot_cube' doesn't exist")
+            return self.cells
+        return []
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+    def execute(self, sql, params=None):
+        if sql.startswith("INSERT INTO shot_cube"):
+            self.cells = CELLS
+            self.rebuilt.set()
+
+    def executemany(self, sql, rows):
+        if self.upsert_error:
+            raise self.upsert_error
+
+
+@pytest.fixture
+def listeners(monkeypatch):
+    import utils
+    monkeypatch.setattr(utils, "_invalidation_listeners", [])
+
+
+def test_missing_cube_table_answers_unavailable_and_builds_it_in_the_background(listeners):
+    db = CubeDB()
+    cube = ShotCube(db)
+    with pytest.raises(CubeUnavailableError):
+        cube.query()
+    assert db.rebuilt.wait(5)
+    deadline = time.monotonic() + 5
+    while cube._index is None and time.monotonic() < deadline: # rebuild() reloads it when done
+        time.sleep(0.001)
+    assert cube.query()[0]["shots"] == 15
+
+
+def test_failed_upsert_after_an_import_rebuilds_instead_of_raising(listeners):
+    db = CubeDB(cells=[], upsert_error=mysql.connector.OperationalError(msg="gone away"))
+    cube = ShotCube(db)
+    cube.add_rows("shot_data", [{"h_a": "h", "h_team": "Sevilla", "season": 2020, "result": "Goal", "xG": 0.4}])
+    assert db.rebuilt.wait(5)
@@ -0,0 +1,221 @@
+import pandas as pd
+import pytest
+
+import kickstarter
+from kickstarter import check_references
+
+
+class FakeCursor:
+    """Answers the SELECT <key> FROM <table> of _parent_keys from a dict of table -> keys."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.queries = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+        table = sql.rsplit(" ", 1)[-1]
+        self._rows = [(key,) for key in self.keys.get(table, [])]
+
+    def fetchall(self):
+        return self._rows
+
+
+@pytest.fixture(autouse=True)
+def fresh_loaded_keys(monkeypatch):
+    monkeypatch.setattr(kickstarter, "_loaded_keys", {})
+
+
+def shots(**columns):
+    base = {"shot_id": [1, 2, 3], "match_id": [10, 11, 12]}
+    base.update(columns)
+    return pd.DataFrame(base).astype({"shot_id": "Int64", "match_id": "Int64"})
+
+
+def test_check_references_passes_clean_rows_through():
+    good, bad = check_references(FakeCursor({"match_info": [10, 11, 12]}), "shot_data", shots())
+    assert list(good["shot_id"]) == [1, 2, 3]
+    assert bad.empty
+
+
+def test_check_references_quarantines_orphans_and_key_problems():
+    df = pd.DataFrame({"shot_id": [1, 1, None, 4, 5], "match_id": [10, 10, 10, 99, None]}).astype("Int64")
+    cur = FakeCursor({"match_info": [10], "shot_data": [5]})
+    good, bad = check_references(cur, "shot_data", df)
+
+    assert list(good.index) == [0]
+    reasons = dict(zip(bad.index, bad["_reason"]))
+    assert reasons == {
+        1: "duplicate shot_id",
+        2: "shot_id is empty",
+        3: "match_id not in match_info.match_id",
+        4: "shot_id already in shot_data",
+    }
+
+
+def test_check_references_uses_keys_of_earlier_chunks():
+    cur = FakeCursor({"match_info": [10, 11, 12]})
+    good, bad = check_references(cur, "shot_data", shots(), loaded=pd.Index([2]))
+    assert list(good["shot_id"]) == [1, 3]
+    assert list(bad["_reason"]) == ["duplicate shot_id"]
+
+
+def test_check_references_prefers_keys_loaded_in_this_run():
+    kickstarter._loaded_keys[("match_info", "match_id")] = pd.Index([10, 11])
+    cur = FakeCursor({"match_info": [10, 11, 12]})
+    good, bad = check_references(cur, "shot_data", shots())
+    assert list(bad["shot_id"]) == [3]
+    # match_info came from the cache, only shot_data's own keys were read
+    assert cur.queries == ["SELECT `shot_id` FROM shot_data"]
+
+
+def test_dtype_plan_follows_the_ddl():
+    dtypes, dates = kickstarter.dtype_plan("shot_data")
+    assert dates == ["date"]
+    assert dtypes["shot_id"] == "Int64"
+    assert dtypes["minute"] == "Int32"
+    assert dtypes["xG"] == "float64"
+    assert dtypes["result"] == "category"
+    assert dtypes["h_team"] == "category" # wide VARCHAR, but only team names
+    assert dtypes["player"] == "str"
+    assert kickstarter.dtype_plan("match_data")[0]["isResult"] == "boolean"
+
+
+def test_to_rows_turns_every_missing_value_into_none():
+    df = pd.DataFrame({
+        "id": pd.array([1, None], dtype="Int64"),
+        "xg": [0.5, float("nan")],
+        "team": pd.Series(["Sevilla", None], dtype="category"),
+        "date": pd.to_datetime(["2020-01-01 20:00:00", None]),
+    })
+    rows = kickstarter._to_rows(df)
+    assert rows[1] == (None, None, None, None)
+    assert rows[0][:3] == (1, 0.5, "Sevilla")
+    assert rows[0][3].isoformat() == "2020-01-01T20:00:00"
+
+
+def test_coerce_types_quarantines_only_rows_with_bad_values():
+    dtypes, dates = kickstarter.dtype_plan("match_data")
+    df = pd.DataFrame({
+        "match_id": ["1", "2", "x", "4.5", None],
+        "isResult": ["True", "maybe", "false", "1", None],
+        "xG_h": ["0.1", "0.2", "0.3", "0.4", "high"],
+        "datetime": ["2020-01-01 20:00:00", None, "2020-01-02", "2020-01-03", "soon"],
+    }, dtype="str")
+    good, bad = kickstarter.coerce_types(df, dtypes, dates)
+
+    assert list(good.index) == [0]
+    assert str(good["match_id"].dtype) == "Int64"
+    assert str(good["isResult"].dtype) == "boolean"
+    assert good["xG_h"].dtype == "float64"
+    assert good["datetime"].dtype.kind == "M"
+    assert dict(zip(bad.index, bad["_reason"])) == {
+        1: "isResult is not a valid boolean",
+        2: "match_id is not a valid Int64",
+        3: "match_id is not a valid Int64",
+        4: "xG_h is not a valid float64; datetime is not a valid datetime",
+    }
+    assert bad.loc[2, "match_id"] == "x" # quarantined with the original text
+
+
+class LoadCursor(FakeCursor):
+    def __init__(self, keys, inserted):
+        super().__init__(keys)
+        self.inserted = inserted
+
+    def executemany(self, sql, rows):
+        self.inserted.extend(rows)
+
+    def close(self):
+        pass
+
+
+class LoadConnection:
+    def __init__(self, keys):
+        self.keys = keys
+        self.inserted = []
+        self.committed = False
+
+    def cursor(self):
+        return LoadCursor(self.keys, self.inserted)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.inserted.clear()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def csv_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(kickstarter, "CSV_DIR", tmp_path)
+    monkeypatch.setattr(kickstarter, "QUARANTINE_DIR", tmp_path / "quarantine")
+    return tmp_path
+
+
+def load(monkeypatch, keys, **kwargs):
+    conn = LoadConnection(keys)
+    monkeypatch.setattr(kickstarter, "connect_db", lambda include_db=False: conn)
+    return conn, kickstarter.insert_from_csv("shot_data", "shots.csv", **kwargs)
+
+
+def write_shots(csv_dir, count, bad_minute_at=None):
+    lines = ["shot_id,minute,xG,match_id,date,Unnamed: 0"]
+    for i in range(1, count + 1):
+        minute = "ten" if i == bad_minute_at else str(i % 90)
+        lines.append(f"{i},{minute},0.1,10,2020-01-01 20:00:00,{i}")
+    (csv_dir / "shots.csv").write_text("\n".join(lines) + "\n")
+
+
+def test_insert_from_csv_quarantines_a_bad_value_and_loads_the_rest(csv_dir, monkeypatch):
+    write_shots(csv_dir, 50, bad_minute_at=7)
+    conn, report = load(monkeypatch, {"match_info": [10]}, chunk_rows=20)
+
+    assert report["status"] == "ok" and conn.committed
+    assert (report["rows"], report["quarantined"], report["chunks"]) == (49, 1, 3)
+    assert len(conn.inserted) == 49 and 7 not in {row[0] for row in conn.inserted}
+    quarantined = pd.read_csv(csv_dir / "quarantine" / "shot_data_quarantine.csv")
+    assert list(quarantined["minute"]) == ["ten"]
+    assert list(quarantined["_reason"]) == ["minute is not a valid Int32"]
+
+
+def test_insert_from_csv_halves_chunks_to_stay_in_the_rss_budget(csv_dir, monkeypatch):
+    write_shots(csv_dir, 8000)
+    mib = 2**20
+    held = iter([0, 0, 2 * mib, 2 * mib] + [0] * 1000) # the 1000-row probe chunk adds 2 MiB
+    monkeypatch.setattr(kickstarter, "MIN_CHUNK_ROWS", 1000)
+    monkeypatch.setattr(kickstarter, "rss_bytes", lambda: 100 * mib + next(held))
+    conn, report = load(monkeypatch, {"match_info": [10]}, chunk_rows=4000, rss_budget_mb=5)
+
+    assert report["status"] == "ok"
+    assert report["rows"] == 8000
+    # 1000 to probe, 2000 as 4000 rows would need 8 MiB, then 4000 once they cost nothing, the rest
+    assert report["chunks"] == 4
+    assert report["growth"] == 2 * mib
+
+
+def test_insert_from_csv_rolls_back_a_chunk_that_grows_past_the_budget(csv_dir, monkeypatch):
+    write_shots(csv_dir, 8000)
+    mib = 2**20
+    held = iter([0, 0, 8 * mib, 8 * mib] + [0] * 1000) # the first chunk adds 8 MiB
+    monkeypatch.setattr(kickstarter, "MIN_CHUNK_ROWS", 1000)
+    monkeypatch.setattr(kickstarter, "rss_bytes", lambda: 100 * mib + next(held))
+    conn, report = load(monkeypatch, {"match_info": [10]}, chunk_rows=4000, rss_budget_mb=5)
+
+    assert report["status"] == "rolled back"
+    assert not conn.committed and conn.inserted == []
+    assert report["growth"] == 8 * mib
+
+
+def test_insert_from_csv_rolls_back_when_even_small_chunks_dont_fit(csv_dir, monkeypatch):
+    write_shots(csv_dir, 3000)
+    monkeypatch.setattr(kickstarter, "MIN_CHUNK_ROWS", 1000)
+    monkeypatch.setattr(kickstarter, "rss_bytes", iter(range(0, 2**40, 2**20)).__next__)
+    conn, report = load(monkeypatch, {"match_info": [10]}, chunk_rows=1000, rss_budget_mb=1)
+
+    assert report["status"] == "rolled back"
+    assert not conn.committed and conn.inserted == []
@@ -0,0 +1,89 @@
+import pytest
+
+from percentiles import PercentileTable, PERCENTILE_STATS, position_group
+
+
+def season(player_id, goals, minutes=900, year=2020, position="F S"):
+    row = {stat: 0 for stat in PERCENTILE_STATS}
+    row.update(player_id=player_id, year=year, position=position, time=minutes, goals=goals)
+    return row
+
+
+@pytest.mark.parametrize("position,group", [
+    ("F S", "Forward"), ("D M S", "Midfielder"), ("GK", "Goalkeeper"), ("D", "Defender"),
+    ("S", "Substitute"), (None, "Substitute"),
+])
+def test_position_group_takes_the_most_attacking_role(position, group):
+    assert position_group(position) == group
+
+
+def test_per90_and_midrank_percentiles_within_the_peer_group():
+    # 900 minutes = 10 full games, so per-90 goals are goals / 10
+    table = PercentileTable([season(1, 10), season(2, 20), season(3, 20), season(4, 40)])
+    goals = {pid: table.lookup(pid)["stats"]["goals"] for pid in (1, 2, 3, 4)}
+
+    assert [goals[pid]["per90"] for pid in (1, 2, 3, 4)] == [1.0, 2.0, 2.0, 4.0]
+    # (players below + half of the ties, itself included) / pool size
+    assert [goals[pid]["percentile"] for pid in (1, 2, 3, 4)] == [12.5, 50.0, 50.0, 87.5]
+    assert table.lookup(1)["peers"] == 4
+
+
+def test_players_under_min_minutes_are_ranked_but_not_in_the_pool():
+    table = PercentileTable([season(1, 10), season(2, 30), season(3, 5, minutes=90)])
+    rookie = table.lookup(3)
+    assert rookie["qualified"] is False and rookie["peers"] == 2
+    assert rookie["stats"]["goals"]["per90"] == 5.0
+    assert rookie["stats"]["goals"]["percentile"] == 100.0
+    assert table.lookup(1)["stats"]["goals"]["percentile"] == 25.0
+
+
+def test_groups_are_separate_per_year_and_position():
+    table = PercentileTable([season(1, 10), season(2, 20, position="D"),
+                             season(3, 30, year=2021), season(1, 40, year=2021)])
+    assert table.lookup(2)["peers"] == 1 and table.lookup(2)["position_group"] == "Defender"
+    assert table.lookup(1, 2020)["stats"]["goals"]["percentile"] == 50.0
+    assert table.lookup(1)["year"] == 2021 # latest season by default
+    assert table.lookup(1)["stats"]["goals"]["percentile"] == 75.0
+
+
+def test_group_without_qualified_players_has_no_percentiles():
+    table = PercentileTable([season(1, 1, minutes=100)])
+    assert table.lookup(1)["peers"] == 0
+    assert table.lookup(1)["stats"]["goals"]["percentile"] is None
+
+
+def test_empty_table():
+    table = PercentileTable([])
+    assert table.seasons == {} and table.lookup(1) is None
+
+
+class CountingDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute_query(self, sql, params=None):
+        self.queries += 1
+        return self.rows
+
+
+def test_player_percentiles_rebuild_only_when_player_changes(monkeypatch):
+    import utils
+    from percentiles import PlayerPercentiles
+    monkeypatch.setattr(utils, "_invalidation_listeners", [])
+    db = CountingDB([season(1, 10)])
+    percentiles = PlayerPercentiles(db)
+
+    percentiles.refresh() # warmup
+    for _ in range(3):
+        assert percentiles.lookup(1)["stats"]["goals"]["per90"] == 1.0
+    assert db.queries == 1
+
+    utils.QueryCache().invalidate("shot_data")
+    percentiles.lookup(1)
+    assert db.queries == 1
+
+    db.rows = [season(1, 20)]
+    utils.QueryCache().invalidate("player")
+    assert percentiles.lookup(1)["stats"]["goals"]["per90"] == 2.0
+    assert db.queries == 2
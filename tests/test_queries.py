@@ -0,0 +1,96 @@
+import pytest
+
+import queries
+from queries import MAX_PAGE_SIZE, FUT23_FIELDS, PLAYER_SEARCH_FIELDS, select_list, order_by, page
+
+
+def test_select_list_defaults_to_every_allowed_field():
+    allowed = {"player_id": "p.player_id", "Rating": "`Rating`"}
+    assert select_list({}, allowed) == "p.player_id AS `player_id`, `Rating`"
+
+
+def test_select_list_keeps_requested_order_and_aliases():
+    sql = select_list({"fields": " fifa_rating, player_name "}, PLAYER_SEARCH_FIELDS)
+    assert sql == "f.Rating AS `fifa_rating`, p.player_name AS `player_name`"
+
+
+def test_select_list_rejects_unknown_fields():
+    with pytest.raises(ValueError, match="password"):
+        select_list({"fields": "Name,password"}, FUT23_FIELDS)
+
+
+def test_order_by_directions_and_default():
+    assert order_by({"sort": "-Rating,Name"}, FUT23_FIELDS, "`player_id` ASC") == \
+        " ORDER BY `Rating` DESC, `Name` ASC"
+    assert order_by({}, FUT23_FIELDS, "`player_id` ASC") == " ORDER BY `player_id` ASC"
+
+
+def test_order_by_rejects_unknown_sort():
+    with pytest.raises(ValueError, match="Cannot sort by 'nope'"):
+        order_by({"sort": "-nope"}, FUT23_FIELDS, "`player_id` ASC")
+
+
+def test_order_by_appends_unique_tiebreakers_once():
+    sql = order_by({"sort": "-goals"}, PLAYER_SEARCH_FIELDS, "p.player_name",
+                   unique=("p.player_id", "p.season_player_id"))
+    assert sql == " ORDER BY p.goals DESC, p.player_id ASC, p.season_player_id ASC"
+    sql = order_by({"sort": "-player_id"}, PLAYER_SEARCH_FIELDS, "p.player_name",
+                   unique=("p.player_id", "p.season_player_id"))
+    assert sql == " ORDER BY p.player_id DESC, p.season_player_id ASC"
+
+
+def test_page_without_paging_arguments_has_no_limit():
+    assert page({}) == (None, None, "")
+
+
+def test_page_offsets_and_clamps():
+    assert page({"page": "3", "page_size": "20"}) == (3, 20, " LIMIT 20 OFFSET 40")
+    assert page({"page": "0", "page_size": "100000"}) == (1, MAX_PAGE_SIZE, f" LIMIT {MAX_PAGE_SIZE} OFFSET 0")
+    assert page({}, default_size=50) == (1, 50, " LIMIT 50 OFFSET 0")
+
+
+def test_page_rejects_non_numbers():
+    with pytest.raises(ValueError):
+        page({"page": "two"})
+
+
+def test_player_search_query_has_no_distinct_and_a_stable_order():
+    query, params, number, size = queries.player_search_query({"fields": "player_name", "sort": "goals"}, "mess")
+    assert "DISTINCT" not in query
+    assert "ORDER BY p.goals ASC, p.player_id ASC, p.season_player_id ASC" in query
+    assert params == ["%mess%"] * 3
+    assert (number, size) == (1, 50)
+
+
+def test_fut23_query_pages_with_player_id_last():
+    query, number, size = queries.fut23_query({"fields": "Name,Rating", "sort": "-Rating", "page": "2"})
+    assert query == ("SELECT `Name`, `Rating` FROM fut23 ORDER BY `Rating` DESC, `player_id` ASC"
+                     " LIMIT 50 OFFSET 50")
+    assert (number, size) == (2, 50)
+
+
+def test_shot_search_limit_is_capped():
+    query, params = queries.shot_search_query({"limit": str(MAX_PAGE_SIZE * 10)})
+    assert params[-1] == MAX_PAGE_SIZE
+
+
+def test_compact_team_filters_use_the_team_ids():
+    resolved = {("Real", False): [1, 2], ("Barcelona", True): [7]}
+    team_ids = lambda name, exact: resolved.get((name, exact), [])
+
+    where, params = queries.shot_filters({"team": "Real"}, team_ids)
+    assert where == " AND (s.h_team_id IN (%s,%s) OR s.a_team_id IN (%s,%s))"
+    assert params == [1, 2, 1, 2]
+    assert queries.shot_filters({"team": "Nobody"}, team_ids) == (" AND FALSE", [])
+
+    sql = []
+    assert queries.match_filters({"team_home": "Barcelona", "team_away": "Nobody"}, sql, team_ids) == [7]
+    assert sql == ["AND (mi.h IN (%s))", "AND FALSE"]
+
+
+def test_team_filters_match_names_without_a_resolver():
+    where, params = queries.shot_filters({"team": "Real"})
+    assert where == " AND (s.h_team LIKE %s OR s.a_team LIKE %s)" and params == ["%Real%", "%Real%"]
+    sql = []
+    assert queries.match_filters({"team_home": "Barcelona"}, sql) == ["Barcelona"]
+    assert sql == ["AND mi.team_h = %s"]
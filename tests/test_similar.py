@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+from similar import PlayerIndex, ATTRIBUTES, parse_price
+
+
+def card(player_id, value, position="ST", league="LaLiga", price="1M", others=""):
+    row = {attribute: value for attribute in ATTRIBUTES}
+    row.update(player_id=player_id, Name=f"P{player_id}", Team="T", League=league,
+               Position=position, Other_Positions=others, Price=price)
+    return row
+
+
+@pytest.mark.parametrize("text,price", [("1.4M", 1.4e6), ("74.5K", 74500), ("700", 700), ("", None),
+                                        (None, None), ("n/a", None)])
+def test_parse_price(text, price):
+    assert parse_price(text) == price
+
+
+def test_nearest_orders_by_distance_and_skips_the_player_itself():
+    index = PlayerIndex([card(1, 50), card(2, 52), card(3, 60), card(4, 90)])
+    assert [row["player_id"] for row in index.nearest(1, k=3)] == [2, 3, 4]
+    assert [row["player_id"] for row in index.nearest(1, k=1)] == [2]
+    assert index.nearest(99) is None
+
+
+def test_distances_are_euclidean_on_z_scores():
+    index = PlayerIndex([card(1, 0), card(2, 10)])
+    # two values per attribute z-score to -1 and +1, 2 apart in every dimension
+    assert index.nearest(1)[0]["distance"] == pytest.approx(2 * math.sqrt(len(ATTRIBUTES)), abs=1e-3)
+
+
+def test_missing_attributes_count_as_average():
+    rows = [card(1, 10), card(2, 20), card(3, 30)]
+    rows[2]["Pace"] = None
+    index = PlayerIndex(rows)
+    assert index.matrix[2][ATTRIBUTES.index("Pace")] == pytest.approx(0)
+
+
+def test_filters_on_position_league_and_price():
+    index = PlayerIndex([
+        card(1, 50), card(2, 51, position="CB"), card(3, 52, position="CB", others="ST,CF"),
+        card(4, 53, league="Serie A"), card(5, 54, price="5M"), card(6, 55, price=None),
+    ])
+    assert [r["player_id"] for r in index.nearest(1, position="st")] == [3, 4, 5, 6]
+    assert [r["player_id"] for r in index.nearest(1, league="serie a")] == [4]
+    assert [r["player_id"] for r in index.nearest(1, max_price=2e6)] == [2, 3, 4]
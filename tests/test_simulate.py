@@ -0,0 +1,103 @@
+from itertools import permutations
+
+import pytest
+
+import simulate
+from simulate import SeasonSimulator, load_league, TOP, RELEGATED
+from utils import QueryCache
+
+TEAMS = {1: "Arsenal", 2: "Chelsea", 3: "Everton", 4: "Fulham", 5: "Leeds", 6: "Wolves"}
+
+
+def league_rows(played=10):
+    """Double round robin of six teams, the first `played` matches already have a result."""
+    rows = []
+    for match_id, (h, a) in enumerate(permutations(TEAMS, 2), start=1):
+        result = match_id <= played
+        rows.append({
+            "match_id": match_id, "h": h, "a": a, "team_h": TEAMS[h], "team_a": TEAMS[a],
+            "h_goals": (match_id % 3) if result else None, "a_goals": 1 if result else None,
+            # one fixture without a forecast gets the league average
+            "forecast_w": None if match_id == 20 else 0.3 + h / 20,
+            "forecast_d": None if match_id == 20 else 0.25,
+            "forecast_l": None if match_id == 20 else 0.45 - h / 20,
+            "played": int(result),
+        })
+    return rows
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.cache = QueryCache()
+        self.calls = []
+
+    def execute_query(self, query, params=None):
+        self.calls.append(params)
+        return self.rows
+
+
+def test_load_league_sums_points_of_the_played_matches():
+    league = load_league(FakeDB(league_rows()), "EPL", 2023)
+    assert league["titles"] == list(TEAMS.values())
+    assert league["played_fixtures"] == 10 and len(league["home"]) == 20
+    assert league["played"].sum() == 20
+    # a home win is worth 3, a draw 1 to both sides
+    expected = dict.fromkeys(TEAMS, 0)
+    for m in league_rows()[:10]:
+        if m["h_goals"] > m["a_goals"]:
+            expected[m["h"]] += 3
+        elif m["h_goals"] < m["a_goals"]:
+            expected[m["a"]] += 3
+        else:
+            expected[m["h"]] += 1
+            expected[m["a"]] += 1
+    assert league["points"].tolist() == [expected[t] for t in league["team_ids"]]
+
+
+def test_position_probabilities_sum_to_one():
+    result = simulate.simulate(load_league(FakeDB(league_rows()), "EPL", 2023), simulations=3000, seed=7)
+    table = result["table"]
+    assert len(table) == len(TEAMS) and result["remaining_fixtures"] == 20
+    for row in table:
+        assert sum(row["positions"]) == pytest.approx(1, abs=1e-3)
+        assert row["top4"] == pytest.approx(sum(row["positions"][:TOP]), abs=1e-3)
+        assert row["relegation"] == pytest.approx(sum(row["positions"][-RELEGATED:]), abs=1e-3)
+    # every simulated season has exactly one champion, TOP top-four places and RELEGATED relegations
+    assert sum(row["title"] for row in table) == pytest.approx(1, abs=1e-3)
+    assert sum(row["top4"] for row in table) == pytest.approx(TOP, abs=1e-3)
+    assert sum(row["relegation"] for row in table) == pytest.approx(RELEGATED, abs=1e-3)
+    for position in range(len(TEAMS)):
+        assert sum(row["positions"][position] for row in table) == pytest.approx(1, abs=1e-3)
+
+
+def test_simulation_spans_chunks_and_is_reproducible(monkeypatch):
+    monkeypatch.setattr(simulate, "CHUNK", 700)
+    league = load_league(FakeDB(league_rows()), "EPL", 2023)
+    first = simulate.simulate(league, simulations=2000, seed=3)
+    assert first == simulate.simulate(league, simulations=2000, seed=3)
+    assert sum(row["title"] for row in first["table"]) == pytest.approx(1, abs=1e-3)
+
+
+def test_finished_season_keeps_the_final_table():
+    result = simulate.simulate(load_league(FakeDB(league_rows(played=30)), "EPL", 2023), simulations=50)
+    assert result["remaining_fixtures"] == 0
+    points = [row["points"] for row in result["table"]]
+    for row in result["table"]:
+        assert row["expected_points"] == row["points"]
+        # teams level on points share their places at random, nobody else moves
+        above = sum(p > row["points"] for p in points)
+        level = points.count(row["points"])
+        assert sum(row["positions"][above:above + level]) == pytest.approx(1)
+
+
+def test_project_caches_until_the_matches_change():
+    db = FakeDB(league_rows())
+    simulator = SeasonSimulator(db)
+    first = simulator.project("EPL", 2023, "2023-12-31", simulations=200)
+    assert simulator.project("epl", 2023, "2023-12-31", simulations=200) is first
+    assert db.calls == [("2023-12-31", "EPL", 2023)]
+    db.cache.invalidate("match_data")
+    simulator.project("EPL", 2023, "2023-12-31", simulations=200)
+    assert len(db.calls) == 2
+    assert SeasonSimulator(FakeDB([])).project("EPL", 2023) is None
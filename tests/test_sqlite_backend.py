@@ -0,0 +1,169 @@
+import os
+import csv
+import multiprocessing
+
+import pytest
+
+import kickstarter
+from sqlite_backend import SQLiteConnector, ReadOnlyBackendError, build_sqlite
+
+DEFAULTS = {"BIGINT": "1", "INT": "1", "DOUBLE": "0.5", "BOOLEAN": "True", "DATETIME": "2020-09-01 20:00:00"}
+
+TEAMS = [{"team_id": 1, "team_name": "Sevilla"}, {"team_id": 2, "team_name": "Valencia"},
+         {"team_id": 3, "team_name": "Betis"}]
+
+
+def match(match_id, h, a, day, h_goals, a_goals):
+    names = {t["team_id"]: t["team_name"] for t in TEAMS}
+    return {"match_id": match_id, "h": h, "a": a, "team_h": names[h], "team_a": names[a],
+            "date": f"2020-09-{day:02d} 20:00:00", "season": 2020, "league": "La liga",
+            "h_goals": h_goals, "a_goals": a_goals, "h_w": 0.5, "h_d": 0.3, "h_l": 0.2}
+
+
+def shot(shot_id, match_id, minute, h_a, player_id, player, result, xg):
+    teams = {10: ("Sevilla", "Valencia"), 11: ("Valencia", "Betis")}[match_id]
+    return {"shot_id": shot_id, "match_id": match_id, "minute": minute, "h_a": h_a, "player_id": player_id,
+            "player": player, "result": result, "xG": xg, "season": 2020, "h_team": teams[0],
+            "a_team": teams[1], "date": "2020-09-01 20:00:00", "situation": "OpenPlay",
+            "shotType": "RightFoot", "player_assisted": ""}
+
+
+ROWS = {
+    "teams": TEAMS,
+    "match_info": [match(10, 1, 2, 1, 2, 1), match(11, 2, 3, 8, 0, 0), match(12, 3, 1, 15, "", "")],
+    "match_data": [{"match_id": 10, "isResult": "True", "forecast_w": 0.5, "forecast_d": 0.3, "forecast_l": 0.2},
+                   {"match_id": 11, "isResult": "True", "forecast_w": 0.4, "forecast_d": 0.3, "forecast_l": 0.3},
+                   {"match_id": 12, "isResult": "False", "forecast_w": 0.2, "forecast_d": 0.3, "forecast_l": 0.5}],
+    "shot_data": [shot(1, 10, 10, "h", 100, "Lionel Messi", "Goal", 0.5),
+                  shot(2, 10, 50, "h", 100, "Lionel Messi", "Goal", 0.3),
+                  shot(3, 10, 70, "a", 101, "Luis Suarez", "Goal", 0.2),
+                  shot(4, 10, 80, "a", 101, "Luis Suarez", "SavedShot", 0.1),
+                  shot(5, 11, 30, "h", 101, "Luis Suarez", "MissedShots", 0.05)],
+    "season": [{"seasonentryid": 1, "team_id": 1, "title": "Sevilla", "year": 2020}],
+    "player": [{"season_player_id": 1000, "player_id": 100, "player_name": "Lionel Messi", "year": 2020,
+                "time": 900, "goals": 2, "position": "F S", "team_title": "Sevilla", "best_shot_id": 1},
+               {"season_player_id": 1001, "player_id": 101, "player_name": "Luis Suarez", "year": 2020,
+                "time": 800, "goals": 1, "position": "F S", "team_title": "Valencia", "best_shot_id": 3}],
+    "fut23": [{"player_id": 100, "Name": "Lionel Messi", "Rating": 91, "Pace": 80, "Position": "RW",
+               "Price": "2M", "team_id": 1, "League": "LaLiga"},
+              {"player_id": 101, "Name": "Luis Suarez", "Rating": 85, "Pace": 70, "Position": "ST",
+               "Price": "1M", "team_id": 2, "League": "LaLiga"},
+              {"player_id": 102, "Name": "Someone Else", "Rating": 70, "Pace": 30, "Position": "CB",
+               "Price": "50K", "team_id": 3, "League": "LaLiga"}],
+}
+
+
+@pytest.fixture(scope="module")
+def csv_dir(tmp_path_factory):
+    csv_dir = tmp_path_factory.mktemp("csv")
+    for table, filename in kickstarter.CSV_MAP_ORDERED:
+        columns = kickstarter.table_columns(table)
+        with open(csv_dir / filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in columns])
+            for row in ROWS[table]:
+                writer.writerow([row.get(name, "x" if sql_type.startswith(("VARCHAR", "CHAR"))
+                                         else DEFAULTS[sql_type]) for name, sql_type in columns])
+    return csv_dir
+
+
+@pytest.fixture(scope="module")
+def sqlite_path(tmp_path_factory, csv_dir):
+    path = str(tmp_path_factory.mktemp("db") / "test.sqlite3")
+    assert build_sqlite(path, csv_dir=csv_dir)
+    assert not build_sqlite(path, csv_dir=csv_dir) # newer than every CSV, nothing to do
+    return path
+
+
+@pytest.fixture(scope="module")
+def client(sqlite_path):
+    import app as webapp
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("DB_BACKEND", "sqlite")
+        patch.setattr(webapp.db, "_factory", lambda: SQLiteConnector(sqlite_path))
+        webapp.db._forget()
+        patch.setitem(webapp.app.config, "RATE_LIMITS",
+                      {rule.endpoint: (1e9, 1e9) for rule in webapp.app.url_map.iter_rules()})
+        yield webapp.app.test_client()
+    webapp.db._forget()
+
+
+def test_workers_starting_together_build_once(tmp_path, csv_dir):
+    path = str(tmp_path / "shared.sqlite3")
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        built = pool.starmap(build_sqlite, [(path, csv_dir)] * 4)
+    assert sorted(built) == [False, False, False, True]
+    assert SQLiteConnector(path).execute_query("SELECT COUNT(*) AS n FROM shot_data") == [{"n": 5}]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".building")]
+
+
+def test_backend_is_read_only(sqlite_path):
+    db = SQLiteConnector(sqlite_path)
+    assert db.execute_query("SELECT COUNT(*) AS n FROM shot_data") == [{"n": 5}]
+    with pytest.raises(ReadOnlyBackendError):
+        db.execute_query("DELETE FROM shot_data", fetch_all=False)
+    with pytest.raises(ReadOnlyBackendError):
+        with db.transaction():
+            pass
+
+
+def test_stream_query_yields_columns_then_batches(sqlite_path):
+    stream = SQLiteConnector(sqlite_path).stream_query("SELECT shot_id FROM shot_data ORDER BY shot_id",
+                                                       batch_size=2)
+    assert next(stream) == ["shot_id"]
+    assert list(stream) == [[(1,), (2,)], [(3,), (4,)], [(5,)]]
+
+
+def test_player_search_with_fields_and_sort(client):
+    response = client.get("/api/players/search?q=Lu&fields=player_name,goals&sort=-goals")
+    assert response.status_code == 200
+    assert response.json["players"] == [{"player_name": "Luis Suarez", "goals": 1}]
+
+
+def test_fut23_page(client):
+    response = client.get("/api/players/fut23?fields=Name,Rating&sort=-Rating&page=2&page_size=2")
+    assert response.status_code == 200
+    assert response.json["players"] == [{"Name": "Someone Else", "Rating": 70}]
+    assert response.json["total"] == 3
+
+
+def test_player_detail_with_percentiles(client):
+    response = client.get("/api/players/100?fields=player_name,year,Rating")
+    assert response.json["player"] == {"player_name": "Lionel Messi", "year": 2020, "Rating": 91}
+    assert response.json["percentiles"]["peers"] == 2
+
+
+def test_similar_players(client):
+    response = client.get("/api/players/100/similar?k=1")
+    assert response.status_code == 200
+    assert [row["player_id"] for row in response.json["players"]] == [101]
+
+
+def test_shot_search_and_detail(client):
+    response = client.get("/api/search/shots?player=Messi")
+    assert sorted(s["shot_id"] for s in response.json["shots"]) == [1, 2]
+    response = client.get("/api/shots/3")
+    assert response.json["shot"]["player"] == "Luis Suarez"
+    assert client.get("/api/shots/999").status_code == 404
+
+
+def test_shot_cube(client):
+    response = client.get("/api/shots/cube?by=team")
+    assert {row["team"]: row["shots"] for row in response.json["rows"]} == {"Sevilla": 2, "Valencia": 3}
+
+
+def test_match_timeline(client):
+    timeline = client.get("/api/matches/10/timeline").json
+    assert timeline["minute"] == [10, 50, 70, 80]
+    assert timeline["final"] == {"home_xg": 0.8, "away_xg": 0.3, "home_goals": 2, "away_goals": 1}
+
+
+def test_matches_filter(client):
+    response = client.post("/api/matches", json={"season": 2020, "team_home": "Valencia"})
+    assert [m["match_id"] for m in response.json["matches"]] == [11]
+
+
+def test_writes_are_refused(client):
+    response = client.post("/api/add_match", json={"operations": [{"match_id": 99}]})
+    assert response.status_code >= 400 and response.json["success"] is False
+    assert client.post("/api/matches", json={"q": "99"}).json["matches"] == []
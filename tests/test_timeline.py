@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from timeline import MatchTimelines, SHOT, _accumulate, _grouped_cumsum
+
+COLUMNS = ("match_id", "shot_id", "minute", "h_a", "xG", "result", "player", "player_id",
+           "h_team", "a_team", "season", "date")
+
+
+def shot(match_id, shot_id, minute, h_a, xg, result="MissedShots", player="Saka", player_id=7):
+    return (match_id, shot_id, minute, h_a, xg, result, player, player_id,
+            "Arsenal", "Chelsea", 2023, "2023-10-21")
+
+
+class FakeDB:
+    def __init__(self, *batches):
+        self.batches = batches
+
+    def stream_query(self, query, params=None):
+        yield list(COLUMNS)
+        yield from self.batches
+
+
+def test_grouped_cumsum_restarts_at_every_group():
+    values = np.array([1, 2, 3, 4, 5, 6], dtype=np.float64)
+    assert _grouped_cumsum(values, np.array([0, 2, 3])).tolist() == [1, 3, 3, 4, 9, 15]
+    assert _grouped_cumsum(values, np.array([0])).tolist() == [1, 3, 6, 10, 15, 21]
+
+
+def test_accumulate_sorts_and_keeps_running_totals_per_match():
+    records = np.zeros(5, dtype=SHOT)
+    records["shot_id"] = [5, 4, 3, 2, 1]
+    records["minute"] = [80, 10, 30, 30, 5]
+    records["away"] = [False, True, False, False, True]
+    records["goal"] = [True, False, True, False, True]
+    records["xg"] = [0.5, 0.25, 0.5, 0.125, 0.75]
+    match_ids = np.array([1, 1, 1, 2, 2])
+
+    records, match_ids, starts = _accumulate(records, match_ids)
+    assert match_ids.tolist() == [1, 1, 1, 2, 2] and starts.tolist() == [0, 3]
+    assert records["shot_id"].tolist() == [4, 3, 5, 1, 2]
+    assert records["home_xg"].tolist() == [0, 0.5, 1.0, 0, 0.125]
+    assert records["away_xg"].tolist() == [0.25, 0.25, 0.25, 0.75, 0.75]
+    assert records["home_goals"].tolist() == [0, 1, 2, 0, 0]
+    assert records["away_goals"].tolist() == [0, 0, 0, 1, 1]
+
+
+def test_accumulate_of_no_shots():
+    records, match_ids, starts = _accumulate(np.zeros(0, dtype=SHOT), np.zeros(0, dtype=np.int64))
+    assert len(records) == len(match_ids) == len(starts) == 0
+
+
+def test_get_builds_the_timeline_from_batches():
+    timelines = MatchTimelines(FakeDB(
+        [shot(1, 11, 20, "h", 0.5, "Goal"), shot(2, 21, 3, "a", 0.25)],
+        [],
+        [shot(1, 10, 5, "a", 0.25, player="Palmer", player_id=9), shot(1, 12, 60, "h", 0.125)],
+    ))
+    timeline = timelines.get(1)
+    assert timeline["minute"] == [5, 20, 60]
+    assert timeline["home_xg"] == [0, 0.5, 0.625] and timeline["away_xg"] == [0.25, 0.25, 0.25]
+    assert timeline["home_goals"] == [0, 1, 1] and timeline["away_goals"] == [0, 0, 0]
+    assert timeline["final"] == {"home_xg": 0.625, "away_xg": 0.25, "home_goals": 1, "away_goals": 0}
+    assert timeline["shots"][0] == {"shot_id": 10, "minute": 5, "h_a": "a", "player": "Palmer",
+                                    "player_id": 9, "xG": 0.25, "result": "MissedShots"}
+    assert (timeline["h_team"], timeline["season"]) == ("Arsenal", 2023)
+    assert timelines.get(2)["final"]["away_xg"] == 0.25
+    assert timelines.get(3) is None
+
+
+def test_add_rows_merges_into_the_match_only():
+    timelines = MatchTimelines(FakeDB([shot(1, 10, 5, "h", 0.5, "Goal"), shot(2, 20, 50, "a", 0.25)]))
+    before = timelines.get(2)
+    rows = [dict(zip(COLUMNS, values)) for values in
+            (shot(1, 13, 90, "a", 0.5, "Goal"), shot(1, 12, 1, "a", 0.125), shot(3, 30, 10, "h", 0.75))]
+    rows.append({"shot_id": 40, "match_id": None})
+    timelines.add_rows("shot_data", rows)
+
+    timeline = timelines.get(1)
+    assert [s["shot_id"] for s in timeline["shots"]] == [12, 10, 13]
+    assert timeline["away_xg"] == [0.125, 0.125, 0.625]
+    assert timeline["home_goals"] == [0, 1, 1] and timeline["away_goals"] == [0, 0, 1]
+    assert timelines.get(2) == before
+    # a match that had no shots yet takes its teams from the new rows
+    assert timelines.get(3)["final"] == {"home_xg": 0.75, "away_xg": 0, "home_goals": 0, "away_goals": 0}
+    assert timelines.get(3)["a_team"] == "Chelsea"
+
+
+@pytest.mark.parametrize("table", ["match_info", "shot_data"])
+def test_add_rows_waits_for_the_first_build(table):
+    timelines = MatchTimelines(FakeDB())
+    timelines.add_rows(table, [dict(zip(COLUMNS, shot(1, 10, 5, "h", 0.5)))])
+    assert timelines._matches is None
@@ -0,0 +1,109 @@
+import time
+import threading
+
+import mysql.connector
+import pytest
+
+import utils
+from utils import QueryCache, on_invalidate
+
+
+def test_get_misses_then_hits():
+    cache = QueryCache()
+    assert cache.get("q") == (False, None)
+    cache.put("q", [1])
+    assert cache.get("q") == (True, [1])
+
+
+def test_invalidate_drops_only_entries_of_those_tables(monkeypatch):
+    monkeypatch.setattr(utils, "_invalidation_listeners", [])
+    cache = QueryCache()
+    cache.put("shots", "s", tables=("shot_data",))
+    cache.put("joined", "j", tables=("shot_data", "player"))
+    cache.put("players", "p", tables=("player",))
+    cache.put("untagged", "u")
+
+    assert cache.invalidate("shot_data") == 2
+    assert cache.get("shots") == (False, None)
+    assert cache.get("joined") == (False, None)
+    assert cache.get("players") == (True, "p")
+    assert cache.get("untagged") == (True, "u")
+
+
+def test_invalidate_notifies_listeners_even_when_one_fails(monkeypatch):
+    monkeypatch.setattr(utils, "_invalidation_listeners", [])
+    seen = []
+
+    @on_invalidate
+    def broken(tables):
+        raise RuntimeError("listener bug")
+
+    on_invalidate(seen.append)
+    QueryCache().invalidate("player", "fut23")
+    assert seen == [{"player", "fut23"}]
+
+
+def test_entries_expire_after_their_ttl_but_stay_available_as_stale():
+    cache = QueryCache(ttl=60)
+    cache.put("q", "v", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("q") == (False, None)
+    assert cache.get_stale("q") == (True, "v")
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1) and cache.get("c") == (True, 3)
+
+
+class FakeConnection:
+    def __init__(self, error=None):
+        self.error = error
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, query, params=None):
+        if self.error:
+            raise self.error
+
+    def fetchall(self):
+        return [{"ok": 1}]
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def probing_connector(connection):
+    """A DatabaseConnector whose breaker is due for a probe, on a pool that hands out `connection`."""
+    db = object.__new__(utils.DatabaseConnector)
+    db.breaker = utils.CircuitBreaker(threshold=1, reset_timeout=0)
+    db.breaker.failure()
+    db._probe = None
+    db._slots = threading.BoundedSemaphore(1)
+    db._load_lock = threading.Lock()
+    db._waiting = db._in_use = 0
+    db.pool = type("Pool", (), {"get_connection": lambda self: connection})()
+    return db
+
+
+def test_breaker_closes_only_after_the_probe_query_succeeds():
+    db = probing_connector(FakeConnection())
+    assert db._execute("SELECT 1") == [{"ok": 1}]
+    assert db.breaker.state == "closed"
+
+
+def test_breaker_opens_again_when_the_probe_query_fails():
+    db = probing_connector(FakeConnection(mysql.connector.ProgrammingError(msg="bad query", errno=1064)))
+    with pytest.raises(mysql.connector.ProgrammingError):
+        db._execute("SELEC 1")
+    assert db.breaker.state == "open"
+    assert db._probe is None and db._in_use == 0
@@ -0,0 +1,206 @@
+import time
+import threading
+from contextlib import contextmanager
+
+import mysql.connector
+import pytest
+from writes import (GroupCommitter, ER_LOCK_DEADLOCK, DEADLOCK_ATTEMPTS, _Pending, build_statements, apply_batch,
+                    EXISTING_MATCH_SQL, KNOWN_TEAM_SQL, WriteValidationError)
+
+
+class FakeDB:
+    """db.transaction() that records the statements of every commit and rollback."""
+
+    def __init__(self):
+        self.commits = []
+        self.rollbacks = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        cur = FakeCursor()
+        try:
+            yield cur
+        except Exception:
+            with self._lock:
+                self.rollbacks += 1
+            raise
+        with self._lock:
+            self.commits.append(cur.statements)
+
+
+class FakeCursor:
+    def __init__(self, rows=()):
+        self.statements = []
+        self.rows = list(rows)
+        self.rowcount = 1
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return self.rows
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def write(name):
+    def work(cur):
+        cur.execute(name)
+        return name
+    return work
+
+
+def test_single_batch_commits_and_returns_its_result():
+    db = FakeDB()
+    committer = GroupCommitter(db, window=0)
+    assert committer.submit(write("a")) == "a"
+    assert db.commits == [["SAVEPOINT batch_0", "a"]]
+    assert committer.stats == {"batches": 1, "commits": 1, "retries": 0}
+
+
+def test_failing_batch_is_rolled_back_to_its_savepoint_only():
+    db = FakeDB()
+    committer = GroupCommitter(db, window=0)
+
+    def broken(cur):
+        cur.execute("b")
+        raise ValueError("bad row")
+
+    group = [_Pending(write("a")), _Pending(broken), _Pending(write("c"))]
+    committer._commit(group)
+
+    assert [p.result for p in group] == ["a", None, "c"]
+    assert isinstance(group[1].error, ValueError)
+    assert db.commits == [["SAVEPOINT batch_0", "a", "SAVEPOINT batch_1", "b",
+                           "ROLLBACK TO SAVEPOINT batch_1", "SAVEPOINT batch_2", "c"]]
+
+
+def test_deadlock_victim_is_retried_with_its_group():
+    db = FakeDB()
+    committer = GroupCommitter(db, window=0)
+    calls = []
+
+    def deadlocks_once(cur):
+        calls.append(1)
+        if len(calls) == 1:
+            raise mysql.connector.errors.InternalError(msg="Deadlock found", errno=ER_LOCK_DEADLOCK)
+        cur.execute("b")
+        return "b"
+
+    group = [_Pending(write("a")), _Pending(deadlocks_once), _Pending(write("c"))]
+    committer._commit(group)
+
+    assert [(p.done, p.result, p.error) for p in group] == [(True, "a", None), (True, "b", None), (True, "c", None)]
+    assert db.rollbacks == 1
+    assert db.commits == [["SAVEPOINT batch_0", "a", "SAVEPOINT batch_1", "b", "SAVEPOINT batch_2", "c"]]
+    assert committer.stats["retries"] == 1
+
+
+def test_deadlock_fails_only_its_batch_after_the_last_attempt():
+    db = FakeDB()
+    committer = GroupCommitter(db, window=0)
+
+    def deadlocks(cur):
+        raise mysql.connector.errors.InternalError(msg="Deadlock found", errno=ER_LOCK_DEADLOCK)
+
+    group = [_Pending(write("a")), _Pending(deadlocks), _Pending(write("c"))]
+    committer._commit(group)
+
+    assert [p.done for p in group] == [True, True, True]
+    assert group[0].result == "a" and group[0].error is None
+    assert group[1].error.errno == ER_LOCK_DEADLOCK and group[1].attempts == DEADLOCK_ATTEMPTS
+    assert group[2].result == "c" and group[2].error is None
+    assert db.rollbacks == DEADLOCK_ATTEMPTS
+    assert db.commits == [["SAVEPOINT batch_0", "a", "SAVEPOINT batch_1", "c"]]
+    assert committer.stats["retries"] == DEADLOCK_ATTEMPTS
+
+
+def test_concurrent_writers_share_commits_and_all_return():
+    db = FakeDB()
+    committer = GroupCommitter(db, window=0.01, max_batches=8)
+    results = [None] * 40
+    def submit(i):
+        results[i] = committer.submit(write(f"w{i}"))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [f"w{i}" for i in range(40)]
+    assert committer.stats["batches"] == 40
+    assert committer.stats["commits"] < 40
+    assert not committer._leader_active and not committer._queue
+
+
+def test_leader_returns_once_its_own_batch_is_committed():
+    db = FakeDB()
+    committer = GroupCommitter(db, window=0, max_batches=1)
+    started, release, hold = threading.Event(), threading.Event(), threading.Event()
+
+    def first(cur):
+        started.set()
+        release.wait(5)
+        return "first"
+
+    def follower(cur):
+        hold.wait(5)
+        return "follower"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(committer.submit(first)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(committer.submit(follower))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    wait_for(lambda: len(committer._queue) == 3)
+    release.set()
+
+    # the first writer is back while the others are still being committed by their own leader
+    leader.join(5)
+    assert not leader.is_alive() and results == ["first"]
+    hold.set()
+    for thread in followers:
+        thread.join(5)
+    assert results == ["first"] + ["follower"] * 3
+    assert committer.stats["commits"] == 4
+    assert not committer._leader_active
+
+
+def test_partitioned_delete_detaches_the_shots_itself():
+    statements = build_statements([{"op": "delete", "match_id": 7}], ("delete",), partitioned=True)
+    assert statements[0] == ("UPDATE shot_data SET match_id = NULL WHERE match_id = %s", (7,))
+    assert [sql for sql, _ in build_statements([{"op": "delete", "match_id": 7}], ("delete",))] == [
+        sql for sql, _ in statements[1:]]
+
+
+def test_partitioned_create_of_an_existing_match_is_a_duplicate():
+    operations = [{"op": "create", "match_id": 7, "match_info": {"season": 2020}}]
+    statements = build_statements(operations, ("create",), partitioned=True)
+    assert statements[0] == (EXISTING_MATCH_SQL, (7,))
+
+    assert apply_batch(FakeCursor(), statements)["rows_affected"] == 1
+    with pytest.raises(mysql.connector.IntegrityError, match="Duplicate entry '7'"):
+        apply_batch(FakeCursor(rows=[{"match_id": 7}]), statements)
+
+
+def test_compact_create_writes_ids_and_refuses_unknown_teams():
+    operations = [{"op": "create", "match_id": 7, "match_info": {"h": 4, "team_h": "Home", "team_a": "Away"}}]
+    statements = build_statements(operations, ("create",), compact=True)
+    assert statements[:2] == [("INSERT IGNORE INTO teams (team_id, team_name) VALUES (%s, %s)", (4, "Home")),
+                              (KNOWN_TEAM_SQL, ("Away",))]
+    sql, params = statements[2]
+    assert sql.startswith("INSERT INTO match_info_compact (`match_id`,`h`,`a`)")
+    assert params == (7, 4, "Away")
+
+    apply_batch(FakeCursor(rows=[{"team_id": 5}]), statements)
+    with pytest.raises(WriteValidationError, match="Unknown team 'Away'"):
+        apply_batch(FakeCursor(), statements)
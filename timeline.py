@@ -0,0 +1,170 @@
+import time
+import logging
+import threading
+from collections import defaultdict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_MAX_AGE = 600 # imports in other workers only show up through the table, reload every few minutes
+
+TIMELINE_SQL = """
+    SELECT match_id, shot_id, minute, h_a, xG, result, player, player_id, h_team, a_team, season, date
+    FROM shot_data
+    WHERE match_id IS NOT NULL
+"""
+
+# one shot per record, ~40 bytes instead of a dict row; player and result are codes into shared labels
+SHOT = np.dtype([
+    ("shot_id", "i8"), ("player_id", "i8"), ("minute", "i2"), ("away", "?"), ("goal", "?"),
+    ("player", "i4"), ("result", "i2"), ("xg", "f4"),
+    ("home_xg", "f4"), ("away_xg", "f4"), ("home_goals", "i2"), ("away_goals", "i2"),
+])
+
+
+def _grouped_cumsum(values, starts):
+    """cumsum that restarts at every index in `starts` (which begins with 0)."""
+    total = np.cumsum(values, dtype=np.float64)
+    before = np.concatenate(([0.0], total[starts[1:] - 1]))
+    return total - np.repeat(before, np.diff(np.append(starts, len(values))))
+
+
+def _accumulate(records, match_ids):
+    """Sort shots by match, minute and id and fill in the running xG and goal totals.
+
+    Returns the sorted records, the sorted match ids and where each match starts.
+    """
+    if not len(records): # empty shot_data
+        return records, match_ids, np.zeros(0, dtype=np.intp)
+    order = np.lexsort((records["shot_id"], records["minute"], match_ids))
+    records, match_ids = records[order], match_ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], match_ids[1:] != match_ids[:-1])))
+    home, away = ~records["away"], records["away"]
+    records["home_xg"] = _grouped_cumsum(np.where(home, records["xg"], 0), starts)
+    records["away_xg"] = _grouped_cumsum(np.where(away, records["xg"], 0), starts)
+    records["home_goals"] = _grouped_cumsum(home & records["goal"], starts)
+    records["away_goals"] = _grouped_cumsum(away & records["goal"], starts)
+    return records, match_ids, starts
+
+
+class MatchTimelines:
+    """Cumulative home/away xG and goals per match, shot by shot.
+
+    Built in one pass over shot_data: each fetched batch of shots is encoded
+    into a structured array as it arrives, the batches are joined and sorted
+    by match and minute, and the running totals are grouped cumsums. Each match keeps a view of its slice. Shots the importer
+    appends are merged into their match only, so the rest stays untouched.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._matches = None # match_id -> (records, (h_team, a_team, season, date))
+        self._built_at = 0
+        self._labels = {"player": [], "result": []}
+        self._codes = {"player": {}, "result": {}}
+        self._lock = threading.Lock()
+        self.background = False # a JobRunner refreshes it, requests only ever build the first one
+
+    def _code(self, kind, value):
+        codes = self._codes[kind]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._labels[kind])
+            self._labels[kind].append(value)
+        return code
+
+    def _encode(self, shots):
+        """Records and match ids for shots given as {column: list of values} of TIMELINE_SQL."""
+        records = np.zeros(len(shots["shot_id"]), dtype=SHOT)
+        records["shot_id"] = shots["shot_id"]
+        records["player_id"] = [value or 0 for value in shots["player_id"]]
+        records["minute"] = [value or 0 for value in shots["minute"]]
+        records["away"] = [value == "a" for value in shots["h_a"]]
+        records["goal"] = [value == "Goal" for value in shots["result"]]
+        records["player"] = [self._code("player", value or "") for value in shots["player"]]
+        records["result"] = [self._code("result", value or "") for value in shots["result"]]
+        records["xg"] = [value or 0 for value in shots["xG"]]
+        return records, np.array(shots["match_id"], dtype=np.int64)
+
+    def _build(self):
+        started = time.monotonic()
+        stream = self.db.stream_query(TIMELINE_SQL)
+        columns = next(stream)
+        parts, ids, meta = [np.zeros(0, dtype=SHOT)], [np.zeros(0, dtype=np.int64)], {}
+        for batch in stream:
+            if not batch:
+                continue
+            # only one batch of row tuples is alive at a time, the rest is already packed records
+            shots = dict(zip(columns, zip(*batch)))
+            records, match_ids = self._encode(shots)
+            parts.append(records)
+            ids.append(match_ids)
+            # match metadata from any one shot of the match
+            for match_id, *info in zip(shots["match_id"], shots["h_team"], shots["a_team"],
+                                       shots["season"], shots["date"]):
+                meta.setdefault(match_id, tuple(info))
+        records, match_ids, starts = _accumulate(np.concatenate(parts), np.concatenate(ids))
+
+        bounds = np.append(starts, len(records))
+        self._matches = {int(match_ids[s]): (records[s:e], meta[int(match_ids[s])])
+                         for s, e in zip(bounds[:-1], bounds[1:])}
+        self._built_at = time.monotonic()
+        logger.info("Built xG timelines of %d matches (%d shots) in %.1f ms",
+                    len(self._matches), len(records), (time.monotonic() - started) * 1000)
+
+    def _stale(self):
+        return self._matches is None or not self.background and time.monotonic() - self._built_at > TIMELINE_MAX_AGE
+
+    def refresh(self):
+        with self._lock:
+            self._build()
+
+    def _ready(self):
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._build()
+        return self._matches
+
+    def get(self, match_id):
+        """The timeline of one match as JSON-ready dict, None for a match without shots."""
+        entry = self._ready().get(match_id)
+        if entry is None:
+            return None
+        records, (h_team, a_team, season, date) = entry
+        players, results = self._labels["player"], self._labels["result"]
+        last = records[-1]
+        return {
+            "match_id": match_id, "h_team": h_team, "a_team": a_team, "season": season, "date": date,
+            "final": {"home_xg": round(float(last["home_xg"]), 3), "away_xg": round(float(last["away_xg"]), 3),
+                      "home_goals": int(last["home_goals"]), "away_goals": int(last["away_goals"])},
+            # parallel arrays, one step of the xG race per shot
+            "minute": records["minute"].tolist(),
+            "home_xg": np.round(records["home_xg"].astype(np.float64), 3).tolist(),
+            "away_xg": np.round(records["away_xg"].astype(np.float64), 3).tolist(),
+            "home_goals": records["home_goals"].tolist(),
+            "away_goals": records["away_goals"].tolist(),
+            "shots": [{"shot_id": int(r["shot_id"]), "minute": int(r["minute"]), "h_a": "a" if r["away"] else "h",
+                       "player": players[r["player"]], "player_id": int(r["player_id"]),
+                       "xG": round(float(r["xg"]), 4), "result": results[r["result"]]} for r in records],
+        }
+
+    def add_rows(self, table, rows):
+        """importer on_insert hook: merge newly inserted shots into their matches' timelines."""
+        if table != "shot_data" or not rows or self._matches is None:
+            return # not built yet, the first request loads them from the table
+        by_match = defaultdict(list)
+        for row in rows:
+            if row.get("match_id") is not None:
+                by_match[row["match_id"]].append(row)
+        with self._lock:
+            for match_id, new in by_match.items():
+                records, _ = self._encode({column: [row.get(column) for row in new] for column in
+                                           ("match_id", "shot_id", "minute", "h_a", "xG", "result",
+                                            "player", "player_id")})
+                old, meta = self._matches.get(match_id, (np.zeros(0, dtype=SHOT), None))
+                records = np.concatenate((old, records))
+                records, _, _ = _accumulate(records, np.full(len(records), match_id, dtype=np.int64))
+                first = new[0]
+                self._matches[match_id] = (records, meta or (first.get("h_team"), first.get("a_team"),
+                                                             first.get("season"), first.get("date")))
@@ -1,9 +1,214 @@
 import mysql.connector
 import os
+import time
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', '5'))
+CHECKOUT_TIMEOUT = float(os.getenv('MYSQL_CHECKOUT_TIMEOUT', '5'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '300'))
+QUERY_TIMEOUT = float(os.getenv('MYSQL_QUERY_TIMEOUT_MS', '10000')) / 1000
+CONNECT_TIMEOUT = int(os.getenv('MYSQL_CONNECT_TIMEOUT', '3'))
+BREAKER_THRESHOLD = int(os.getenv('DB_BREAKER_THRESHOLD', '5'))
+BREAKER_RESET = float(os.getenv('DB_BREAKER_RESET', '10'))
+
+ER_QUERY_TIMEOUT = 3024 # MAX_EXECUTION_TIME exceeded
+
+
+class PoolBusyError(Exception):
+    """Raised when no pooled connection frees up within CHECKOUT_TIMEOUT seconds."""
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a query runs past its deadline, or the deadline was already spent."""
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching MySQL while the circuit breaker is open."""
+
+
+_deadlines = threading.local()
+
+
+@contextmanager
+def query_deadline(seconds):
+    """Every query run inside the block must finish within `seconds` from now, together.
+
+    Nested deadlines only ever shorten the remaining time.
+    """
+    previous = getattr(_deadlines, 'at', None)
+    at = time.monotonic() + seconds
+    _deadlines.at = at if previous is None else min(at, previous)
+    try:
+        yield
+    finally:
+        _deadlines.at = previous
+
+
+def _time_left(timeout=None):
+    """Seconds the next query may run: the call's timeout, capped by the enclosing deadline."""
+    left = QUERY_TIMEOUT if timeout is None else timeout
+    at = getattr(_deadlines, 'at', None)
+    if at is not None:
+        left = min(left, at - time.monotonic())
+    return left
+
+
+def _with_max_execution_time(query, seconds):
+    # the optimizer hint is per statement, so nothing leaks to the next user of the pooled connection
+    stripped = query.lstrip()
+    if not stripped[:6].upper() == "SELECT" or seconds is None:
+        return query
+    return f"SELECT /*+ MAX_EXECUTION_TIME({max(1, int(seconds * 1000))}) */{stripped[6:]}"
+
+
+class CircuitBreaker:
+    """Stops calling MySQL after `threshold` consecutive connection failures.
+
+    While open every checkout fails at once with CircuitOpenError. After
+    `reset_timeout` seconds one caller is let through as a probe: if it gets a
+    connection and its query works the breaker closes, otherwise it opens again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open' # this caller is the probe
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = 'closed'
+
+    def abandon(self):
+        """The probe's connection came back without a verdict (its statement failed
+        without an outage error, or never ran): open again and wait for the next probe."""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                if self.state != 'open':
+                    logger.error("Database circuit breaker opened after %d failures", self.failures)
+                    self.stats['opened'] += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, **self.stats}
+
+
+def _is_outage(err):
+    """Connection-level errors count against the breaker, a single bad query doesn't."""
+    if getattr(err, 'errno', None) == ER_QUERY_TIMEOUT:
+        return False
+    return isinstance(err, (mysql.connector.InterfaceError, mysql.connector.OperationalError,
+                            mysql.connector.PoolError))
+
+
+_invalidation_listeners = []
+
+
+def on_invalidate(callback):
+    """Register callback(tables) to run whenever cached results for some tables are dropped.
+
+    Lets in-memory structures derived from a table (search indexes, aggregates)
+    rebuild on the same signal as the query cache.
+    """
+    _invalidation_listeners.append(callback)
+    return callback
+
+
+_query_observers = []
+
+
+def on_query(callback):
+    """Register callback(query, params, seconds) to run after every execute_query/stream_query.
+
+    Used by the request profiler to attribute SQL time; with no observers the
+    only cost is the check for an empty list.
+    """
+    _query_observers.append(callback)
+    return callback
+
+
+class QueryCache:
+    """Small LRU cache for read query results, invalidated by table name.
+
+    Entries are tagged with the tables the query reads, so a write to one
+    table only drops the results that depend on it.
+    """
+
+    def __init__(self, max_entries=512, ttl=QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value, tables)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def get_stale(self, key):
+        """Like get, but also returns expired entries. Used while MySQL is unreachable."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return (False, None) if entry is None else (True, entry[1])
+
+    def put(self, key, value, tables=(), ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value, frozenset(tables))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tables):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] & set(tables)]
+            for key in stale:
+                del self._entries[key]
+        for callback in _invalidation_listeners:
+            try:
+                callback(set(tables))
+            except Exception:
+                logger.exception("Invalidation listener %r failed", callback)
+        return len(stale)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
 class DatabaseConnector: # a bridge between Flask and MySQL Database using connection pooling 
     def __init__(self):
         try:
@@ -18,19 +223,33 @@ class DatabaseConnector: # a bridge between Flask and MySQL Database using conne
             if not host or not user or not database:
                 raise ValueError("Database configuration error: check the .env file for MYSQL_HOST, MYSQL_USER and MYSQL_DB")
 
+            # mysql.connector fails right away when the pool is exhausted, so checkouts
+            # queue on this semaphore instead and the queue depth is used for load shedding
+            self._slots = threading.BoundedSemaphore(POOL_SIZE)
+            self._load_lock = threading.Lock()
+            self._waiting = 0
+            self._in_use = 0
+            self.cache = QueryCache()
+            self._flights = {} # (query, params) -> _Flight of a read that is running right now
+            self._flight_lock = threading.Lock()
+            self.flight_stats = {'executed': 0, 'coalesced': 0}
+            self.breaker = CircuitBreaker()
+            self._probe = None # the connection checked out while the breaker was half-open
+
             self.poolconfig = {
                 'host': host,
                 'user': user,
                 'password': password,
                 'database': database,
                 'port': port,
+                'connection_timeout': CONNECT_TIMEOUT, # fail fast when MySQL is down instead of hanging
             }
 
             # Try creating connection pool. If the database does not exist create it and retry.
             try:
                 self.pool = mysql.connector.pooling.MySQLConnectionPool(
                     pool_name="betrivals_pool",
-                    pool_size=5,
+                    pool_size=POOL_SIZE,
                     **self.poolconfig
                 )
             except mysql.connector.Error as err:
@@ -53,7 +272,7 @@ class DatabaseConnector: # a bridge between Flask and MySQL Database using conne
                         # retry pool creation
                         self.pool = mysql.connector.pooling.MySQLConnectionPool(
                             pool_name="betrivals_pool",
-                            pool_size=5,
+                            pool_size=POOL_SIZE,
                             **self.poolconfig
                         )
                     except mysql.connector.Error as e:
@@ -71,17 +290,113 @@ class DatabaseConnector: # a bridge between Flask and MySQL Database using conne
             raise
 
     def _get_connection(self):
+        with self._load_lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=CHECKOUT_TIMEOUT)
+        with self._load_lock:
+            self._waiting -= 1
+            if acquired:
+                self._in_use += 1
+        if not acquired:
+            raise PoolBusyError(f"No pooled connection available after {CHECKOUT_TIMEOUT}s")
+
+        if not self.breaker.allow():
+            self._release_slot()
+            raise CircuitOpenError("Database marked unavailable after repeated connection failures")
         try:
-            return self.pool.get_connection()
+            conn = self.pool.get_connection() # pings and reconnects stale pooled connections
         except mysql.connector.Error as err:
+            self._release_slot()
+            self.breaker.failure()
             logger.exception(f"Error while getting connection from pool: {err}")
             raise
+        if self.breaker.state == 'half_open':
+            self._probe = conn # closes the breaker once its statement succeeds
+        return conn
 
     def _return_connection(self, conn):
         if conn:
+            self._end_probe(conn)
             conn.close()
+            self._release_slot()
+
+    def _end_probe(self, conn):
+        if conn is self._probe:
+            self._probe = None
+            self.breaker.abandon() # no-op if the statement already closed or opened the breaker
+
+    def _release_slot(self):
+        with self._load_lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def load(self):
+        """Snapshot of pool usage: checkouts in use and callers queued for one."""
+        with self._load_lock:
+            return {'pool_size': POOL_SIZE, 'in_use': self._in_use, 'waiting': self._waiting}
 
-    def execute_query(self, query, params=None, fetch_all=True):
+    def execute_query(self, query, params=None, fetch_all=True, timeout=None):
+        """Run one statement. SELECTs are cut off server-side after `timeout` seconds
+        (default MYSQL_QUERY_TIMEOUT_MS), or sooner inside a query_deadline block."""
+        if _query_observers:
+            started = time.perf_counter()
+            try:
+                return self._dispatch(query, params, fetch_all, timeout)
+            finally:
+                elapsed = time.perf_counter() - started
+                for callback in _query_observers:
+                    callback(query, params, elapsed)
+        return self._dispatch(query, params, fetch_all, timeout)
+
+    def _dispatch(self, query, params, fetch_all, timeout=None):
+        if fetch_all and query.lstrip().upper().startswith("SELECT"):
+            return self._single_flight(query, params, timeout)
+        return self._execute(query, params, fetch_all)
+
+    def _single_flight(self, query, params, timeout=None):
+        """Run identical concurrent reads once and hand every caller the same result.
+
+        When a shared /shot/<id> link is opened by many clients at once, only the
+        first caller takes a pooled connection; the others wait for its rows.
+        Callers share the result list, so treat it as read-only.
+        """
+        if isinstance(params, dict):
+            frozen = tuple(sorted(params.items()))
+        else:
+            frozen = tuple(params) if params else None
+        key = (query, frozen)
+
+        with self._flight_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.flight_stats['executed'] += 1
+            else:
+                self.flight_stats['coalesced'] += 1
+
+        left = _time_left(timeout)
+        if not leader:
+            if not flight.done.wait(max(left, 0)):
+                raise QueryTimeoutError(f"Query did not finish within {left:.3f}s")
+            if flight.error is not None:
+                raise flight.error
+            return flight.results
+
+        try:
+            if left <= 0:
+                raise QueryTimeoutError("Deadline already passed before the query started")
+            flight.results = self._execute(_with_max_execution_time(query, left), params, True)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flight_lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.results
+
+    def _execute(self, query, params=None, fetch_all=True):
         conn = None
         cursor = None
         results = None
@@ -97,11 +412,20 @@ class DatabaseConnector: # a bridge between Flask and MySQL Database using conne
                 results = cursor.fetchall() # SELECT
             else:
                 conn.commit() # INSERT, UPDATE, DELETE
+            self.breaker.success()
                 
         except mysql.connector.Error as err:
-            logger.exception(f"QUERY ERROR: {err}")
+            if conn and _is_outage(err): # checkout failures were already counted
+                self.breaker.failure()
             if conn:
-                conn.rollback() # if there is an error, rollback the transaction
+                try:
+                    conn.rollback() # if there is an error, rollback the transaction
+                except mysql.connector.Error:
+                    pass # connection is gone, nothing to roll back
+            if getattr(err, 'errno', None) == ER_QUERY_TIMEOUT:
+                logger.warning("Query cut off by MAX_EXECUTION_TIME: %s", " ".join(query.split())[:200])
+                raise QueryTimeoutError(str(err)) from err
+            logger.exception(f"QUERY ERROR: {err}")
             raise err
         finally:
             if cursor:
@@ -111,6 +435,99 @@ class DatabaseConnector: # a bridge between Flask and MySQL Database using conne
             
         return results
 
+    def stream_query(self, query, params=None, batch_size=1000):
+        """Yield the column names, then lists of row tuples, from an unbuffered cursor.
+
+        Rows are pulled from MySQL batch by batch as the caller consumes them, so
+        memory stays at one batch. The connection is checked out when iteration
+        starts and goes back to the pool as soon as the generator is exhausted.
+        If it is closed early (e.g. the client disconnected) the connection is
+        dropped instead, see _discard_connection.
+        """
+        started = time.perf_counter()
+        conn = self._get_connection()
+        cursor = None
+        finished = False
+        try:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query, params)
+            self.breaker.success()
+            for callback in _query_observers:
+                callback(query, params, time.perf_counter() - started)
+            yield [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+                self._return_connection(conn)
+            else:
+                self._discard_connection(conn)
+
+    def _discard_connection(self, conn):
+        """Give back a connection with its socket shut instead of draining an unread result.
+
+        Reading the rest of an abandoned result set would still transfer all of it
+        and hold the slot meanwhile; with the socket gone MySQL aborts the query,
+        and the pool reconnects the connection on its next checkout.
+        """
+        self._end_probe(conn)
+        try:
+            getattr(conn, '_cnx', conn).shutdown()
+            conn.close()
+        except mysql.connector.Error:
+            pass # resetting the session fails on the closed socket, the pool has it back either way
+        finally:
+            self._release_slot()
+
+    @contextmanager
+    def transaction(self):
+        """Run everything in the block on one pooled connection as a single transaction.
+
+        Yields a dictionary cursor; commits when the block finishes and rolls back
+        if it raises.
+        """
+        conn = self._get_connection()
+        cursor = None
+        try:
+            conn.start_transaction()
+            cursor = conn.cursor(dictionary=True)
+            yield cursor
+            conn.commit()
+            self.breaker.success()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            self._return_connection(conn)
+
+    def cached_query(self, query, params=None, tables=(), ttl=None):
+        """execute_query for reads whose result can be reused until one of `tables` changes."""
+        key = (query, tuple(params) if params else None)
+        hit, results = self.cache.get(key)
+        if not hit:
+            try:
+                results = self.execute_query(query, params)
+            except (CircuitOpenError, mysql.connector.Error) as err:
+                # MySQL is unreachable: an expired result beats an error page
+                stale, results = self.cache.get_stale(key)
+                if not stale or not isinstance(err, CircuitOpenError) and not _is_outage(err):
+                    raise
+                logger.warning("Serving stale cached result while the database is unavailable")
+                return results
+            self.cache.put(key, results, tables, ttl)
+        return results
+
+    def invalidate(self, *tables):
+        """Drop cached results that read any of the given tables, call this after writes."""
+        return self.cache.invalidate(*tables)
+
     def execute_script(self, filepath): # instead of query, this takes a .sql file path
         conn = None
         cursor = None
@@ -140,4 +557,54 @@ class DatabaseConnector: # a bridge between Flask and MySQL Database using conne
             if cursor:
                 cursor.close()
             if conn:
-                self._return_connection(conn)
\ No newline at end of file
+                self._return_connection(conn)
+
+
+def default_backend():
+    """DatabaseConnector, or the read-only SQLite build of the CSVs with DB_BACKEND=sqlite."""
+    if os.getenv('DB_BACKEND', 'mysql').lower() == 'sqlite':
+        from sqlite_backend import SQLiteConnector # imports kickstarter/pandas, only load it when used
+        return SQLiteConnector
+    return DatabaseConnector
+
+
+class LazyDatabaseConnector:
+    """Stand-in for DatabaseConnector that builds the real one on first use, once per process.
+
+    Importing the app no longer needs MySQL to be up, and a worker forked by a
+    prefork server builds its own pool instead of sharing the parent's sockets.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        # the parent's pool belongs to the parent, just drop our reference to it
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._db is not None and self._pid == os.getpid()
+
+    def get(self):
+        if not self.connected:
+            with self._lock:
+                if not self.connected:
+                    self._db = (self._factory or default_backend())()
+                    self._pid = os.getpid()
+        return self._db
+
+    def load(self):
+        if not self.connected:
+            return {'pool_size': POOL_SIZE, 'in_use': 0, 'waiting': 0}
+        return self._db.load()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import logging
+import threading
+import mysql.connector
+from importer import coerce_value
+from kickstarter import table_columns, compact_row, COMPACT_TABLES
+
+logger = logging.getLogger(__name__)
+
+# How long the first writer waits for concurrent writers to join its commit
+GROUP_COMMIT_WINDOW = float(os.getenv('GROUP_COMMIT_WINDOW_MS', '2')) / 1000
+GROUP_COMMIT_MAX = int(os.getenv('GROUP_COMMIT_MAX', '64'))
+DEADLOCK_ATTEMPTS = 3 # a batch that deadlocks or times out on a lock this often fails with that error
+MAX_OPERATIONS = 1000
+IDEMPOTENCY_SQL = "data_creator_sqls/idempotency_keys_creator.sql"
+
+MATCH_TABLES = ("match_info", "match_data")
+
+
+class WriteValidationError(Exception):
+    """The batch is malformed, nothing was written."""
+
+
+def _columns(table, values):
+    types = dict(table_columns(table))
+    unknown = [c for c in values if c not in types]
+    if unknown:
+        raise WriteValidationError(f"Unknown {table} columns: {', '.join(unknown)}")
+    try:
+        return {c: coerce_value(None if v is None else str(v), types[c]) for c, v in values.items()}
+    except ValueError as e:
+        raise WriteValidationError(f"Invalid {table} value: {e}")
+
+
+# run before a create in the partitioned layout, where match_id alone is no longer a unique key
+EXISTING_MATCH_SQL = "SELECT match_id FROM match_info WHERE match_id = %s FOR UPDATE"
+ER_DUP_ENTRY = 1062
+# run before a compact write that names a team without its id, the name has to be known
+KNOWN_TEAM_SQL = "SELECT team_id FROM teams WHERE team_name = %s"
+
+
+def _target(table, compact):
+    return COMPACT_TABLES.get(table, table) if compact else table
+
+
+def build_statements(operations, allowed_ops, partitioned=False, compact=False):
+    """Validate match operations and turn them into (sql, params) pairs.
+
+    With `partitioned` (see kickstarter.unenforced_constraints) the statements
+    also do what the lost keys did: a create first checks that its match_id is
+    new and a delete detaches the match's shots itself. With `compact` match_info
+    is written to match_info_compact, its team names turned into team ids by
+    kickstarter.compact_row.
+
+    Each operation looks like
+        {"op": "create" | "modify" | "delete", "match_id": 123,
+         "match_info": {...columns...}, "match_data": {...columns...}}
+    """
+    if not isinstance(operations, list) or not operations:
+        raise WriteValidationError("'operations' must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise WriteValidationError(f"At most {MAX_OPERATIONS} operations per batch")
+
+    statements = []
+    for i, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise WriteValidationError(f"Operation {i} is not an object")
+        op = operation.get("op", allowed_ops[0])
+        if op not in allowed_ops:
+            raise WriteValidationError(f"Operation {i}: '{op}' is not allowed here, expected {allowed_ops}")
+        try:
+            match_id = int(operation["match_id"])
+        except (KeyError, TypeError, ValueError):
+            raise WriteValidationError(f"Operation {i}: integer 'match_id' is required")
+
+        if op == "delete":
+            # shots of the match are kept: shot_data.match_id is ON DELETE SET NULL,
+            # except in the partitioned layout where the foreign key is gone
+            if partitioned:
+                statements.append(("UPDATE shot_data SET match_id = NULL WHERE match_id = %s", (match_id,)))
+            statements.append(("DELETE FROM match_data WHERE match_id = %s", (match_id,)))
+            statements.append((f"DELETE FROM {_target('match_info', compact)} WHERE match_id = %s", (match_id,)))
+            continue
+
+        if op == "create" and partitioned:
+            statements.append((EXISTING_MATCH_SQL, (match_id,)))
+        for table in MATCH_TABLES:
+            values = _columns(table, operation.get(table) or {})
+            values.pop("match_id", None)
+            if op == "create":
+                if table == "match_data" and not values:
+                    continue
+                values = {"match_id": match_id, **values}
+            elif not values:
+                continue
+
+            target = _target(table, compact)
+            if target == table:
+                expressions = {c: ("%s", (v,)) for c, v in values.items()}
+            else:
+                lookups, required, expressions = compact_row(table, values)
+                statements.extend(lookups)
+                statements.extend((KNOWN_TEAM_SQL, (name,)) for _, _, name in required)
+            params = [p for _, column_params in expressions.values() for p in column_params]
+            if op == "create":
+                sql = (f"INSERT INTO {target} ({','.join(f'`{c}`' for c in expressions)}) "
+                       f"VALUES ({','.join(sql for sql, _ in expressions.values())})")
+                statements.append((sql, tuple(params)))
+            else:
+                assignments = ", ".join(f"`{c}` = {sql}" for c, (sql, _) in expressions.items())
+                statements.append((f"UPDATE {target} SET {assignments} WHERE match_id = %s",
+                                   (*params, match_id)))
+    return statements
+
+
+def apply_batch(cur, statements, idempotency_key=None):
+    """Run one batch on an open transaction and return its response.
+
+    With an idempotency key the key row is inserted first: a concurrent or
+    repeated batch with the same key fails on the primary key instead of
+    writing twice, and gets the stored response of the first one back.
+    """
+    if idempotency_key:
+        try:
+            cur.execute("INSERT INTO api_idempotency_keys (idempotency_key) VALUES (%s)", (idempotency_key,))
+        except mysql.connector.IntegrityError:
+            cur.execute("SELECT response FROM api_idempotency_keys WHERE idempotency_key = %s",
+                        (idempotency_key,))
+            stored = cur.fetchall()
+            response = json.loads(stored[0]["response"]) if stored and stored[0]["response"] else {}
+            return {**response, "replayed": True}
+
+    affected = 0
+    for sql, params in statements:
+        cur.execute(sql, params)
+        if sql == EXISTING_MATCH_SQL:
+            if cur.fetchall():
+                # what the unpartitioned primary key says, so both layouts answer the same
+                raise mysql.connector.IntegrityError(
+                    msg=f"Duplicate entry '{params[0]}' for key 'match_info.PRIMARY'", errno=ER_DUP_ENTRY)
+            continue
+        if sql == KNOWN_TEAM_SQL:
+            if not cur.fetchall():
+                raise WriteValidationError(f"Unknown team '{params[0]}', send its id (h/a) along with the name")
+            continue
+        affected += max(cur.rowcount, 0)
+
+    response = {"statements": len(statements), "rows_affected": affected, "replayed": False}
+    if idempotency_key:
+        cur.execute("UPDATE api_idempotency_keys SET response = %s WHERE idempotency_key = %s",
+                    (json.dumps(response), idempotency_key))
+    return response
+
+
+# errors after which InnoDB may have rolled back the whole transaction, savepoints included
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+
+
+MATCH_EVENT_SQL = """
+    SELECT mi.match_id, mi.date, mi.season, mi.league, mi.team_h, mi.team_a,
+           mi.h_goals, mi.a_goals, mi.h_xg, mi.a_xg, md.isResult,
+           md.forecast_w, md.forecast_d, md.forecast_l
+    FROM match_info mi LEFT JOIN match_data md ON mi.match_id = md.match_id
+    WHERE mi.match_id IN ({placeholders})
+"""
+
+
+def _match_events(cur, match_ids):
+    """Live-feed payloads of the given matches, as they are in the cursor's transaction."""
+    cur.execute(MATCH_EVENT_SQL.format(placeholders=",".join(["%s"] * len(match_ids))), tuple(match_ids))
+    return cur.fetchall()
+
+
+class _Pending:
+    def __init__(self, work):
+        self.work = work
+        self.wake = threading.Event() # set when the batch is done or its writer becomes leader
+        self.leader = False
+        self.attempts = 0 # transactions this batch was rolled back in by a deadlock or lock wait
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class _GroupRolledBack(Exception):
+    """A batch made InnoDB roll back the whole group transaction."""
+
+
+class GroupCommitter:
+    """Commits concurrent small write batches together in one transaction.
+
+    The first writer to arrive becomes the leader: it waits GROUP_COMMIT_WINDOW
+    for others to queue up, then runs every queued batch inside one transaction,
+    each under its own SAVEPOINT so a failing batch is rolled back alone, and
+    commits once. Followers just wait for their result. Under matchday load that
+    turns many single-row commits (each an fsync) into a few larger ones.
+
+    A leader only commits until its own batch is done, then hands leadership
+    to the oldest waiting writer, so no request is kept busy by everyone else's
+    writes. When a batch deadlocks or times out on a lock the group's
+    transaction is gone and the whole group runs again, the batch that hit it
+    included until it did so DEADLOCK_ATTEMPTS times, then it fails with that error.
+    """
+
+    def __init__(self, db, window=GROUP_COMMIT_WINDOW, max_batches=GROUP_COMMIT_MAX):
+        self.db = db
+        self.window = window
+        self.max_batches = max_batches
+        self._queue = []
+        self._leader_active = False
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "commits": 0, "retries": 0}
+
+    def submit(self, work):
+        """Run work(cursor) in a group commit and return its result, or raise its error."""
+        pending = _Pending(work)
+        with self._lock:
+            self._queue.append(pending)
+            if not self._leader_active:
+                self._leader_active = pending.leader = True
+
+        if not pending.leader:
+            pending.wake.wait()
+        if pending.leader:
+            self._lead(pending)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _lead(self, own):
+        if self.window:
+            time.sleep(self.window)
+        # the queue is FIFO and only the leader takes from it, so own is in one of these groups
+        while not own.done:
+            with self._lock:
+                group = self._queue[:self.max_batches]
+                del self._queue[:self.max_batches]
+            self._commit(group)
+        with self._lock:
+            if self._queue:
+                successor = self._queue[0]
+                successor.leader = True
+                successor.wake.set()
+            else:
+                self._leader_active = False
+
+    def _commit(self, group):
+        while group:
+            group = self._try_commit(group)
+
+    def _try_commit(self, group):
+        """Run the group in one transaction. Returns the batches to run again in a new one."""
+        try:
+            with self.db.transaction() as cur:
+                for i, pending in enumerate(group):
+                    cur.execute(f"SAVEPOINT batch_{i}")
+                    try:
+                        pending.result = pending.work(cur)
+                    except mysql.connector.Error as e:
+                        if e.errno in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT):
+                            pending.attempts += 1
+                            if pending.attempts >= DEADLOCK_ATTEMPTS:
+                                self._finish(pending, error=e)
+                            raise _GroupRolledBack()
+                        cur.execute(f"ROLLBACK TO SAVEPOINT batch_{i}")
+                        pending.error = e
+                    except Exception as e:
+                        cur.execute(f"ROLLBACK TO SAVEPOINT batch_{i}")
+                        pending.error = e
+        except _GroupRolledBack:
+            retry = [pending for pending in group if not pending.done]
+            logger.info("Group commit rolled back by a deadlock or lock wait, retrying %d batches", len(retry))
+            for pending in retry:
+                pending.result = pending.error = None
+            self.stats["retries"] += 1
+            return retry
+        except Exception as e:
+            logger.exception("Group commit of %d batches failed: %s", len(group), e)
+            for pending in group:
+                self._finish(pending, error=pending.error or e)
+            return []
+
+        self.stats["batches"] += len(group)
+        self.stats["commits"] += 1
+        for pending in group:
+            self._finish(pending, pending.result, pending.error)
+        return []
+
+    @staticmethod
+    def _finish(pending, result=None, error=None):
+        pending.result, pending.error = result, error
+        pending.done = True
+        pending.wake.set()
+
+
+class MatchWriter:
+    """Batch create/modify/delete of matches behind /api/add_match and /api/modify_match."""
+
+    def __init__(self, db, hub=None):
+        self.db = db
+        self.hub = hub
+        self.committer = GroupCommitter(db)
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            with open(IDEMPOTENCY_SQL, encoding='utf-8') as f:
+                self.db.execute_query(f.read(), fetch_all=False)
+            self._schema_ready = True
+
+    def write(self, payload, allowed_ops, partitioned=False, compact=False):
+        if not isinstance(payload, dict):
+            raise WriteValidationError("Request body must be a JSON object")
+        operations = payload.get("operations")
+        if operations is None and "match_id" in payload:
+            operations = [payload] # a single operation posted on its own
+        statements = build_statements(operations, allowed_ops, partitioned, compact)
+
+        key = payload.get("idempotency_key")
+        if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 128):
+            raise WriteValidationError("'idempotency_key' must be a string of at most 128 characters")
+        if key:
+            self._ensure_schema()
+
+        publish = self.hub is not None and self.hub.has_subscribers
+        deleted = [int(op["match_id"]) for op in operations if op.get("op", allowed_ops[0]) == "delete"]
+
+        def work(cur):
+            # deleted matches are read before they go, so their events still carry team and season
+            gone = _match_events(cur, deleted) if publish and deleted else []
+            return apply_batch(cur, statements, key), gone
+
+        response, gone = self.committer.submit(work)
+        if not response.get("replayed"):
+            self.db.invalidate(*MATCH_TABLES, *(("teams",) if compact else ()))
+            if publish:
+                self._publish(operations, allowed_ops[0], gone)
+        return {"operations": len(operations), **response}
+
+    def _publish(self, operations, default_op, deleted_rows):
+        """Tell live-feed subscribers about the committed operations."""
+        for row in deleted_rows:
+            self.hub.publish("match", {"op": "delete", **row})
+        changed = {int(operation["match_id"]): operation.get("op", default_op) for operation in operations
+                   if operation.get("op", default_op) != "delete"}
+        if not changed:
+            return
+
+        # re-read the rows so subscribers filtering on team or season see full matches
+        rows = self.db.execute_query(
+            MATCH_EVENT_SQL.format(placeholders=",".join(["%s"] * len(changed))), list(changed))
+        for row in rows or []:
+            self.hub.publish("match", {"op": changed.get(row["match_id"], default_op), **row})